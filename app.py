@@ -6,6 +6,7 @@ A Streamlit application for extracting structured shipping data from unstructure
 import os
 import json
 import sys
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -32,13 +33,20 @@ if not os.environ.get("ANTHROPIC_API_KEY_1"):
         print(f"Verfügbare Anthropic-Variablen: {anthropic_vars}")
 
 import streamlit as st
-from langsmith import Client
 import traceback
 from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableLambda
 
 # Import ShipmentBot components
 from app.utils.config import load_environment
-from app.utils.workflow import build_shipment_graph
+from app.nodes.fixed_node import update_shipment_booking
+from app.utils.address_book import get_address_book
+from app.utils.freight import booking_metrics
+from app.utils.incremental import is_small_edit
+from app.utils.serialization import booking_json, booking_value, display_values
+from app.utils.speculation import SPECULATIVE_EXTRACTION, SpeculativeExtractor
+from app.utils.tracing import invoke_traced
+from app.utils.workflow import build_shipment_runnable
 
 # Setup page configuration
 st.set_page_config(
@@ -51,20 +59,42 @@ st.set_page_config(
 # Load environment variables and initialize cache
 load_environment()
 
-# Initialize LangSmith client for tracing
-client = Client(
-    api_key=os.environ.get("LANGSMITH_API_KEY"),
-    api_url=os.environ.get("LANGSMITH_ENDPOINT")
-)
+# Build the extraction workflow (EXTRACTION_MODE=direct runs the nodes without LangGraph)
+shipment_graph = build_shipment_runnable()
+
+
+def get_speculator():
+    """Background extraction of the current input for this session (None if disabled)."""
+    if not SPECULATIVE_EXTRACTION:
+        return None
+    if "speculator" not in st.session_state:
+        st.session_state["speculator"] = SpeculativeExtractor(shipment_graph, config={
+            "configurable": {
+                "project_name": os.environ.get("LANGSMITH_PROJECT", "sb_trustcall"),
+                "run_name": "ShipmentBot Speculative Extraction",
+            }
+        })
+    return st.session_state["speculator"]
 
-# Build the extraction workflow
-shipment_graph = build_shipment_graph()
+
+def on_input_change():
+    """Start the extraction in the background while the user is still reading."""
+    speculator = get_speculator()
+    if speculator is None:
+        return
+    previous = st.session_state.get("last_extraction")
+    # Kleine Änderungen laufen über das günstige Update; geprüft wird im Hintergrund nach der Entprellzeit
+    speculator.text_changed(st.session_state.get("input_text", ""), baseline=previous["input"] if previous else None)
 
 
 def process_input(input_text):
     """
     Process input text through the ShipmentBot extraction workflow.
     
+    If the text is a small edit of the previous input of this session, the
+    previous booking is updated from the text diff instead of being extracted
+    again.
+    
     Args:
         input_text (str): The input text to process
         
@@ -74,7 +104,7 @@ def process_input(input_text):
     # Set up the initial state
     state = {"input": input_text}
     
-    # Execute the workflow with tracing
+    # Execute the workflow with sampled tracing (see app/utils/tracing.py)
     try:
         with st.spinner("Daten werden extrahiert..."):
             with st.expander("Verarbeitungslog", expanded=False):
@@ -133,46 +163,72 @@ def process_input(input_text):
                     "callbacks": [callback_handler]
                 }
                 
-                # Starte die Extraktion mit Fortschrittsanzeige
-                progress.write("🚀 Starte Extraktionsprozess...")
-                final_state = shipment_graph.invoke(state, config=config)
+                previous = st.session_state.get("last_extraction")
+                incremental = previous is not None and is_small_edit(previous["input"], input_text)
+                speculator = get_speculator()
+                start = time.perf_counter()
+                hit = None if incremental or speculator is None else speculator.take(input_text)
+                if hit is not None:
+                    # Ergebnis der Hintergrund-Extraktion (fertig oder abgewartet)
+                    progress.write(f"⚡ Hintergrund-Extraktion übernommen: {hit.saved_seconds:.1f}s von {hit.duration:.1f}s gespart")
+                    final_state = hit.state
+                elif incremental:
+                    # Nur die Änderungen schicken und die vorherige Buchung patchen
+                    progress.write("✏️ Kleine Änderung erkannt - aktualisiere die vorherige Buchung...")
+                    
+                    def update(_, config):
+                        return update_shipment_booking(previous["input"], input_text, previous["booking"], config)
+                    
+                    final_state = invoke_traced(RunnableLambda(update, name="update_shipment_booking"), state, config=config)
+                else:
+                    # Starte die Extraktion mit Fortschrittsanzeige
+                    progress.write("🚀 Starte Extraktionsprozess...")
+                    final_state = invoke_traced(shipment_graph, state, config=config)
+                seconds = time.perf_counter() - start
+                
+                # Ergebnis als Basis für die nächste Änderung merken (wird nicht mehr verändert, daher keine Kopie)
+                full_seconds = previous["full_seconds"] if incremental else hit.duration if hit is not None else seconds
+                st.session_state["last_extraction"] = {
+                    "input": input_text,
+                    "booking": final_state.get("result", {}),
+                    "full_seconds": full_seconds,
+                }
+                if incremental:
+                    progress.write(
+                        f"⚡ Inkrementelle Aktualisierung in {seconds:.1f}s "
+                        f"(letzte vollständige Extraktion: {full_seconds:.1f}s)"
+                    )
+                preprocessing = final_state.get("preprocessing")
+                if preprocessing:
+                    progress.write(
+                        f"🧹 Vorverarbeitung: {preprocessing['tokens_removed']} von "
+                        f"{preprocessing['tokens_before']} Tokens entfernt"
+                    )
+                usage = final_state.get("usage")
+                if usage:
+                    totals = usage["totals"]
+                    progress.write(
+                        f"💰 {totals['calls']} LLM-Aufrufe: {totals['input_tokens']} Input- / "
+                        f"{totals['output_tokens']} Output-Tokens, ca. ${totals['cost_usd']:.4f}"
+                    )
+                if final_state.get("known_addresses"):
+                    progress.write(f"📇 Aus dem Adressbuch übernommen: {', '.join(final_state['known_addresses'])}")
+                for key, issues in (final_state.get("address_checks") or {}).items():
+                    progress.write(f"📮 {key}: {'; '.join(issues)}")
+                plausibility = final_state.get("plausibility") or {}
+                for section, issues in (plausibility.get("issues") or {}).items():
+                    status = "weiterhin unplausibel" if section in (plausibility.get("remaining") or {}) else "nachextrahiert"
+                    progress.write(f"🔍 {section} ({status}): {'; '.join(issues)}")
                 progress.write("✨ Extraktion abgeschlossen!")
                 
-                # Process the result to handle NULL and <UNKNOWN> values
-                result = final_state.get("result", {})
-                result = standardize_values(result)
-                return result
+                # NULL/<UNKNOWN> werden erst bei der Anzeige ersetzt (display_values, booking_json)
+                return final_state.get("result", {})
     except Exception as e:
         st.error(f"Error processing input: {str(e)}")
         st.error(traceback.format_exc())
         return {}
 
 
-def standardize_values(data):
-    """
-    Standardize values in the extracted data, handling NULL and <UNKNOWN> values.
-    
-    Args:
-        data (dict): The extracted data
-        
-    Returns:
-        dict: The standardized data
-    """
-    if isinstance(data, dict):
-        for key, value in data.items():
-            # Handle NULL and <UNKNOWN> values
-            if value == "NULL" or value == "<UNKNOWN>":
-                data[key] = "N/A"
-            # Recursively process nested dictionaries and lists
-            elif isinstance(value, (dict, list)):
-                data[key] = standardize_values(value)
-    elif isinstance(data, list):
-        for i, item in enumerate(data):
-            data[i] = standardize_values(item)
-    
-    return data
-
-
 # Streamlit UI
 st.title("🚚 ShipmentBot")
 st.markdown("Extract structured shipping data from unstructured text using TrustCall and LangChain.")
@@ -181,6 +237,8 @@ st.markdown("Extract structured shipping data from unstructured text using Trust
 st.subheader("Input Text")
 input_text = st.text_area(
     label="Paste your shipping information below",
+    key="input_text",
+    on_change=on_input_change,
     height=300,
     help="Enter details about pickup, delivery, billing addresses and shipment items",
     placeholder="""Example:
@@ -209,7 +267,7 @@ if st.button("Extract Shipping Data", type="primary"):
             
             # Pickup Address Tab
             with pickup_tab:
-                pickup = result.get("pickup_address", {})
+                pickup = display_values(booking_value(result, "pickup_address"))
                 if pickup:
                     col1, col2 = st.columns(2)
                     with col1:
@@ -240,7 +298,7 @@ if st.button("Extract Shipping Data", type="primary"):
             
             # Delivery Address Tab
             with delivery_tab:
-                delivery = result.get("delivery_address", {})
+                delivery = display_values(booking_value(result, "delivery_address"))
                 if delivery:
                     col1, col2 = st.columns(2)
                     with col1:
@@ -271,7 +329,7 @@ if st.button("Extract Shipping Data", type="primary"):
             
             # Billing Address Tab
             with billing_tab:
-                billing = result.get("billing_address", {})
+                billing = display_values(booking_value(result, "billing_address"))
                 if billing:
                     col1, col2 = st.columns(2)
                     with col1:
@@ -298,8 +356,8 @@ if st.button("Extract Shipping Data", type="primary"):
             
             # Shipment Items Tab
             with shipment_tab:
-                shipment = result.get("shipment", {})
-                items = shipment.get("items", [])
+                shipment = display_values(booking_value(result, "shipment"))
+                items = [display_values(item) for item in shipment.get("items") or []]
                 
                 if items:
                     st.markdown("### Items")
@@ -332,6 +390,16 @@ if st.button("Extract Shipping Data", type="primary"):
                             if dimensions:
                                 st.write(f"**Dimensions:** {' × '.join(dimensions)}")
                 
+                    # Volumen, Lademeter und frachtpflichtiges Gewicht (Straße)
+                    freight = booking_metrics(result)
+                    col1, col2, col3, col4 = st.columns(4)
+                    col1.metric("Volume", f"{freight['volume_m3']:.2f} m³")
+                    col2.metric("Loading meters", f"{freight['loading_meters']:.2f} LDM")
+                    col3.metric("Actual weight", f"{freight['actual_weight']:,.0f} kg")
+                    col4.metric("Chargeable weight", f"{freight['chargeable_weight']:,.0f} kg")
+                    if freight["incomplete_items"]:
+                        st.caption(f"{freight['incomplete_items']} item(s) without complete dimensions are not included")
+                    
                     # Notes section
                     if shipment.get("shipment_notes"):
                         st.markdown("### Notes")
@@ -341,12 +409,19 @@ if st.button("Extract Shipping Data", type="primary"):
             
             # Raw JSON Tab
             with json_tab:
-                st.json(result)
+                # JSON einmal erzeugen; st.json nimmt den Text direkt
+                st.json(booking_json(result, placeholder="N/A"))
         else:
             st.error("Failed to extract shipping data. Please check your input and try again.")
     else:
         st.warning("Please enter some text before processing")
 
+# Bestätigte Adressen lernen, damit sie bei der nächsten Buchung nicht extrahiert werden müssen
+if st.session_state.get("last_extraction"):
+    if st.button("📇 Confirm addresses for the address book"):
+        learned = get_address_book().learn_booking(st.session_state["last_extraction"]["booking"])
+        st.success(f"{len(learned)} addresses saved to the address book")
+
 
 # Footer
 st.markdown("---")
@@ -368,6 +443,17 @@ with st.sidebar:
     This application uses TrustCall for JSON validation and extraction.
     """)
     
+    # Wie oft die Hintergrund-Extraktion Zeit spart und was sie zusätzlich kostet
+    speculator = get_speculator()
+    if speculator is not None:
+        metrics = speculator.metrics()
+        if metrics["hit_rate"] is not None:
+            st.caption(
+                f"⚡ Speculative extraction: {metrics['hits_ready'] + metrics['hits_in_flight']} of "
+                f"{metrics['hits_ready'] + metrics['hits_in_flight'] + metrics['misses']} clicks, "
+                f"{metrics['saved_seconds']:.1f}s saved, ${metrics['wasted_cost_usd']:.4f} spent on unused runs"
+            )
+    
     # Display example input toggle
     if st.button("Show Example Input"):
         st.session_state["show_example"] = True
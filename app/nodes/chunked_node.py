@@ -0,0 +1,166 @@
+"""
+Map-reduce extraction node for long inputs with many items.
+
+Long inputs (forwarded email threads, "Laderaumbedarf" rows with dozens of
+positions) are split into chunks. Item chunks are extracted concurrently into
+`ShipmentInfo` objects and merged in chunk order, dropping positions that a
+quoted reply repeats; the three addresses are extracted once, from the chunks
+that mention them. Each generation stays small, so none of them runs into the
+`max_tokens` limit of the model. The extractors come from the same factory as
+the single-call node (failover chain, address book).
+"""
+
+import re
+from collections import Counter
+
+from langchain_core.runnables.config import ContextThreadPoolExecutor, merge_configs
+
+from app.nodes.fixed_node import create_booking_extractor, shipment_booking_prompt_text
+from app.schemas.shipment_booking_schema import ShipmentAddresses, ShipmentBooking, ShipmentInfo
+from app.utils.address_book import booking_schema_without, fill_sections, get_address_book
+from app.utils.chunking import needs_chunking, split_text
+from app.utils.usage import UsageTracker
+
+CHUNK_MAX_CHARS = 800
+MAX_CONCURRENCY = 4
+
+# Hinweise auf Adressblöcke (DE/EN/FR) bzw. Positionszeilen
+_ADDRESS_CUES = re.compile(
+    r"abhol|lade(stelle|adresse|ort)|absender|pick-?up|loading point|shipper|collection|enl[eè]vement|exp[ée]diteur"
+    r"|liefer|empf[äa]nger|entlade|delivery|consignee|recipient|ship to|livraison|destinataire"
+    r"|rechnung|invoice|billing|bill to|ust|vat|factur"
+    r"|stra(ss|ß)e|str\.|\b[A-Z]{2}[- ]?\d{4,5}\b|\b\d{5}\s+[A-ZÄÖÜ]",
+    re.IGNORECASE,
+)
+_ITEM_CUES = re.compile(
+    r"palette|pallet|colli|karton|carton|paket|package|kiste|gitterbox|stück|stk|pcs|pieces"
+    r"|lademeter|ldm|\d+\s*(kg|t|cm|mm|m)\b|\d+\s*[x×]\s*\d+|gewicht|weight|poids|ma(ß|ss)e|dimension",
+    re.IGNORECASE,
+)
+
+ITEMS_FOCUS = (
+    "\n\n# Scope\nYou receive one excerpt of a longer document. Extract ONLY the shipment "
+    "information (items and shipment notes) contained in this excerpt."
+)
+ADDRESSES_FOCUS = (
+    "\n\n# Scope\nYou receive the address-related excerpts of a longer document. Extract ONLY "
+    "the pickup, delivery and billing addresses."
+)
+
+# Gleiche Extraktoren wie im Einzelaufruf (Failover-Kette, Adressbuch)
+items_extractor = create_booking_extractor(ShipmentInfo)
+addresses_extractor = create_booking_extractor(ShipmentAddresses)
+# Adress-Extraktoren ohne die Felder, die aus dem Adressbuch kommen (je Kombination von Abschnitten)
+_reduced_extractors = {}
+
+
+def _addresses_extractor_for(known_sections):
+    if not known_sections:
+        return addresses_extractor
+    key = tuple(sorted(known_sections))
+    if key not in _reduced_extractors:
+        _reduced_extractors[key] = create_booking_extractor(booking_schema_without(key, ShipmentAddresses))
+    return _reduced_extractors[key]
+
+
+def _messages(focus, text):
+    return {"messages": [("system", shipment_booking_prompt_text + focus), ("user", text)]}
+
+
+def _normalize_line(line):
+    # Zitatzeichen und Leerraum zählen nicht zur Identität einer Zeile
+    return " ".join(line.lstrip().lstrip(">").lower().split())
+
+
+def _item_key(item):
+    """Normalized identity of an item's values."""
+    name = " ".join((item.name or "").lower().split())
+    return (
+        item.load_carrier, name, item.quantity,
+        item.length, item.width, item.height,
+        item.weight, item.stackable,
+    )
+
+
+def _source_line(item, lines):
+    """Normalized text of the chunk line an item was extracted from, or None if it cannot be told."""
+    numbers = [value for value in (item.length, item.width, item.height, item.weight) if value]
+    name = " ".join((item.name or "").lower().split())
+    for line in lines:
+        if numbers and all(re.search(rf"(?<![\d.,]){value}(?![\d])", line) for value in numbers):
+            return line
+        if not numbers and name and name in line:
+            return line
+    return None
+
+
+def merge_shipments(chunk_results):
+    """
+    Merge per-chunk ShipmentInfo results into one shipment.
+
+    `split_text` cuts the input into disjoint chunks, but a long thread can
+    repeat positions (quoted replies, forwarded bookings). An item counts as a
+    repetition only if an earlier chunk already yielded the same values from a
+    line with the same text, so identical positions on different lines stay
+    separate. Within one chunk, every item is kept. Repeated shipment notes are
+    merged.
+
+    Args:
+        chunk_results (list): (ShipmentInfo, chunk text) pairs in chunk order
+
+    Returns:
+        ShipmentInfo: Merged shipment
+    """
+    items = []
+    kept = Counter()
+    notes = []
+    for shipment, chunk in chunk_results:
+        lines = [_normalize_line(line) for line in chunk.splitlines() if line.strip()]
+        counts = Counter()
+        for item in shipment.items or []:
+            source = _source_line(item, lines)
+            if source is None:
+                # Ohne Quellzeile ist eine Wiederholung nicht nachweisbar
+                items.append(item)
+                continue
+            key = (_item_key(item), source)
+            counts[key] += 1
+            if counts[key] > kept[key]:
+                kept[key] += 1
+                items.append(item)
+        note = (shipment.shipment_notes or "").strip()
+        if note and note not in notes:
+            notes.append(note)
+    return ShipmentInfo(items=items, shipment_notes="; ".join(notes) or None)
+
+
+def extract_shipment_booking_chunked(state, config):
+    """Extract a shipment booking from a long input via map-reduce over chunks."""
+    chunks = split_text(state["input"], CHUNK_MAX_CHARS)
+    address_chunks = [c for c in chunks if _ADDRESS_CUES.search(c)] or chunks
+    item_chunks = [c for c in chunks if _ITEM_CUES.search(c)] or chunks
+    usage = UsageTracker()
+    call_config = merge_configs(config, {"configurable": {"max_attempts": 2}, "callbacks": [usage]})
+    # Bekannte Kundenadressen nicht extrahieren lassen
+    known = get_address_book().match_sections(state["input"])
+
+    # Adressen parallel zu den Positions-Chunks extrahieren
+    with ContextThreadPoolExecutor(max_workers=1) as executor:
+        addresses_future = executor.submit(
+            _addresses_extractor_for(known).invoke,
+            _messages(ADDRESSES_FOCUS, "\n...\n".join(address_chunks)),
+            call_config,
+        )
+        item_results = items_extractor.batch(
+            [_messages(ITEMS_FOCUS, chunk) for chunk in item_chunks],
+            config={**call_config, "max_concurrency": MAX_CONCURRENCY},
+        )
+        addresses = fill_sections(dict(addresses_future.result()["responses"][0]), known)
+
+    shipment = merge_shipments(
+        (result["responses"][0], chunk) for result, chunk in zip(item_results, item_chunks) if result["responses"]
+    )
+
+    # Adressen und Sendung bilden das Ergebnis der Anfrage (validiert wie im Einzelaufruf)
+    booking = ShipmentBooking.model_validate({**addresses, "shipment": shipment}, from_attributes=True)
+    return {"result": booking, "usage": usage.report(), "known_addresses": sorted(known)}
@@ -3,24 +3,29 @@
 Combined extraction node for complete shipment bookings.
 """
 
-import os
 import json
 
+from langchain_core.runnables.config import ContextThreadPoolExecutor, merge_configs
+
 try:
     from trustcall import create_extractor
 except ImportError:
     # Fallback to mock version
     from app.utils.mock_trustcall import create_extractor
 
-from app.schemas.shipment_booking_schema import ShipmentBooking
-from app.utils.model_setup import get_anthropic_llm
-
-# Load prompt template
-current_dir = os.path.dirname(os.path.abspath(__file__))
-prompt_dir = os.path.join(current_dir, "..", "..", "instructions")
+from app.schemas.shipment_booking_schema import ShipmentBooking, ShipmentDates, ShipmentInfo
+from app.utils.model_setup import get_anthropic_llm, get_llm
+from app.utils.prompt_compiler import get_system_prompt
+from app.utils.address_book import booking_schema_without, fill_sections, get_address_book
+from app.utils.chunking import needs_chunking
+from app.utils.failover import CircuitBreaker, FailoverExtractor, parse_failover_chain
+from app.utils.gazetteer import check_booking
+from app.utils.incremental import text_diff
+from app.utils.plausibility import check_batch, count_issues, format_issues
+from app.utils.usage import UsageTracker, combine_usage
 
-with open(os.path.join(prompt_dir, "shipment_booking_system_prompt.md"), "r", encoding="utf-8") as f:
-    shipment_booking_prompt_text = f.read()
+# System prompt: hand-written rules plus the field sections compiled from the schema
+shipment_booking_prompt_text = get_system_prompt()
 
 # Base LLM configuration
 base_llm = get_anthropic_llm(
@@ -32,33 +37,235 @@ base_llm = get_anthropic_llm(
 # Create LLM with specific system message
 llm_booking = base_llm.with_config({"default_system_message": shipment_booking_prompt_text})
 
-# Create extractor with the specific LLM and corresponding tool
-shipment_booking_extractor = create_extractor(
-    llm_booking,
-    tools=[ShipmentBooking],
-    tool_choice="ShipmentBooking"
-)
+# Optional: failover chain over several providers (LLM_FAILOVER_CHAIN), one extractor each.
+# SDK retries are disabled there - the next provider is the retry.
+failover_chain = parse_failover_chain()
+# Ein Breaker je Provider, auch wenn es mehrere Extraktoren (Schemas) gibt
+_breakers = {}
+
+
+def _shared_breaker(name):
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name)
+    return _breakers[name]
+
+
+def create_booking_extractor(schema=ShipmentBooking):
+    """Create the (failover) extractor for a booking schema."""
+    if failover_chain:
+        return FailoverExtractor([
+            (
+                f"{entry['provider']}:{entry['model']}:{entry['key_index']}",
+                create_extractor(
+                    get_llm(**entry, max_retries=0).with_config({"default_system_message": shipment_booking_prompt_text}),
+                    tools=[schema],
+                    tool_choice=schema.__name__
+                ),
+            )
+            for entry in failover_chain
+        ], breaker_factory=_shared_breaker)
+    # Create extractor with the specific LLM and corresponding tool
+    return create_extractor(
+        llm_booking,
+        tools=[schema],
+        tool_choice=schema.__name__
+    )
+
+
+shipment_booking_extractor = create_booking_extractor()
+
+# Extraktoren ohne die Adressfelder, die aus dem Adressbuch kommen (je Kombination von Abschnitten)
+_reduced_extractors = {}
+
 
-def extract_shipment_booking(state):
+def _extractor_for(known_sections):
+    if not known_sections:
+        return shipment_booking_extractor
+    key = tuple(sorted(known_sections))
+    if key not in _reduced_extractors:
+        _reduced_extractors[key] = create_booking_extractor(booking_schema_without(key))
+    return _reduced_extractors[key]
+
+
+def extract_shipment_booking(state, config):
     """Extract complete shipment booking information in a single call."""
-    result = shipment_booking_extractor.invoke(
+    usage = UsageTracker()
+    # Bekannte Kundenadressen nicht extrahieren lassen
+    known = get_address_book().match_sections(state["input"])
+    result = _extractor_for(known).invoke(
         state["input"],
-        config={"configurable": {"max_attempts": 2}}  # Allow up to 2 retries
+        # Allow up to 2 retries; callbacks of the request are kept
+        config=merge_configs(config, {"configurable": {"max_attempts": 2}, "callbacks": [usage]})
     )
     
-    # Get the model data and standardize unknown values
-    booking_data = result["responses"][0].model_dump()
-    
-    # Extract each component to return in the format expected by the workflow
-    pickup_address = booking_data.get("pickup_address", {})
-    delivery_address = booking_data.get("delivery_address", {})
-    billing_address = booking_data.get("billing_address", {})
-    shipment = booking_data.get("shipment", {"items": []})
-    
-    # Return all components in the structure expected by the workflow
+    # Das validierte Modell wird weitergereicht und erst am Rand einmal serialisiert
+    booking = result["responses"][0]
+    if known:
+        # Antwort des reduzierten Schemas mit den Adressen aus dem Adressbuch vervollständigen
+        booking = ShipmentBooking.model_validate(fill_sections(dict(booking), known), from_attributes=True)
     return {
-        "pickup_address": pickup_address,
-        "delivery_address": delivery_address,
-        "billing_address": billing_address,
-        "shipment": shipment
+        "result": booking,
+        "usage": usage.report(),
+        "known_addresses": sorted(known),
     }
+
+
+UPDATE_INSTRUCTION = (
+    "Der Text der Buchungsanfrage wurde vom Benutzer geändert. Passe die bestehende "
+    "Buchung nur an diese Änderungen an und lasse alle übrigen Werte unverändert.\n\n"
+    "Änderungen (unified diff, '-' alte Zeilen, '+' neue Zeilen):\n{diff}"
+)
+
+FOLLOWUP_INSTRUCTION = (
+    "Neue Nachricht des Kunden zu dieser Buchung (z.B. geänderter Termin, zusätzliche "
+    "Positionen). Übernimm nur die Änderungen aus der Nachricht in die bestehende "
+    "Buchung und lasse alle übrigen Werte unverändert.\n\n"
+    "Nachricht:\n{message}"
+)
+
+
+def _patch_booking(instruction, existing, config):
+    """Apply `instruction` to the existing booking via trustcall's PatchDoc update."""
+    usage = UsageTracker()
+    if isinstance(existing, ShipmentBooking):
+        # trustcall erwartet die Dict-Form (Grundlage der JSON-Patches)
+        existing = existing.model_dump()
+    result = shipment_booking_extractor.invoke(
+        {
+            "messages": [("user", instruction)],
+            "existing": {"ShipmentBooking": existing},
+        },
+        config=merge_configs(config, {"configurable": {"max_attempts": 2}, "callbacks": [usage]}),
+    )
+    booking, address_checks = check_booking(result["responses"][0])
+    return {"result": booking, "usage": usage.report(), "address_checks": address_checks}
+
+
+def update_shipment_booking(previous_input, new_input, existing, config=None):
+    """
+    Update a previously extracted booking from an edit of its input text.
+
+    Only the diff of the two texts and the existing booking are sent; the LLM
+    answers with a JSON patch (trustcall's PatchDoc) instead of the full booking.
+
+    Args:
+        previous_input (str): Input text of the previous extraction
+        new_input (str): Edited input text
+        existing (ShipmentBooking | dict): Booking of the previous extraction
+        config (RunnableConfig, optional): Config of the request (callbacks etc.)
+
+    Returns:
+        dict: Updated "result" booking, its "usage" report and the "address_checks"
+    """
+    diff = text_diff(previous_input, new_input)
+    if not diff:
+        return {"result": existing, "usage": UsageTracker().report(), "address_checks": {}}
+    return _patch_booking(UPDATE_INSTRUCTION.format(diff=diff), existing, config)
+
+
+def apply_followup_message(message, existing, config=None):
+    """
+    Update a booking with a follow-up message of the same email thread.
+
+    Args:
+        message (str): The new message (already preprocessed)
+        existing (ShipmentBooking | dict): Current booking of the thread
+        config (RunnableConfig, optional): Config of the request (callbacks etc.)
+
+    Returns:
+        dict: Updated "result" booking, its "usage" report and the "address_checks"
+    """
+    return _patch_booking(FOLLOWUP_INSTRUCTION.format(message=message), existing, config)
+
+
+# Gezielte Nachextraktion einzelner Abschnitte nach der Plausibilitätsprüfung
+SECTION_SCHEMAS = {"shipment": ShipmentInfo, "dates": ShipmentDates}
+_SECTION_LABELS = {"shipment": "shipment information (items and shipment notes)", "dates": "pickup and delivery dates"}
+RECHECK_FOCUS = (
+    "\n\n# Scope\nA previous extraction of this request failed the following plausibility "
+    "checks. Re-read the request and extract ONLY the {section} again; correct the values "
+    "if the text says otherwise (e.g. dimensions given in mm must be converted to cm).\n{issues}"
+)
+RECHECK_CONCURRENCY = 4
+_section_extractors = {}
+
+
+def _section_extractor(section):
+    if section not in _section_extractors:
+        _section_extractors[section] = create_booking_extractor(SECTION_SCHEMAS[section])
+    return _section_extractors[section]
+
+
+def reextract_sections(text, booking, issues, config=None):
+    """
+    Re-extract only the sections of a booking that failed the plausibility checks.
+
+    Args:
+        text (str): Input text the booking was extracted from
+        booking (ShipmentBooking | dict): Extracted booking
+        issues (dict): Issues per section from `app.utils.plausibility.check_batch`
+        config (RunnableConfig, optional): Config of the request (callbacks etc.)
+
+    Returns:
+        dict: Corrected "result" booking (a new `ShipmentBooking`) and the "usage"
+            report of the re-extraction
+    """
+    usage = UsageTracker()
+    call_config = merge_configs(config, {"configurable": {"max_attempts": 2}, "callbacks": [usage]})
+    if not isinstance(booking, ShipmentBooking):
+        booking = ShipmentBooking.model_validate(booking)
+    updates = {}
+    for section in SECTION_SCHEMAS:
+        if not issues.get(section):
+            continue
+        focus = RECHECK_FOCUS.format(section=_SECTION_LABELS[section], issues=format_issues(issues, section))
+        result = _section_extractor(section).invoke(
+            {"messages": [("system", shipment_booking_prompt_text + focus), ("user", text)]},
+            config=call_config,
+        )
+        data = result["responses"][0]
+        if section == "shipment":
+            updates["shipment"] = data
+        else:
+            # Nur gefundene Termine übernehmen
+            if data.pickup_date:
+                updates["pickup_address"] = booking.pickup_address.model_copy(update={"pickup_date": data.pickup_date})
+            if data.delivery_date:
+                updates["delivery_address"] = booking.delivery_address.model_copy(update={"delivery_date": data.delivery_date})
+    return {"result": booking.model_copy(update=updates), "usage": usage.report()}
+
+
+def recheck_batch(texts, bookings, config=None):
+    """
+    Check a batch of results and re-extract the flagged sections of flagged bookings.
+
+    Args:
+        texts (list): Input texts
+        bookings (list): Extracted bookings in the same order
+        config (RunnableConfig, optional): Config of the requests
+
+    Returns:
+        dict: "results" (bookings, replaced where the re-extraction has fewer
+            issues), "issues" found by the first check, "remaining" issues and the
+            combined "usage" of the re-extractions
+    """
+    issues = check_batch(texts, bookings)
+    # Lange Texte (gestückelte Extraktion) nicht in einem Aufruf nachextrahieren
+    flagged = [i for i, found in enumerate(issues) if found and not needs_chunking(texts[i])]
+    corrected = {}
+    if flagged:
+        with ContextThreadPoolExecutor(max_workers=RECHECK_CONCURRENCY) as executor:
+            futures = {
+                i: executor.submit(reextract_sections, texts[i], bookings[i], issues[i], config)
+                for i in flagged
+            }
+            corrected = {i: future.result() for i, future in futures.items()}
+    # Nur die nachextrahierten Buchungen erneut prüfen; übernommen wird nur, was weniger Befunde hat
+    results, remaining = list(bookings), list(issues)
+    candidates = [corrected[i]["result"] for i in flagged]
+    for i, candidate, found in zip(flagged, candidates, check_batch([texts[i] for i in flagged], candidates)):
+        if count_issues(found) < count_issues(issues[i]):
+            results[i] = candidate
+            remaining[i] = found
+    reports = [c["usage"] for c in corrected.values()]
+    return {"results": results, "issues": issues, "remaining": remaining, "usage": combine_usage(reports)}
@@ -50,7 +50,7 @@ class BillingAddress(AddressBase):
     salutation: Optional[str] = Field(None, description="Salutation for contact person (Mr., Mrs., etc.)")
     billing_email: Optional[str] = Field(None, description="Email address specifically for billing/invoices")
     reference: Optional[str] = Field(None, description="Reference number or code for billing")
-    vat_id: Optional[str] = Field(None, description="VAT ID / tax identification number")
+    vat_id: Optional[str] = Field(None, description="VAT ID / tax identification number with country prefix (e.g. DE123456789, GB123456789, FR12123456789)")
 
 class ShipmentItem(BaseModel):
     """Information about a single shipment item with all necessary details."""
@@ -79,4 +79,15 @@ class ShipmentBooking(BaseModel):
     pickup_address: PickupAddress = Field(default_factory=PickupAddress, description="Address information for pickup location")
     delivery_address: DeliveryAddress = Field(default_factory=DeliveryAddress, description="Address information for delivery location")
     billing_address: BillingAddress = Field(default_factory=BillingAddress, description="Address information for billing")
-    shipment: ShipmentInfo = Field(default_factory=ShipmentInfo, description="Information about the shipment and items") 
\ No newline at end of file
+    shipment: ShipmentInfo = Field(default_factory=ShipmentInfo, description="Information about the shipment and items") 
+
+class ShipmentAddresses(BaseModel):
+    """Pickup, delivery and billing addresses of a shipment booking, without shipment details."""
+    pickup_address: PickupAddress = Field(default_factory=PickupAddress, description="Address information for pickup location")
+    delivery_address: DeliveryAddress = Field(default_factory=DeliveryAddress, description="Address information for delivery location")
+    billing_address: BillingAddress = Field(default_factory=BillingAddress, description="Address information for billing")
+
+class ShipmentDates(BaseModel):
+    """Pickup and delivery dates of a shipment booking."""
+    pickup_date: Optional[str] = Field(None, description="Pickup date in format DD.MM.YYYY")
+    delivery_date: Optional[str] = Field(None, description="Delivery date in format DD.MM.YYYY")
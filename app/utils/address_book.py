@@ -0,0 +1,290 @@
+"""
+Address book of confirmed customer addresses.
+
+Billing entities and pickup/delivery sites repeat across bookings. Confirmed
+addresses are stored in a SQLite file and indexed in memory by character
+trigrams of company, street and postal code. Before an extraction the input
+text is matched against the index; an address that is found with high
+confidence and follows a role keyword ("Abholung", "Lieferung an", ...) fills
+company, street and postal code of its section, and those fields are left out
+of the schema sent to the LLM (fewer output tokens, lower latency).
+
+Address addition, city and country are still extracted and win over the
+stored values (a booking may name another gate or hall of a known site), as
+are the contact fields (name, phone, email) and the role-specific fields
+(dates, references, VAT ID, ...) - they change per booking.
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from pydantic import BaseModel, Field, create_model
+
+from app.schemas.shipment_booking_schema import ShipmentBooking
+from app.utils.serialization import PLACEHOLDERS, booking_value
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "address_book.sqlite3")
+
+# Felder, die zum Ort gehören und im Adressbuch gespeichert werden
+SITE_FIELDS = ("company", "street", "address_addition", "postal_code", "city", "country")
+# Davon durch den Score abgesichert und daher nicht mehr extrahiert
+MATCHED_FIELDS = ("company", "street", "postal_code")
+SECTIONS = ("pickup_address", "delivery_address", "billing_address")
+
+# Mindestwert für einen Treffer, der die Extraktion ersetzt
+MIN_SCORE = 0.9
+# Gewichte von Firma, Straße und Postleitzahl im Score
+WEIGHTS = {"company": 0.4, "street": 0.3, "postal_code": 0.3}
+# Trigramme, die in mehr als diesem Anteil der Adressen vorkommen ("gmb", "str"), zählen nicht als Kandidaten
+MAX_POSTING_SHARE = 0.05
+CANDIDATES = 20
+# Wie weit vor der Adresse nach einem Rollen-Stichwort gesucht wird
+ROLE_WINDOW = 200
+
+_MISSING = (None, "", *PLACEHOLDERS)
+
+_ROLE_KEYWORDS = re.compile(
+    r"(?P<pickup_address>abhol|absender|ladestelle|beladestelle|verlade|pick ?up|ship from|shipper)"
+    r"|(?P<delivery_address>liefer|empfänger|entlade|zustell|deliver|ship to|consignee)"
+    r"|(?P<billing_address>rechnung|invoice|billing|bill to)",
+    re.IGNORECASE,
+)
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.casefold().replace("ß", "ss"))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    # "Industriestraße 42" und "Industriestr. 42" vergleichbar machen
+    text = re.sub(r"stra?s?s?e\b|str\b\.?", "str", text)
+    return " ".join(re.sub(r"[^\w]+", " ", text).split())
+
+
+def _trigrams(text: str) -> Set[str]:
+    text = f" {_normalize(text)} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _record_key(address: Dict[str, Any]) -> str:
+    return "|".join(_normalize(address.get(field) or "") for field in ("company", "street", "postal_code"))
+
+
+class AddressBook:
+    """
+    SQLite-backed address book with an in-memory trigram index.
+
+    Args:
+        path (str, optional): Database file (default: `ADDRESS_BOOK_PATH` or
+            data/address_book.sqlite3); ":memory:" for a temporary book
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.environ.get("ADDRESS_BOOK_PATH", DEFAULT_PATH)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        if self.path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS addresses ("
+            " id INTEGER PRIMARY KEY,"
+            " key TEXT UNIQUE NOT NULL,"
+            " address TEXT NOT NULL,"
+            " roles TEXT NOT NULL,"
+            " confirmed INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._records: Dict[int, Dict[str, Any]] = {}
+        self._grams: Dict[int, Dict[str, Set[str]]] = {}
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        for row in self._conn.execute("SELECT id, address, roles FROM addresses"):
+            self._index(row[0], json.loads(row[1]), json.loads(row[2]))
+
+    def _index(self, record_id: int, address: Dict[str, Any], roles: Dict[str, int]) -> None:
+        grams = {field: _trigrams(address.get(field) or "") for field in WEIGHTS}
+        old = self._grams.get(record_id)
+        if old:
+            for gram in set().union(*old.values()):
+                self._postings[gram].discard(record_id)
+        self._records[record_id] = {"address": address, "roles": roles}
+        self._grams[record_id] = grams
+        for gram in set().union(*grams.values()):
+            self._postings[gram].add(record_id)
+
+    def learn(self, address: Dict[str, Any], role: Optional[str] = None) -> Optional[int]:
+        """
+        Add or refresh a confirmed address.
+
+        Args:
+            address (dict): Address fields (only `SITE_FIELDS` are stored)
+            role (str, optional): Section the address was confirmed for, e.g. "billing_address"
+
+        Returns:
+            int: Record ID, or None if the address has no company or no postal code
+        """
+        site = {field: address.get(field) for field in SITE_FIELDS}
+        if not site["company"] or not site["postal_code"]:
+            return None
+        key = _record_key(site)
+        with self._lock:
+            row = self._conn.execute("SELECT id, roles, confirmed FROM addresses WHERE key = ?", (key,)).fetchone()
+            roles = json.loads(row[1]) if row else {}
+            if role:
+                roles[role] = roles.get(role, 0) + 1
+            if row:
+                record_id = row[0]
+                self._conn.execute(
+                    "UPDATE addresses SET address = ?, roles = ?, confirmed = ?, updated_at = ? WHERE id = ?",
+                    (json.dumps(site, ensure_ascii=False), json.dumps(roles), row[2] + 1, time.time(), record_id),
+                )
+            else:
+                record_id = self._conn.execute(
+                    "INSERT INTO addresses (key, address, roles, confirmed, updated_at) VALUES (?, ?, ?, 1, ?)",
+                    (key, json.dumps(site, ensure_ascii=False), json.dumps(roles), time.time()),
+                ).lastrowid
+            self._index(record_id, site, roles)
+        return record_id
+
+    def learn_booking(self, booking: Union[BaseModel, Dict[str, Any]]) -> List[int]:
+        """Learn the pickup, delivery and billing address of a confirmed booking (model or dict)."""
+        ids = (self.learn(dict(booking_value(booking, section) or {}), section) for section in SECTIONS)
+        return [record_id for record_id in ids if record_id is not None]
+
+    def _search(self, text: str, limit: int) -> List[Tuple[float, int]]:
+        grams = _trigrams(text)
+        max_posting = max(CANDIDATES, int(len(self._records) * MAX_POSTING_SHARE))
+        hits = Counter()
+        for gram in grams:
+            ids = self._postings.get(gram)
+            if ids and len(ids) <= max_posting:
+                hits.update(ids)
+        scored = []
+        for record_id, _ in hits.most_common(CANDIDATES):
+            record_grams = self._grams[record_id]
+            score = sum(
+                weight * len(record_grams[field] & grams) / len(record_grams[field])
+                for field, weight in WEIGHTS.items()
+                if record_grams[field]
+            )
+            scored.append((score, record_id))
+        scored.sort(reverse=True)
+        return scored[:limit]
+
+    def search(self, text: str, limit: int = 5) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Score known addresses by how completely company, street and postal code occur in `text`.
+
+        Returns:
+            list: (score, address) pairs, best first
+        """
+        with self._lock:
+            return [(score, dict(self._records[i]["address"])) for score, i in self._search(text, limit)]
+
+    def match_sections(self, text: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Known addresses for the sections of a booking text.
+
+        An address counts if it scores at least `MIN_SCORE` and a role keyword
+        ("Abholung", "Lieferung an", "Rechnung an", ...) precedes its postal
+        code; the nearest one decides the section. Addresses without one (e.g.
+        the customer's own address quoted in the text) are left to the LLM.
+        Sections claimed by more than one address are dropped.
+
+        Returns:
+            dict: Site fields per section, e.g. {"billing_address": {...}}
+        """
+        found: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        with self._lock:
+            for score, record_id in self._search(text, CANDIDATES):
+                if score < MIN_SCORE:
+                    break
+                # Ohne Stichwort keine Zuordnung: der Abschnitt fehlt danach im Schema
+                role = _role_before(text, self._records[record_id]["address"])
+                if role:
+                    found[role].append(dict(self._records[record_id]["address"]))
+        return {section: addresses[0] for section, addresses in found.items() if len(addresses) == 1}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _role_before(text: str, address: Dict[str, Any]) -> Optional[str]:
+    position = text.find(address["postal_code"])
+    if position < 0:
+        return None
+    # Stichwörter in der Adresse selbst ("Rechnungsweg 7", "Lieferservice GmbH") zählen nicht
+    own_words = set(_normalize(f"{address.get('company') or ''} {address.get('street') or ''}").split())
+    window = re.sub(
+        r"\S+",
+        lambda m: " " * len(m.group()) if _normalize(m.group()) in own_words else m.group(),
+        text[max(0, position - ROLE_WINDOW):position],
+    )
+    last = None
+    for last in _ROLE_KEYWORDS.finditer(window):
+        pass
+    return last.lastgroup if last else None
+
+
+_book = None
+_book_lock = threading.Lock()
+
+
+def get_address_book() -> AddressBook:
+    """The process-wide address book (`ADDRESS_BOOK_PATH`)."""
+    global _book
+    if _book is None:
+        with _book_lock:
+            if _book is None:
+                _book = AddressBook()
+                logger.info(f"Adressbuch geladen: {len(_book)} Adressen")
+    return _book
+
+
+def _without_matched_fields(model: type) -> type:
+    fields = {name: (field.annotation, field) for name, field in model.model_fields.items() if name not in MATCHED_FIELDS}
+    return create_model(model.__name__, __doc__=model.__doc__, **fields)
+
+
+@lru_cache(maxsize=None)
+def booking_schema_without(sections: Tuple[str, ...], schema: type = ShipmentBooking) -> type:
+    """
+    `schema` with the matched fields (`MATCHED_FIELDS`) of `sections` removed.
+
+    The model keeps the name of `schema` (`ShipmentBooking` or `ShipmentAddresses`),
+    so prompts and tool choice stay the same.
+    """
+    fields = {}
+    for name, field in schema.model_fields.items():
+        if name in sections:
+            reduced = _without_matched_fields(field.annotation)
+            fields[name] = (reduced, Field(default_factory=reduced, description=field.description))
+        else:
+            fields[name] = (field.annotation, field)
+    return create_model(schema.__name__, __doc__=schema.__doc__, **fields)
+
+
+def fill_sections(booking: Dict[str, Any], known: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge known addresses into an extracted booking; extracted values win over stored ones.
+
+    The sections of `booking` may be dicts or models (`dict(model)` of a
+    response); the known sections are replaced by dicts.
+    """
+    for section, address in known.items():
+        extracted = {name: value for name, value in dict(booking.get(section) or {}).items() if value not in _MISSING}
+        merged = {**address, **extracted}
+        # Feldreihenfolge wie im vollständigen Schema
+        booking[section] = {name: merged.get(name) for name in ShipmentBooking.model_fields[section].annotation.model_fields}
+    return booking
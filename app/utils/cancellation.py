@@ -0,0 +1,11 @@
+"""
+Cancellation of a request by its caller.
+
+Raised into a running extraction (e.g. from a callback before the next LLM
+call) when its result is no longer needed. It is not a failure of the
+provider: failover and circuit breakers let it pass without counting it.
+"""
+
+
+class RequestCancelled(Exception):
+    """The caller no longer needs the result; the run stops early."""
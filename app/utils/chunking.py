@@ -0,0 +1,76 @@
+"""
+Splitting of long inputs into chunks for map-reduce extraction.
+"""
+import re
+from typing import List
+
+# Satzgrenzen: nach . ! ? ; gefolgt von Leerraum (Zahlen wie "13,2" oder "05.06.2024" bleiben ganz)
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?;])\s+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Inputs longer than this are extracted chunk-wise (app/nodes/chunked_node.py)
+CHUNKING_THRESHOLD_CHARS = 1500
+
+
+def needs_chunking(text: str) -> bool:
+    """Return True if the input is long enough for chunked extraction."""
+    return len(text) > CHUNKING_THRESHOLD_CHARS
+
+
+def split_text(text: str, max_chars: int = 800) -> List[str]:
+    """
+    Split text into chunks of at most `max_chars` characters.
+
+    Lines are kept together where possible; lines that are too long on their own
+    (e.g. a whole shipment list in one CSV cell) are split at sentence boundaries
+    and, as a last resort, at whitespace. Consecutive pieces are packed into one
+    chunk as long as they fit.
+
+    Args:
+        text (str): Input text
+        max_chars (int): Maximum chunk length
+
+    Returns:
+        list: Non-empty chunks in their original order
+    """
+    pieces = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if len(line) <= max_chars:
+            pieces.append(line)
+            continue
+        for sentence in _SENTENCE_END_RE.split(line):
+            if len(sentence) <= max_chars:
+                pieces.append(sentence)
+            else:
+                pieces.extend(_split_words(sentence, max_chars))
+
+    chunks = []
+    current = []
+    size = 0
+    for piece in pieces:
+        if current and size + 1 + len(piece) > max_chars:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        size += len(piece) + (1 if current else 0)
+        current.append(piece)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _split_words(text: str, max_chars: int) -> List[str]:
+    parts = []
+    current = []
+    size = 0
+    for word in _WHITESPACE_RE.split(text):
+        if current and size + 1 + len(word) > max_chars:
+            parts.append(" ".join(current))
+            current, size = [], 0
+        size += len(word) + (1 if current else 0)
+        current.append(word)
+    if current:
+        parts.append(" ".join(current))
+    return parts
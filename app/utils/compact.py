@@ -0,0 +1,256 @@
+"""
+Compact in-memory store for large sets of extracted bookings.
+
+A `model_dump()` dict of a booking costs a few kilobytes - four nested dicts
+with 41 keys, one dict per item, a fresh string object per value. For batch
+pipelines and analytics over tens of thousands of results,
+`CompactBookings` keeps instead:
+
+- all shipment items of all bookings in one NumPy structured array
+  (`ITEM_DTYPE`: booking index, load carrier, quantity, dimensions, weight,
+  stackable and the index of the item name in a string table)
+- per booking one `__slots__` record with the three addresses as tuples in
+  field order and the item range
+- every string deduplicated through one pool, so repeated countries, cities,
+  companies and goods names are stored once
+
+Conversion is lossless in both directions::
+
+    store = CompactBookings.from_bookings(results)
+    store.booking(0)        # ShipmentBooking
+    store.to_dict(0)        # == results[0] as model_dump()
+    store.item_columns()    # column arrays, e.g. for app.utils.freight.compute_item_metrics
+
+Integer item fields must fit into int32 (weights, dimensions and quantities
+of real shipments do by far).
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+
+from app.schemas.shipment_booking_schema import (
+    BillingAddress,
+    DeliveryAddress,
+    LoadCarrierType,
+    PickupAddress,
+    ShipmentBooking,
+)
+
+ROLES = {
+    "pickup_address": PickupAddress,
+    "delivery_address": DeliveryAddress,
+    "billing_address": BillingAddress,
+}
+_ROLE_FIELDS = {role: tuple(model.model_fields) for role, model in ROLES.items()}
+
+ITEM_DTYPE = np.dtype([
+    ("booking", np.uint32),
+    ("load_carrier", np.uint8),   # 0 = None
+    ("quantity", np.int32),
+    ("length", np.int32),
+    ("width", np.int32),
+    ("height", np.int32),
+    ("weight", np.int32),
+    ("stackable", np.int8),       # -1 = None
+    ("name", np.uint32),          # Index in die Stringtabelle, 0 = None
+])
+_INT_FIELDS = ("quantity", "length", "width", "height", "weight")
+# Platzhalter für None in den int32-Spalten
+INT_NONE = np.iinfo(np.int32).min
+_INT_MAX = np.iinfo(np.int32).max
+
+_FLUSH_ROWS = 4096
+
+_CARRIERS = {carrier.value: carrier for carrier in LoadCarrierType}
+
+
+class _BookingRecord:
+    """Addresses (tuples in field order) and item range of one booking."""
+
+    __slots__ = ("pickup_address", "delivery_address", "billing_address", "shipment_notes", "start", "stop", "items_none")
+
+    def __init__(self, pickup_address, delivery_address, billing_address, shipment_notes, start, stop, items_none=False):
+        self.pickup_address = pickup_address
+        self.delivery_address = delivery_address
+        self.billing_address = billing_address
+        self.shipment_notes = shipment_notes
+        self.start = start
+        self.stop = stop
+        # "items": None (erlaubt im Schema) von einer leeren Liste unterscheiden
+        self.items_none = items_none
+
+
+class CompactBookings:
+    """
+    Append-only, array-backed collection of shipment bookings.
+
+    Args:
+        capacity (int): Initial number of item slots (grows by doubling)
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._records: List[_BookingRecord] = []
+        self._items = np.empty(max(capacity, 1), dtype=ITEM_DTYPE)
+        self._item_count = 0
+        # Neue Positionen erst gesammelt ins Array schreiben (Zuweisung je Zeile ist langsam)
+        self._pending: List[tuple] = []
+        # Stringpool: jede Zeichenkette nur einmal; Namen zusätzlich als Index
+        self._pool: Dict[str, str] = {}
+        self._names: List[Optional[str]] = [None]
+        self._name_index: Dict[str, int] = {}
+
+    @classmethod
+    def from_bookings(cls, bookings: Iterable[Union[ShipmentBooking, Dict[str, Any]]]) -> "CompactBookings":
+        """Build a store from `ShipmentBooking` objects or their `model_dump()` dicts."""
+        store = cls()
+        store.extend(bookings)
+        return store
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _intern(self, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
+        return self._pool.setdefault(value, value)
+
+    def _name(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        index = self._name_index.get(value)
+        if index is None:
+            index = self._name_index[value] = len(self._names)
+            self._names.append(self._intern(value))
+        return index
+
+    def _int(self, value: Optional[int], field: str) -> int:
+        if value is None:
+            return INT_NONE
+        if not INT_NONE < value <= _INT_MAX:
+            raise ValueError(f"Item field '{field}' = {value} does not fit into the compact int32 column")
+        return value
+
+    def _carrier(self, value: Optional[int]) -> int:
+        if value is None:
+            return 0
+        if value not in _CARRIERS:
+            raise ValueError(f"Item field 'load_carrier' = {value!r} is not a LoadCarrierType value")
+        return int(value)
+
+    def append(self, booking: Union[ShipmentBooking, Dict[str, Any]]) -> int:
+        """
+        Add one booking.
+
+        Args:
+            booking: `ShipmentBooking` or its `model_dump()` dict
+
+        Returns:
+            int: Index of the booking in the store
+        """
+        if isinstance(booking, ShipmentBooking):
+            booking = booking.model_dump()
+        index = len(self._records)
+        intern = self._intern
+        addresses = []
+        for role, fields in _ROLE_FIELDS.items():
+            address = booking.get(role) or {}
+            addresses.append(tuple(intern(address.get(field)) for field in fields))
+        shipment = booking.get("shipment") or {}
+        items = shipment.get("items", [])
+        start = self._item_count + len(self._pending)
+        # Erst alle Zeilen prüfen, damit eine ungültige Position keine halbe Buchung hinterlässt
+        rows = [
+            (
+                index,
+                self._carrier(item.get("load_carrier")),
+                *(self._int(item.get(field), field) for field in _INT_FIELDS),
+                -1 if item.get("stackable") is None else int(item["stackable"]),
+                self._name(item.get("name")),
+            )
+            for item in items or []
+        ]
+        self._pending += rows
+        if len(self._pending) >= _FLUSH_ROWS:
+            self._flush()
+        self._records.append(_BookingRecord(
+            *addresses, intern(shipment.get("shipment_notes")), start, start + len(rows), items is None
+        ))
+        return index
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        start = self._item_count
+        stop = start + len(self._pending)
+        if stop > len(self._items):
+            grown = np.empty(max(stop, 2 * len(self._items)), dtype=ITEM_DTYPE)
+            grown[:start] = self._items[:start]
+            self._items = grown
+        self._items[start:stop] = np.array(self._pending, dtype=ITEM_DTYPE)
+        self._item_count = stop
+        self._pending = []
+
+    def extend(self, bookings: Iterable[Union[ShipmentBooking, Dict[str, Any]]]) -> None:
+        """Add many bookings."""
+        for booking in bookings:
+            self.append(booking)
+
+    @property
+    def items(self) -> np.ndarray:
+        """Structured array (`ITEM_DTYPE`) of all items; a view, not a copy."""
+        self._flush()
+        return self._items[:self._item_count]
+
+    def item_columns(self) -> Dict[str, np.ndarray]:
+        """
+        Item columns as float arrays with NaN for missing values.
+
+        Returns:
+            dict: "booking_index", "load_carrier", "quantity", "length", "width",
+                "height", "weight" and a bool "stackable" array
+        """
+        items = self.items
+        columns = {"booking_index": items["booking"].astype(np.intp)}
+        columns["load_carrier"] = np.where(items["load_carrier"] == 0, np.nan, items["load_carrier"])
+        for field in _INT_FIELDS:
+            column = items[field]
+            columns[field] = np.where(column == INT_NONE, np.nan, column)
+        columns["stackable"] = items["stackable"] == 1
+        return columns
+
+    def _item_dicts(self, record: _BookingRecord) -> List[Dict[str, Any]]:
+        names = self._names
+        items = []
+        for row in self._items[record.start:record.stop].tolist():
+            _, carrier, quantity, length, width, height, weight, stackable, name = row
+            items.append({
+                "load_carrier": _CARRIERS[carrier] if carrier else None,
+                "name": names[name],
+                "quantity": None if quantity == INT_NONE else quantity,
+                "length": None if length == INT_NONE else length,
+                "width": None if width == INT_NONE else width,
+                "height": None if height == INT_NONE else height,
+                "weight": None if weight == INT_NONE else weight,
+                "stackable": None if stackable == -1 else bool(stackable),
+            })
+        return items
+
+    def to_dict(self, index: int) -> Dict[str, Any]:
+        """Booking `index` in the form of `ShipmentBooking.model_dump()`."""
+        record = self._records[index]
+        if record.stop > self._item_count:
+            self._flush()
+        booking = {
+            role: dict(zip(fields, getattr(record, role)))
+            for role, fields in _ROLE_FIELDS.items()
+        }
+        items = None if record.items_none else self._item_dicts(record)
+        booking["shipment"] = {"items": items, "shipment_notes": record.shipment_notes}
+        return booking
+
+    def booking(self, index: int) -> ShipmentBooking:
+        """Booking `index` as `ShipmentBooking`."""
+        return ShipmentBooking.model_validate(self.to_dict(index))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self.to_dict(index) for index in range(len(self)))
@@ -6,6 +6,8 @@ from dotenv import load_dotenv
 from langchain.globals import set_llm_cache
 from langchain.cache import InMemoryCache
 
+from app.utils.fake_llm import fake_llm_enabled
+
 
 def load_environment():
     """
@@ -26,6 +28,10 @@ def load_environment():
         "LANGSMITH_PROJECT"
     ]
     
+    # The offline fake model needs neither API keys nor LangSmith
+    if fake_llm_enabled():
+        return
+    
     missing_vars = [var for var in required_vars if not os.environ.get(var)]
     
     if missing_vars:
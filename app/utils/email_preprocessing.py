@@ -0,0 +1,369 @@
+"""
+Token-reduction preprocessing for pasted emails.
+
+Real inputs are often complete emails: HTML remnants, quoted reply history,
+signatures and legal footers. None of it helps the extraction, but every token
+is paid for and slows the generation down. `preprocess_email` removes it with a
+rule set for German, English and French mails.
+
+Lines that look like addresses, contact data, items, VAT IDs or address labels
+are protected and never removed, not even inside a disclaimer paragraph: a
+signature loses only name, title, contact and footer lines after the sender
+name (other text, e.g. a note after the closing formula, stays), and quoted
+history is kept entirely if it holds data the new message does not repeat
+(e.g. "siehe unten"). Quoted history starts at a reply line ("Am ... schrieb
+...:") or a full reply header (From, Sent/Date and To/Subject on consecutive
+lines, or From and Sent/Date after a separator line); the input need not be an
+email, so a lone "Von:" or "Datum:" line is ordinary text.
+"""
+import re
+from html import unescape
+from html.parser import HTMLParser
+from typing import Any, Dict, List, Tuple
+
+# HTML
+
+_HTML_RE = re.compile(r"<(?:html|body|div|p|br|table|tr|td|span|font|b|strong)\b[^>]*>", re.IGNORECASE)
+_BLOCK_TAGS = {"p", "div", "br", "tr", "li", "ul", "ol", "table", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "hr"}
+_CELL_TAGS = {"td", "th"}
+_SKIP_TAGS = {"script", "style", "head", "title"}
+
+# Quoted replies
+
+_REPLY_HEADER_RE = re.compile(
+    r"^\s*(?:"
+    r"on\b.{0,200}\bwrote:"
+    r"|am\b.{0,200}\bschrieb\b.{0,200}:"
+    r"|le\b.{0,200}\ba [ée]crit\s?:"
+    r"|-{2,}\s*(?:original message|urspr[üu]ngliche nachricht|message d'origine)\s*-{2,}"
+    r")\s*$",
+    re.IGNORECASE,
+)
+_HEADER_FROM_RE = re.compile(r"^\s*\*?(?:from|von|de)\s*:\*?\s", re.IGNORECASE)
+_HEADER_SENT_RE = re.compile(r"^\s*\*?(?:sent|gesendet|envoy[ée]|date|datum)\s*:\*?\s", re.IGNORECASE)
+_HEADER_TO_RE = re.compile(r"^\s*\*?(?:to|an|[àa]|cc|bcc)\s*:\*?\s", re.IGNORECASE)
+_HEADER_SUBJECT_RE = re.compile(r"^\s*\*?(?:subject|betreff|objet)\s*:\*?\s", re.IGNORECASE)
+_SEPARATOR_RE = re.compile(r"^\s*[-_=]{5,}\s*$")
+
+# Signatures
+
+_SIGNATURE_DELIMITER_RE = re.compile(r"^--\s*$")
+_CLOSING_RE = re.compile(
+    r"^\s*(?:"
+    r"(?:mit\s+)?(?:freundlichen|besten|beste|viele|liebe|herzliche|sonnige)\s+gr[üu](?:ß|ss)e?n?"
+    r"|mfg|gru(?:ß|ss)"
+    r"|(?:best|kind|warm|many)\s+regards|regards|best wishes|best|cheers|thanks and regards|sincerely|yours sincerely"
+    r"|(?:bien\s+|tr[èe]s\s+)?cordialement|(?:sinc[èe]res|meilleures)\s+salutations|salutations|bonne journ[ée]e"
+    r")\b[\s,.!]*$",
+    re.IGNORECASE,
+)
+# A closing formula only starts a signature if at most this many lines follow
+_MAX_SIGNATURE_LINES = 25
+# Lines after the closing formula that belong to the signature: names and titles
+# (capitalized words, no digits, no sentence punctuation) and contact labels
+_NAME_WORD = r"(?:[A-ZÄÖÜÉÈ][^\s\d]*|von|van|vom|zu|der|den|de|la|le|du|und|and|et|&|[|/·-]|i\.\s?[AV]\.|ppa\.)"
+_SIGNATURE_NAME_RE = re.compile(rf"^\s*{_NAME_WORD}(?:\s+{_NAME_WORD}){{0,5}}\s*$")
+_CONTACT_LINE_RE = re.compile(
+    r"^\s*(?:tel|telefon|phone|fon|fax|mobil|mobile|handy|e-?mail|mail|web|internet|www|t[ée]l|portable)\b",
+    re.IGNORECASE,
+)
+
+# Boilerplate
+
+_DISCLAIMER_RE = re.compile(
+    r"confidential|intended (?:solely )?for the (?:use of the )?(?:named )?(?:addressee|recipient)|if you (?:are not|have received)"
+    r"|nicht der richtige adressat|irrt[üu]mlich erhalten|unbefugte weitergabe"
+    r"|confidentiel|ce message et toutes les pi[èe]ces"
+    r"|gesch[äa]ftsf[üu]hr(?:er|ung)|amtsgericht|registergericht|handelsregister|\bHRB\b|sitz der gesellschaft"
+    r"|registered (?:office|in england)|company (?:registration|number)|capital social|\bRCS\b|\bSIRET\b"
+    r"|datenschutz|privacy (?:policy|notice)|protection des donn[ée]es",
+    re.IGNORECASE,
+)
+_BOILERPLATE_LINE_RE = re.compile(
+    r"^\s*(?:"
+    r"sent from my \w+|von meinem \w+ gesendet|envoy[ée] de mon \w+"
+    r"|please consider the environment.*|bitte denken sie an die umwelt.*|pensez [àa] l'environnement.*"
+    r"|\[cid:[^\]]*\]|<image\d+\.\w+>|\[image:[^\]]*\]"
+    r"|[-_=*~]{5,}"
+    r"|(?:www\.|https?://)\S+"
+    r"|(?:facebook|linkedin|twitter|xing|instagram)(?:\s*[|·]\s*\w+)*"
+    r")\s*$",
+    re.IGNORECASE,
+)
+_FORWARD_MARKER_RE = re.compile(
+    r"^\s*-{2,}\s*(?:forwarded message|weitergeleitete nachricht|message transf[ée]r[ée])\s*-{2,}\s*$",
+    re.IGNORECASE,
+)
+
+# Protected lines (never removed)
+
+_PROTECTED_RES = [
+    # Postal code + city (DE/AT/CH/FR, optional country prefix) and UK postcodes
+    re.compile(r"\b(?:[A-Z]{1,2}[- ]?)?\d{4,5}\s+[A-ZÄÖÜÉa-zäöüéß]"),
+    re.compile(r"\b[A-Z]{1,2}\d[A-Z\d]?\s*\d[A-Z]{2}\b"),
+    # Streets
+    re.compile(r"(?:stra(?:ß|ss)e|str\.|weg|allee|platz|gasse|ring|damm|ufer|chaussee)\s*\d+", re.IGNORECASE),
+    re.compile(r"\b(?:rue|avenue|boulevard|chemin|route|all[ée]e|road|street|lane)\b", re.IGNORECASE),
+    # Items: dimensions, weights, quantities of load carriers
+    re.compile(r"\d+\s*[x×*]\s*\d+"),
+    re.compile(r"\d+(?:[.,]\d+)?\s*(?:kg|t|to|cm|mm|m|ldm|lademeter|m3|m³)\b", re.IGNORECASE),
+    re.compile(
+        r"\d+\s*(?:euro)?(?:paletten?|pallets?|palettes?|colis|colli|kartons?|cartons?|pakete?|packages?"
+        r"|kisten?|st[üu]ck|stk|pcs|gitterbox(?:en)?|eur|fp|ep)\b",
+        re.IGNORECASE,
+    ),
+    # Contact data (phone numbers, email addresses)
+    re.compile(r"(?:tel|phone|fon|mobil|mobile|handy|fax|t[ée]l)\b.*\d{3}|\+\d[\d\s/().-]{6,}\d", re.IGNORECASE),
+    re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"),
+    # VAT IDs, company names, address labels
+    re.compile(r"\b(?:ust|vat|tva|steuer)\w*|\b[A-Z]{2}\d{8,12}\b", re.IGNORECASE),
+    re.compile(r"\b(?:GmbH|AG|KG|OHG|UG|e\.K\.|SE|SARL|SAS|SA|S\.A\.|Ltd|Limited|Inc|LLC|B\.V\.)\b"),
+    re.compile(
+        r"abhol|lade(?:stelle|adresse|ort|datum)|liefer|empf[äa]nger|rechnung|invoice|billing|delivery"
+        r"|pick-?up|loading|unloading|consignee|shipper|enl[eè]vement|livraison|factur|exp[ée]diteur|destinataire",
+        re.IGNORECASE,
+    ),
+]
+
+_MULTI_SPACE_RE = re.compile(r"[ \t ]{2,}")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text (4 characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def is_protected(line: str) -> bool:
+    """Return True if the line may contain address, item or billing data."""
+    return any(pattern.search(line) for pattern in _PROTECTED_RES)
+
+
+class _HTMLToText(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+        elif tag in _CELL_TAGS:
+            self.parts.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip:
+            # Zeilenumbrüche im HTML-Quelltext sind keine Absätze
+            self.parts.append(data.replace("\r", " ").replace("\n", " "))
+
+
+def html_to_text(text: str) -> str:
+    """Convert HTML to plain text; text without HTML tags is returned unchanged."""
+    if not _HTML_RE.search(text):
+        return text
+    parser = _HTMLToText()
+    parser.feed(text)
+    parser.close()
+    return unescape("".join(parser.parts))
+
+
+def _unquote(line: str) -> str:
+    return line.lstrip().lstrip(">").lstrip()
+
+
+def _header_block(lines: List[str], i: int) -> int:
+    """Number of reply-header lines starting at `lines[i]` (0 if there is no header)."""
+    if _REPLY_HEADER_RE.match(_unquote(lines[i])):
+        return 1
+    if not _HEADER_FROM_RE.match(_unquote(lines[i])):
+        return 0
+    # Unmittelbar folgende Kopfzeilen (Gesendet/Datum, An/Cc, Betreff)
+    end = i + 1
+    while end < len(lines) and any(
+        pattern.match(_unquote(lines[end])) for pattern in (_HEADER_SENT_RE, _HEADER_TO_RE, _HEADER_SUBJECT_RE)
+    ):
+        end += 1
+    block = [_unquote(line) for line in lines[i + 1:end]]
+    has_sent = any(_HEADER_SENT_RE.match(line) for line in block)
+    has_to = any(_HEADER_TO_RE.match(line) or _HEADER_SUBJECT_RE.match(line) for line in block)
+    previous = next((line for line in reversed(lines[:i]) if line.strip()), "")
+    after_separator = bool(_SEPARATOR_RE.match(_unquote(previous)) or _REPLY_HEADER_RE.match(_unquote(previous)))
+    return end - i if has_sent and (has_to or after_separator) else 0
+
+
+def _find_quote_start(lines: List[str]) -> int:
+    """Index of the first line of quoted reply history, or len(lines)."""
+    seen_content = False
+    for i, line in enumerate(lines):
+        if seen_content and not line.lstrip().startswith(">") and _header_block(lines, i):
+            return i
+        if line.strip() and not line.lstrip().startswith(">"):
+            seen_content = True
+    return len(lines)
+
+
+def _strip_quotes(lines: List[str]) -> Tuple[List[str], List[str], List[str]]:
+    """Split lines into the new message, the quoted history and the dropped reply-header lines."""
+    start = _find_quote_start(lines)
+    body, quoted, headers = [], [], []
+    for line in lines[:start]:
+        if line.lstrip().startswith(">"):
+            quoted.append(_unquote(line))
+        else:
+            body.append(line)
+    i = start
+    while i < len(lines):
+        block = _header_block(lines, i)
+        if not block:
+            quoted.append(_unquote(lines[i]))
+            i += 1
+            continue
+        # Nur Kopfzeilen eines Antwortkopfs entfernen; "From:" und der Betreff können Daten tragen
+        for line in lines[i:i + block]:
+            line = _unquote(line)
+            if _REPLY_HEADER_RE.match(line) or _HEADER_SENT_RE.match(line) or _HEADER_TO_RE.match(line):
+                headers.append(line)
+            else:
+                quoted.append(line)
+        i += block
+    return body, quoted, headers
+
+
+def _is_signature_line(line: str) -> bool:
+    """A name, title, contact or legal footer line (not a note or instruction)."""
+    return bool(
+        _SIGNATURE_NAME_RE.match(line)
+        or _CONTACT_LINE_RE.match(line)
+        or _DISCLAIMER_RE.search(line)
+        or _BOILERPLATE_LINE_RE.match(line)
+    )
+
+
+def _strip_signature(lines: List[str]) -> List[str]:
+    """Remove the name, title, contact and footer lines of the signature (after '-- ' or a closing formula).
+
+    The sender name (first line after the closing formula), protected lines and
+    any other text are kept.
+    """
+    start = None
+    for i, line in enumerate(lines):
+        if _SIGNATURE_DELIMITER_RE.match(line) or (
+            _CLOSING_RE.match(line) and len(lines) - i - 1 <= _MAX_SIGNATURE_LINES
+        ):
+            start = i
+            break
+    if start is None:
+        return lines
+    signature = lines[start + 1:]
+    # Die erste Zeile nach der Grußformel ist meist der Name des Absenders (Kontaktperson)
+    name = next((i for i, line in enumerate(signature) if line.strip()), None)
+    return lines[:start] + [
+        line for i, line in enumerate(signature) if i == name or is_protected(line) or not _is_signature_line(line)
+    ]
+
+
+def _strip_boilerplate(lines: List[str]) -> List[str]:
+    """Remove disclaimer paragraphs and boilerplate lines, keeping protected lines."""
+    result = []
+    paragraph: List[str] = []
+
+    def flush():
+        if paragraph and _DISCLAIMER_RE.search(" ".join(paragraph)):
+            result.extend(line for line in paragraph if is_protected(line))
+        else:
+            result.extend(paragraph)
+        paragraph.clear()
+
+    for line in lines:
+        if not line.strip():
+            flush()
+            result.append(line)
+        elif (_BOILERPLATE_LINE_RE.match(line) or _FORWARD_MARKER_RE.match(line)) and not is_protected(line):
+            continue
+        else:
+            paragraph.append(line)
+    flush()
+    return result
+
+
+def _normalize(line: str) -> str:
+    return " ".join(line.lower().split())
+
+
+def _collapse_whitespace(lines: List[str]) -> str:
+    result = []
+    for line in lines:
+        line = _MULTI_SPACE_RE.sub(" ", line).strip()
+        if line or (result and result[-1]):
+            result.append(line)
+    return "\n".join(result).strip()
+
+
+def preprocess_email(text: str, keep_quoted_facts: bool = True) -> Tuple[str, Dict[str, Any]]:
+    """
+    Remove HTML, quoted replies, signatures and boilerplate from an email.
+
+    Args:
+        text (str): Raw input as pasted by the user
+        keep_quoted_facts (bool): Keep quoted history that holds data (addresses,
+            items, ...) the new message does not repeat. False drops all quoted
+            history, e.g. when the thread's earlier messages are already extracted.
+
+    Returns:
+        tuple: (cleaned text, report) where the report holds the estimated
+            "tokens_before", "tokens_after", "tokens_removed" and the tokens
+            removed per stage in "removed"
+    """
+    tokens_before = estimate_tokens(text)
+    removed = {}
+
+    plain = html_to_text(text).replace("\r\n", "\n").replace("\r", "\n")
+    removed["html"] = tokens_before - estimate_tokens(plain)
+    lines = [line.rstrip() for line in plain.split("\n")]
+
+    def size(parts):
+        return estimate_tokens("\n".join(parts))
+
+    body, quoted, headers = _strip_quotes(lines)
+
+    before = size(body)
+    body = _strip_signature(body)
+    removed["signature"] = before - size(body)
+
+    before = size(quoted)
+    if quoted and keep_quoted_facts:
+        # Zitierte Historie behalten, wenn sie Daten enthält, die die neue Nachricht nicht wiederholt
+        known = {_normalize(line) for line in body}
+        quoted = _strip_boilerplate(_strip_signature(quoted))
+        if any(
+            is_protected(line) and _normalize(line) not in known and not _HEADER_FROM_RE.match(line)
+            for line in quoted
+        ):
+            body = body + [""] + quoted
+            before -= size(quoted)
+    # Entfernte Kopfzeilen zählen zur zitierten Historie
+    removed["quoted"] = before + (size(headers) if headers else 0)
+
+    before = size(body)
+    body = _strip_boilerplate(body)
+    removed["boilerplate"] = before - size(body)
+
+    before = size(body)
+    cleaned = _collapse_whitespace(body)
+    removed["whitespace"] = before - estimate_tokens(cleaned)
+
+    tokens_after = estimate_tokens(cleaned)
+    report = {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_removed": tokens_before - tokens_after,
+        "removed": removed,
+    }
+    return cleaned, report
@@ -0,0 +1,307 @@
+"""
+Streaming export of extraction results into an address and an item table.
+
+Each booking becomes three rows of the address table (one per role) and one
+row per `ShipmentItem` in the item table, both keyed by the booking ID. The
+column layout is derived from the pydantic models, rows are kept as tuples
+and written in chunks, so memory stays bounded by `chunk_size` no matter how
+many bookings are exported::
+
+    with BookingExporter("exports/run1", fmt="parquet") as exporter:
+        for booking_id, booking in results:
+            exporter.add(booking_id, booking)
+
+writes exports/run1_addresses.parquet and exports/run1_items.parquet.
+Parquet needs pyarrow; JSONL and CSV only use the standard library. Values
+that do not fit a typed Parquet column (placeholders like "N/A" in a number
+column, e.g. from a booking serialized with `booking_json`) are written as
+null there, as `app.utils.freight` treats them; JSONL and CSV keep them. From the
+command line, a JSONL file of results (one booking, or {"booking_id": ...,
+"result": {...}} per line) is converted with::
+
+    python -m app.utils.export results.jsonl exports/run1 --format csv
+"""
+import argparse
+import csv
+import enum
+import json
+import typing
+from typing import Any, Dict, Iterable, List, Sequence, Tuple, Union
+
+from pydantic import BaseModel
+
+from app.schemas.shipment_booking_schema import (
+    AddressBase,
+    BillingAddress,
+    DeliveryAddress,
+    PickupAddress,
+    ShipmentBooking,
+    ShipmentInfo,
+    ShipmentItem,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed for Parquet
+    pa = pq = None
+
+FORMATS = ("jsonl", "csv", "parquet")
+DEFAULT_CHUNK_SIZE = 10_000
+
+ROLES = {
+    "pickup_address": PickupAddress,
+    "delivery_address": DeliveryAddress,
+    "billing_address": BillingAddress,
+}
+
+
+def _unwrap_optional(annotation):
+    args = [a for a in typing.get_args(annotation) if a is not type(None)]
+    return args[0] if typing.get_origin(annotation) is Union and len(args) == 1 else annotation
+
+
+def _scalar_fields(model: type) -> List[Tuple[str, type]]:
+    """
+    Columns of `model`: (field name, str/int/float/bool); lists and nested models are skipped.
+    """
+    fields = []
+    for name, field in model.model_fields.items():
+        annotation = _unwrap_optional(field.annotation)
+        if typing.get_origin(annotation) is not None or issubclass(annotation, BaseModel):
+            continue
+        if issubclass(annotation, enum.IntEnum):
+            annotation = int
+        fields.append((name, annotation if annotation in (str, int, float, bool) else str))
+    return fields
+
+
+def _address_columns() -> List[Tuple[str, type]]:
+    columns = [("booking_id", str), ("role", str)] + _scalar_fields(AddressBase)
+    seen = {name for name, _ in columns}
+    for model in ROLES.values():
+        for name, base in _scalar_fields(model):
+            if name not in seen:
+                columns.append((name, base))
+                seen.add(name)
+    return columns
+
+
+def _item_columns() -> List[Tuple[str, type]]:
+    # shipment_notes gehört zur Sendung und wird je Position wiederholt
+    return [("booking_id", str), ("position", int)] + _scalar_fields(ShipmentItem) + _scalar_fields(ShipmentInfo)
+
+
+ADDRESS_COLUMNS = _address_columns()
+ITEM_COLUMNS = _item_columns()
+_ADDRESS_FIELDS = [name for name, _ in ADDRESS_COLUMNS[2:]]
+_ITEM_FIELDS = [name for name, _ in _scalar_fields(ShipmentItem)]
+_LOAD_CARRIER = [name for name, _ in ITEM_COLUMNS].index("load_carrier")
+
+
+def booking_rows(booking_id: str, booking: Union[ShipmentBooking, Dict[str, Any]]) -> Tuple[List[tuple], List[tuple]]:
+    """
+    Flatten one booking into address rows and item rows (tuples in column order).
+
+    Args:
+        booking_id (str): ID linking the rows of both tables
+        booking: `ShipmentBooking` or its dict form (e.g. the workflow "result")
+
+    Returns:
+        tuple: (address rows, item rows)
+    """
+    if isinstance(booking, BaseModel):
+        booking = booking.model_dump()
+    address_rows = [
+        (booking_id, role) + tuple(map((booking.get(role) or {}).get, _ADDRESS_FIELDS))
+        for role in ROLES
+    ]
+    shipment = booking.get("shipment") or {}
+    notes = shipment.get("shipment_notes")
+    item_rows = []
+    for position, item in enumerate(shipment.get("items") or [], start=1):
+        row = (booking_id, position) + tuple(map(item.get, _ITEM_FIELDS)) + (notes,)
+        if isinstance(row[_LOAD_CARRIER], enum.Enum):
+            row = row[:_LOAD_CARRIER] + (int(row[_LOAD_CARRIER]),) + row[_LOAD_CARRIER + 1:]
+        item_rows.append(row)
+    return address_rows, item_rows
+
+
+class _JsonlSink:
+    extension = "jsonl"
+
+    def __init__(self, path: str, columns: List[Tuple[str, type]]):
+        self._names = [name for name, _ in columns]
+        self._encode = json.JSONEncoder(ensure_ascii=False, check_circular=False).encode
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, rows: List[tuple]) -> None:
+        names, encode = self._names, self._encode
+        self._file.writelines(encode(dict(zip(names, row))) + "\n" for row in rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _CsvSink:
+    extension = "csv"
+
+    def __init__(self, path: str, columns: List[Tuple[str, type]]):
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([name for name, _ in columns])
+
+    def write(self, rows: List[tuple]) -> None:
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _coerce(column: Sequence[Any], base: type) -> List[Any]:
+    """Values of `column` that do not fit `base` as None (strings: str of the value)."""
+    if base is str:
+        return [v if v is None or isinstance(v, str) else str(v) for v in column]
+    if base is bool:
+        return [v if isinstance(v, bool) else None for v in column]
+    if base is int:
+        return [
+            v if isinstance(v, int) else int(v) if isinstance(v, float) and v.is_integer() else None
+            for v in column
+        ]
+    return [v if isinstance(v, (int, float)) else None for v in column]
+
+
+class _ParquetSink:
+    extension = "parquet"
+
+    def __init__(self, path: str, columns: List[Tuple[str, type]]):
+        if pa is None:
+            raise ImportError("Parquet export needs pyarrow (pip install pyarrow)")
+        types = {str: pa.string(), int: pa.int64(), float: pa.float64(), bool: pa.bool_()}
+        self._bases = [base for _, base in columns]
+        self._schema = pa.schema([(name, types[base]) for name, base in columns])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def _array(self, column: Sequence[Any], field, base: type):
+        try:
+            return pa.array(column, type=field.type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Platzhalter wie "N/A" in Zahlenspalten - nur dann Wert für Wert prüfen
+            return pa.array(_coerce(column, base), type=field.type)
+
+    def write(self, rows: List[tuple]) -> None:
+        # Ein Chunk = eine Row Group; spaltenweise aus den Tupeln aufbauen
+        columns = list(zip(*rows))
+        arrays = [self._array(column, field, base) for column, field, base in zip(columns, self._schema, self._bases)]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+_SINKS = {"jsonl": _JsonlSink, "csv": _CsvSink, "parquet": _ParquetSink}
+
+
+class BookingExporter:
+    """
+    Chunked writer for the address and item table of many bookings.
+
+    Args:
+        prefix (str): Output path prefix; writes `<prefix>_addresses.<ext>` and `<prefix>_items.<ext>`
+        fmt (str): "jsonl", "csv" or "parquet"
+        chunk_size (int): Rows buffered per table before they are written
+    """
+
+    def __init__(self, prefix: str, fmt: str = "jsonl", chunk_size: int = DEFAULT_CHUNK_SIZE):
+        if fmt not in _SINKS:
+            raise ValueError(f"Unknown export format '{fmt}', expected one of {FORMATS}")
+        sink = _SINKS[fmt]
+        self.paths = {
+            "addresses": f"{prefix}_addresses.{sink.extension}",
+            "items": f"{prefix}_items.{sink.extension}",
+        }
+        self.chunk_size = chunk_size
+        self.counts = {"bookings": 0, "addresses": 0, "items": 0}
+        self._sinks = {
+            "addresses": sink(self.paths["addresses"], ADDRESS_COLUMNS),
+            "items": sink(self.paths["items"], ITEM_COLUMNS),
+        }
+        self._buffers: Dict[str, List[tuple]] = {"addresses": [], "items": []}
+
+    def add(self, booking_id: Any, booking: Union[ShipmentBooking, Dict[str, Any]]) -> None:
+        """Queue the rows of one booking; full chunks are written right away."""
+        address_rows, item_rows = booking_rows(str(booking_id), booking)
+        self.counts["bookings"] += 1
+        for table, rows in (("addresses", address_rows), ("items", item_rows)):
+            buffer = self._buffers[table]
+            buffer.extend(rows)
+            if len(buffer) >= self.chunk_size:
+                self._flush(table)
+
+    def _flush(self, table: str) -> None:
+        buffer = self._buffers[table]
+        if buffer:
+            self._sinks[table].write(buffer)
+            self.counts[table] += len(buffer)
+            self._buffers[table] = []
+
+    def close(self) -> Dict[str, int]:
+        """
+        Write the remaining rows and close the files.
+
+        Returns:
+            dict: Number of exported "bookings", "addresses" and "items"
+        """
+        for table, sink in self._sinks.items():
+            self._flush(table)
+            sink.close()
+        return self.counts
+
+    def __enter__(self) -> "BookingExporter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def export_bookings(
+    bookings: Iterable[Tuple[Any, Union[ShipmentBooking, Dict[str, Any]]]],
+    prefix: str,
+    fmt: str = "jsonl",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Dict[str, int]:
+    """
+    Export (booking_id, booking) pairs from any iterable, e.g. a generator over a batch run.
+
+    Returns:
+        dict: Number of exported "bookings", "addresses" and "items"
+    """
+    exporter = BookingExporter(prefix, fmt, chunk_size)
+    with exporter:
+        for booking_id, booking in bookings:
+            exporter.add(booking_id, booking)
+    return exporter.counts
+
+
+def _read_results(path: str):
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "result" in record:
+                yield record.get("booking_id", number), record["result"]
+            else:
+                yield number, record
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export extraction results as address and item tables")
+    parser.add_argument("results", help="JSONL file with one booking (or {booking_id, result}) per line")
+    parser.add_argument("prefix", help="Output path prefix")
+    parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    counts = export_bookings(_read_results(args.results), args.prefix, args.format, args.chunk_size)
+    print(f"{counts['bookings']} bookings -> {counts['addresses']} address rows, {counts['items']} item rows")
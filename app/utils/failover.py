@@ -0,0 +1,246 @@
+"""
+Circuit breakers and multi-provider failover for the extraction.
+
+Each configured model gets its own compiled extractor and its own
+`CircuitBreaker`. `FailoverExtractor` tries them in order and skips providers
+whose breaker is open, so during an incident requests go straight to the next
+provider instead of waiting for the timeout first. After `reset_timeout` an
+open breaker lets a few probe requests through (half-open) and closes again
+once they succeed.
+
+The chain is configured with `LLM_FAILOVER_CHAIN`, a comma-separated list of
+`provider:model[:key_index]` entries, e.g.
+
+    LLM_FAILOVER_CHAIN=anthropic:claude-3-7-sonnet-20250219:2,anthropic:claude-3-7-sonnet-20250219:1,openai:gpt-4o-mini
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from app.utils.cancellation import RequestCancelled
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when every provider in the chain is unavailable."""
+
+
+class CircuitBreaker:
+    """
+    Failure-rate and latency based circuit breaker.
+
+    The breaker opens when, over the last `window` calls (at least `min_calls`),
+    the failure rate reaches `failure_rate_threshold` or the share of calls
+    slower than `slow_call_seconds` reaches `slow_call_rate_threshold`. It stays
+    open for `reset_timeout` seconds, then admits up to `half_open_probes`
+    concurrent probe calls: a successful probe closes it, a failed one opens it
+    again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 8.0,
+        slow_call_rate_threshold: float = 0.8,
+        reset_timeout: float = 30.0,
+        half_open_probes: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self._clock = clock
+        self._calls = deque(maxlen=window)  # (failed, slow)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.transitions: List[Tuple[float, str]] = []
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+            self._probes = 0
+        return self._state
+
+    def _set_state(self, state: str) -> None:
+        if state != self._state:
+            logger.warning(f"Circuit breaker '{self.name}': {self._state} -> {state}")
+            self._state = state
+            self.transitions.append((self._clock(), state))
+
+    def allow(self) -> bool:
+        """Return True if a call may be made now (reserves a probe when half-open)."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            return False
+
+    def release(self) -> None:
+        """Give back the probe reserved by `allow()` for a call that ended without an outcome (e.g. cancelled)."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def record(self, failed: bool, seconds: float) -> None:
+        """Record the outcome and duration of a call made after `allow()`."""
+        slow = seconds >= self.slow_call_seconds
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed or slow:
+                    self._open()
+                else:
+                    self._set_state(CLOSED)
+                    self._calls.clear()
+                return
+            self._calls.append((failed, slow))
+            if self._state == CLOSED and len(self._calls) >= self.min_calls:
+                n = len(self._calls)
+                failure_rate = sum(f for f, _ in self._calls) / n
+                slow_rate = sum(s for _, s in self._calls) / n
+                if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+                    self._open()
+
+    @property
+    def opened_at(self) -> float:
+        """Clock value at which the breaker last opened."""
+        return self._opened_at
+
+    def _open(self) -> None:
+        self._opened_at = self._clock()
+        self._calls.clear()
+        self._set_state(OPEN)
+
+
+class FailoverExtractor(Runnable[Any, Dict[str, Any]]):
+    """
+    Runs the first available extractor of a chain of providers.
+
+    If every breaker is open, the provider that has been open longest is tried
+    as a last resort; its outcome does not change the breaker state.
+
+    Args:
+        extractors: (name, extractor) pairs in order of preference
+        breaker_factory: Creates the CircuitBreaker for a provider name
+    """
+
+    def __init__(self, extractors: List[Tuple[str, Runnable]], breaker_factory: Callable[[str], CircuitBreaker] = CircuitBreaker):
+        if not extractors:
+            raise ValueError("FailoverExtractor needs at least one extractor")
+        self.extractors = extractors
+        self.breakers = {name: breaker_factory(name) for name, _ in extractors}
+
+    def _candidates(self):
+        """(name, extractor, reserved) in order; `reserved` if `allow()` admitted the call."""
+        attempted = False
+        for name, extractor in self.extractors:
+            if self.breakers[name].allow():
+                attempted = True
+                yield name, extractor, True
+        if not attempted:
+            # Alle Breaker offen: letzter Versuch beim am längsten offenen Provider,
+            # statt jede Anfrage bis zum Ablauf von reset_timeout abzuweisen
+            name, extractor = min(self.extractors, key=lambda e: self.breakers[e[0]].opened_at)
+            yield name, extractor, False
+
+    def _settle(self, name: str, reserved: bool, failed: Optional[bool], start: float) -> None:
+        # failed=None: ohne Ergebnis beendet (Abbruch) - nur den Probe-Platz zurückgeben
+        if not reserved:
+            return
+        if failed is None:
+            self.breakers[name].release()
+        else:
+            self.breakers[name].record(failed, time.monotonic() - start)
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> Dict[str, Any]:
+        last_error = None
+        for name, extractor, reserved in self._candidates():
+            start = time.monotonic()
+            failed = None
+            try:
+                result = extractor.invoke(input, config, **kwargs)
+                failed = False
+                return result
+            except RequestCancelled:
+                # Abbruch durch den Aufrufer, kein Fehler des Providers
+                raise
+            except Exception as e:
+                failed = True
+                logger.warning(f"Provider '{name}' fehlgeschlagen ({type(e).__name__}), versuche nächsten")
+                last_error = e
+            finally:
+                self._settle(name, reserved, failed, start)
+        raise CircuitOpenError("No extraction provider available") from last_error
+
+    async def ainvoke(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> Dict[str, Any]:
+        last_error = None
+        for name, extractor, reserved in self._candidates():
+            start = time.monotonic()
+            failed = None
+            try:
+                result = await extractor.ainvoke(input, config, **kwargs)
+                failed = False
+                return result
+            except RequestCancelled:
+                # Abbruch durch den Aufrufer, kein Fehler des Providers
+                raise
+            except Exception as e:
+                failed = True
+                logger.warning(f"Provider '{name}' fehlgeschlagen ({type(e).__name__}), versuche nächsten")
+                last_error = e
+            finally:
+                # Auch bei asyncio.CancelledError und anderen BaseExceptions
+                self._settle(name, reserved, failed, start)
+        raise CircuitOpenError("No extraction provider available") from last_error
+
+    def states(self) -> Dict[str, str]:
+        """Current breaker state per provider."""
+        return {name: breaker.state for name, breaker in self.breakers.items()}
+
+
+def parse_failover_chain(spec: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Parse `provider:model[:key_index]` entries (default: `LLM_FAILOVER_CHAIN`).
+
+    Returns:
+        list: Dicts with "provider", "model" and "key_index"; empty if unset
+    """
+    spec = spec if spec is not None else os.environ.get("LLM_FAILOVER_CHAIN", "")
+    chain = []
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        parts = entry.split(":")
+        if len(parts) not in (2, 3) or parts[0] not in ("anthropic", "openai"):
+            raise ValueError(f"Invalid LLM_FAILOVER_CHAIN entry '{entry}', expected provider:model[:key_index]")
+        chain.append({
+            "provider": parts[0],
+            "model": parts[1],
+            "key_index": int(parts[2]) if len(parts) == 3 else 1,
+        })
+    return chain
@@ -0,0 +1,435 @@
+"""
+Fake chat model for offline load testing.
+
+`FakeShipmentChatModel` answers tool-calling requests the way the extraction
+graph expects - `ShipmentBooking` tool calls, `PatchFunctionErrors` fixes and
+`PatchDoc` updates - without any network access. Latency, deliberately invalid
+tool calls and provider failures (timeouts, 429, 529, truncated JSON) are drawn
+from configurable distributions, so the whole app can be load-tested offline.
+
+Enable it for `get_anthropic_llm` with `FAKE_LLM=1` (see `FakeShipmentChatModel.from_env`).
+Note that `load_environment` installs an in-memory LLM cache; vary the inputs
+of a load test, otherwise repeated prompts are served from the cache.
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import time
+from typing import Any, Dict, Iterator, AsyncIterator, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr, ValidationError
+
+from app.schemas.shipment_booking_schema import ShipmentAddresses, ShipmentBooking, ShipmentDates, ShipmentInfo
+
+LATENCY_DISTRIBUTIONS = ("fixed", "lognormal", "heavy_tail")
+
+_COMPANIES = [
+    ("Technik GmbH", "Industriestr. 42", "33602", "Bielefeld", "DE"),
+    ("Logistik AG", "Hauptstraße 123", "70173", "Stuttgart", "DE"),
+    ("Finanz GmbH", "Rechnungsweg 7", "10115", "Berlin", "DE"),
+    ("Möbelhaus Kyritz", "Perleberger Str. 5", "16866", "Kyritz", "DE"),
+    ("Holzbau Dettenhausen", "Tübinger Str. 12", "72135", "Dettenhausen", "DE"),
+    ("Transports Dupont SARL", "12 Rue de la Gare", "67000", "Strasbourg", "FR"),
+]
+_GOODS = [
+    ("Luftreiniger, Ersatzfilter und Zubehör", 1, (120, 80, 120), 150, True),
+    ("Desinfektionsmittel", 1, (120, 80, 160), 510, False),
+    ("Holzbauplatten", 5, (300, 80, 5), 40, True),
+    ("Elektronische Bauteile", 2, (60, 40, 30), 15, True),
+    ("Maschinenteile", 1, (120, 100, 120), 115, False),
+]
+_SCHEMA_ID_RE = re.compile(r"<schema id=([^>\s]+)>")
+# Schemas der Tool-Calls nach Name; reduzierte Varianten (Adressbuch) heißen gleich und lassen nur optionale Felder weg
+_TOOL_SCHEMAS = {schema.__name__: schema for schema in (ShipmentBooking, ShipmentInfo, ShipmentAddresses, ShipmentDates)}
+
+
+class FakeLLMError(Exception):
+    """Base class for errors injected by the fake model."""
+
+    status_code: Optional[int] = None
+
+
+class FakeTimeoutError(FakeLLMError, TimeoutError):
+    """The simulated request exceeded the client timeout."""
+
+
+class FakeRateLimitError(FakeLLMError):
+    """Simulated HTTP 429 (rate limit exceeded)."""
+
+    status_code = 429
+
+
+class FakeOverloadedError(FakeLLMError):
+    """Simulated HTTP 529 (provider overloaded)."""
+
+    status_code = 529
+
+
+def fake_llm_enabled():
+    """Return True if the fake model is selected via the `FAKE_LLM` environment variable."""
+    return os.environ.get("FAKE_LLM", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class FakeShipmentChatModel(BaseChatModel):
+    """
+    Offline stand-in for ChatAnthropic that emits `ShipmentBooking` tool calls.
+
+    Latency:
+        fixed       - always `latency_median` seconds
+        lognormal   - median `latency_median`, shape `latency_sigma`
+        heavy_tail  - Pareto tail with index `tail_alpha`, median `latency_median`
+    Requests whose sampled latency exceeds `timeout` fail with FakeTimeoutError
+    after `timeout` seconds, like a real client would. `output_token_latency`
+    adds decoding time per generated token on top, so short answers (e.g.
+    PatchDoc updates) come back faster than full bookings.
+
+    Failure injection (independent per request):
+        invalid_rate    - tool call with values that fail schema validation
+        timeout_rate    - FakeTimeoutError after `timeout` seconds
+        rate_limit_rate - FakeRateLimitError (429), returned quickly
+        overloaded_rate - FakeOverloadedError (529), returned quickly
+        truncated_rate  - tool call JSON cut off as if `max_tokens` was hit
+    """
+
+    model: str = "fake-shipment"
+    latency: str = "fixed"
+    latency_median: float = 0.0
+    latency_sigma: float = 0.5
+    tail_alpha: float = 1.5
+    first_token_fraction: float = 0.3
+    output_token_latency: float = 0.0
+    timeout: Optional[float] = 10.0
+    invalid_rate: float = 0.0
+    timeout_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    overloaded_rate: float = 0.0
+    truncated_rate: float = 0.0
+    stream_chunk_chars: int = 40
+    seed: Optional[int] = None
+
+    _rng: random.Random = PrivateAttr()
+    _ids: int = PrivateAttr(default=0)
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        if self.latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{self.latency}'. Expected one of {LATENCY_DISTRIBUTIONS}")
+        self._rng = random.Random(self.seed)
+
+    @classmethod
+    def from_env(cls, **overrides: Any) -> "FakeShipmentChatModel":
+        """
+        Build the fake model from `FAKE_LLM_*` environment variables.
+
+        FAKE_LLM_LATENCY (fixed|lognormal|heavy_tail), FAKE_LLM_LATENCY_MEDIAN,
+        FAKE_LLM_LATENCY_SIGMA, FAKE_LLM_TAIL_ALPHA, FAKE_LLM_OUTPUT_TOKEN_LATENCY, FAKE_LLM_TIMEOUT,
+        FAKE_LLM_INVALID_RATE, FAKE_LLM_TIMEOUT_RATE, FAKE_LLM_429_RATE,
+        FAKE_LLM_529_RATE, FAKE_LLM_TRUNCATED_RATE, FAKE_LLM_SEED
+        """
+        env = {
+            "latency": ("FAKE_LLM_LATENCY", str),
+            "latency_median": ("FAKE_LLM_LATENCY_MEDIAN", float),
+            "latency_sigma": ("FAKE_LLM_LATENCY_SIGMA", float),
+            "tail_alpha": ("FAKE_LLM_TAIL_ALPHA", float),
+            "output_token_latency": ("FAKE_LLM_OUTPUT_TOKEN_LATENCY", float),
+            "timeout": ("FAKE_LLM_TIMEOUT", float),
+            "invalid_rate": ("FAKE_LLM_INVALID_RATE", float),
+            "timeout_rate": ("FAKE_LLM_TIMEOUT_RATE", float),
+            "rate_limit_rate": ("FAKE_LLM_429_RATE", float),
+            "overloaded_rate": ("FAKE_LLM_529_RATE", float),
+            "truncated_rate": ("FAKE_LLM_TRUNCATED_RATE", float),
+            "seed": ("FAKE_LLM_SEED", int),
+        }
+        kwargs = {
+            field: cast(os.environ[var])
+            for field, (var, cast) in env.items()
+            if os.environ.get(var)
+        }
+        kwargs.update(overrides)
+        return cls(**kwargs)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-shipment"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model, "latency": self.latency, "latency_median": self.latency_median}
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        formatted = [convert_to_openai_tool(t) for t in tools]
+        return self.bind(tools=formatted, tool_choice=tool_choice, **kwargs)
+
+    # Sampling
+
+    def sample_latency(self) -> float:
+        """Draw a total response latency in seconds."""
+        median = self.latency_median
+        if median <= 0 or self.latency == "fixed":
+            return max(median, 0.0)
+        if self.latency == "lognormal":
+            return median * math.exp(self.latency_sigma * self._rng.gauss(0.0, 1.0))
+        # Pareto with the same median: x_m * 2 ** (1 / alpha) == median
+        return median * self._rng.paretovariate(self.tail_alpha) / 2 ** (1 / self.tail_alpha)
+
+    def _plan(self) -> Dict[str, Any]:
+        """Decide latency and outcome of one request."""
+        latency = self.sample_latency()
+        roll = self._rng.random()
+        outcome = "ok"
+        for name, rate in (
+            ("timeout", self.timeout_rate),
+            ("rate_limit", self.rate_limit_rate),
+            ("overloaded", self.overloaded_rate),
+            ("truncated", self.truncated_rate),
+        ):
+            if roll < rate:
+                outcome = name
+                break
+            roll -= rate
+        if self.timeout is not None and (outcome == "timeout" or latency > self.timeout):
+            return {"outcome": "timeout", "latency": self.timeout}
+        if outcome in ("rate_limit", "overloaded"):
+            # Rejections come back quickly
+            latency = min(latency, 0.05)
+        return {"outcome": outcome, "latency": latency, "invalid": self._rng.random() < self.invalid_rate}
+
+    @staticmethod
+    def _raise(outcome: str) -> None:
+        if outcome == "timeout":
+            raise FakeTimeoutError("Request timed out.")
+        if outcome == "rate_limit":
+            raise FakeRateLimitError("Error code: 429 - rate_limit_error: Number of requests has exceeded your rate limit.")
+        if outcome == "overloaded":
+            raise FakeOverloadedError("Error code: 529 - overloaded_error: Overloaded")
+
+    def _next_id(self, prefix: str) -> str:
+        self._ids += 1
+        return f"{prefix}_{self._ids:06d}"
+
+    # Response construction
+
+    def _respond(self, messages: List[BaseMessage], tools: Optional[list], tool_choice: Any, plan: Dict[str, Any]) -> AIMessage:
+        names = [t["function"]["name"] for t in tools or []]
+        if "PatchFunctionErrors" in names:
+            name, args = "PatchFunctionErrors", self._patch_errors(messages)
+        elif "PatchDoc" in names:
+            name, args = "PatchDoc", self._patch_doc(messages)
+        else:
+            if isinstance(tool_choice, str) and tool_choice in names:
+                name = tool_choice
+            else:
+                name = names[0] if names else ShipmentBooking.__name__
+            args = self._booking(invalid=plan.get("invalid", False))
+            # Partial schemas used by the chunked extraction
+            if name == "ShipmentInfo":
+                args = args["shipment"]
+            elif name == "ShipmentAddresses":
+                del args["shipment"]
+            elif name == "ShipmentDates":
+                args = {
+                    "pickup_date": args["pickup_address"].get("pickup_date"),
+                    "delivery_date": args["delivery_address"].get("delivery_date"),
+                }
+            # Reduzierte Schemas (z.B. ohne Adressfelder aus dem Adressbuch) nur mit ihren Feldern beantworten
+            schema = next((t["function"]["parameters"] for t in tools or [] if t["function"]["name"] == name), None)
+            if schema:
+                args = _fit_to_schema(args, schema)
+
+        args_json = json.dumps(args, ensure_ascii=False)
+        usage = {
+            "input_tokens": _estimate_tokens(messages, tools),
+            "output_tokens": max(1, len(args_json) // 4),
+        }
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        tool_call_id = self._next_id("toolu_fake")
+        if plan["outcome"] == "truncated":
+            cut = args_json[: max(1, len(args_json) * 2 // 3)]
+            return AIMessage(
+                content="",
+                invalid_tool_calls=[{"id": tool_call_id, "name": name, "args": cut, "error": "Truncated JSON", "type": "invalid_tool_call"}],
+                usage_metadata=usage,
+                response_metadata={"model_name": self.model, "stop_reason": "max_tokens"},
+                id=self._next_id("msg_fake"),
+            )
+        return AIMessage(
+            content="",
+            tool_calls=[{"id": tool_call_id, "name": name, "args": args, "type": "tool_call"}],
+            usage_metadata=usage,
+            response_metadata={"model_name": self.model, "stop_reason": "tool_use"},
+            id=self._next_id("msg_fake"),
+        )
+
+    def _booking(self, invalid: bool = False) -> Dict[str, Any]:
+        pickup, delivery, billing = self._rng.sample(_COMPANIES, 3)
+        items = []
+        for _ in range(self._rng.randint(1, 4)):
+            name, carrier, (length, width, height), weight, stackable = self._rng.choice(_GOODS)
+            items.append({
+                "load_carrier": carrier, "name": name, "quantity": self._rng.randint(1, 49),
+                "length": length, "width": width, "height": height, "weight": weight, "stackable": stackable,
+            })
+        if invalid:
+            item = self._rng.choice(items)
+            if self._rng.random() < 0.5:
+                item["quantity"] = "viele"
+            else:
+                item["weight"] = f"{item['weight']} kg"
+        return {
+            "pickup_address": _address(pickup, pickup_date="03.03.2025", pickup_time_from="07:00", pickup_time_to="09:00"),
+            "delivery_address": _address(delivery, delivery_date="04.03.2025"),
+            "billing_address": _address(billing, vat_id="DE123456789"),
+            "shipment": {"items": items, "shipment_notes": None},
+        }
+
+    def _patch_errors(self, messages: List[BaseMessage]) -> Dict[str, Any]:
+        """Fix the failing tool call by replacing every value its schema rejects."""
+        target = next((m for m in reversed(messages) if isinstance(m, ToolMessage)), None)
+        target_id = target.tool_call_id if target else ""
+        call: Dict[str, Any] = {}
+        for m in reversed(messages):
+            if isinstance(m, AIMessage):
+                call = next((tc for tc in m.tool_calls if tc["id"] == target_id), {})
+                break
+        schema = _TOOL_SCHEMAS.get(call.get("name"), ShipmentBooking)
+        patches = []
+        try:
+            schema.model_validate(call.get("args", {}))
+        except ValidationError as e:
+            for error in e.errors():
+                path = "/" + "/".join(str(p) for p in error["loc"])
+                patches.append({"op": "replace", "path": path, "value": _repair_value(error["type"])})
+        return {"json_doc_id": target_id, "planned_edits": f"Fix {len(patches)} validation error(s).", "patches": patches}
+
+    def _patch_doc(self, messages: List[BaseMessage]) -> Dict[str, Any]:
+        """Update an existing document; keeps it unchanged."""
+        doc_id = ShipmentBooking.__name__
+        for m in messages:
+            if isinstance(m.content, str) and (match := _SCHEMA_ID_RE.search(m.content)):
+                doc_id = match.group(1)
+                break
+        return {"json_doc_id": doc_id, "planned_edits": "No changes required.", "patches": []}
+
+    # BaseChatModel interface
+
+    def _decode(self, messages, tools, tool_choice, plan: Dict[str, Any]) -> AIMessage:
+        """Build the response and add its decoding time to the planned latency."""
+        message = self._respond(messages, tools, tool_choice, plan)
+        plan["latency"] += message.usage_metadata["output_tokens"] * self.output_token_latency
+        return message
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, tool_choice=None, **kwargs) -> ChatResult:
+        plan = self._plan()
+        if plan["outcome"] not in ("ok", "truncated"):
+            time.sleep(plan["latency"])
+            self._raise(plan["outcome"])
+        message = self._decode(messages, tools, tool_choice, plan)
+        time.sleep(plan["latency"])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, tools=None, tool_choice=None, **kwargs) -> ChatResult:
+        plan = self._plan()
+        if plan["outcome"] not in ("ok", "truncated"):
+            await asyncio.sleep(plan["latency"])
+            self._raise(plan["outcome"])
+        message = self._decode(messages, tools, tool_choice, plan)
+        await asyncio.sleep(plan["latency"])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, message: AIMessage, plan: Dict[str, Any]):
+        """Split a response into (delay, chunk) pairs; the first delay is time-to-first-token."""
+        calls = message.tool_calls or message.invalid_tool_calls
+        call = calls[0]
+        args = call["args"] if isinstance(call["args"], str) else json.dumps(call["args"], ensure_ascii=False)
+        pieces = [args[i:i + self.stream_chunk_chars] for i in range(0, len(args), self.stream_chunk_chars)] or [""]
+        first = plan["latency"] * self.first_token_fraction
+        rest = (plan["latency"] - first) / max(len(pieces) - 1, 1)
+        for i, piece in enumerate(pieces):
+            chunk = AIMessageChunk(
+                content="",
+                tool_call_chunks=[{
+                    "name": call["name"] if i == 0 else None,
+                    "args": piece,
+                    "id": call["id"] if i == 0 else None,
+                    "index": 0,
+                    "type": "tool_call_chunk",
+                }],
+                id=message.id,
+            )
+            yield (first if i == 0 else rest), ChatGenerationChunk(message=chunk)
+        yield 0.0, ChatGenerationChunk(message=AIMessageChunk(
+            content="", usage_metadata=message.usage_metadata,
+            response_metadata=message.response_metadata, id=message.id,
+        ))
+
+    def _stream(self, messages, stop=None, run_manager=None, tools=None, tool_choice=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        plan = self._plan()
+        if plan["outcome"] != "truncated" and plan["outcome"] != "ok":
+            time.sleep(plan["latency"])
+            self._raise(plan["outcome"])
+        message = self._decode(messages, tools, tool_choice, plan)
+        for delay, chunk in self._chunks(message, plan):
+            time.sleep(delay)
+            if run_manager:
+                run_manager.on_llm_new_token("", chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, tools=None, tool_choice=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        plan = self._plan()
+        if plan["outcome"] != "truncated" and plan["outcome"] != "ok":
+            await asyncio.sleep(plan["latency"])
+            self._raise(plan["outcome"])
+        message = self._decode(messages, tools, tool_choice, plan)
+        for delay, chunk in self._chunks(message, plan):
+            await asyncio.sleep(delay)
+            if run_manager:
+                await run_manager.on_llm_new_token("", chunk=chunk)
+            yield chunk
+
+
+def _address(company, **extra):
+    name, street, postal_code, city, country = company
+    return {
+        "company": name, "street": street, "postal_code": postal_code,
+        "city": city, "country": country, **extra,
+    }
+
+
+def _fit_to_schema(args: Dict[str, Any], schema: Dict[str, Any], defs: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Drop keys of nested objects that the JSON schema does not define."""
+    defs = schema.get("$defs", defs or {})
+    if "$ref" in schema:
+        schema = defs.get(schema["$ref"].rsplit("/", 1)[-1], {})
+    properties = schema.get("properties")
+    if not properties:
+        return args
+    return {
+        key: _fit_to_schema(value, properties[key], defs) if isinstance(value, dict) else value
+        for key, value in args.items()
+        if key in properties
+    }
+
+
+def _repair_value(error_type: str):
+    if error_type.startswith("int"):
+        return 1
+    if error_type.startswith("bool"):
+        return False
+    if error_type.startswith("string"):
+        return ""
+    return None
+
+
+def _estimate_tokens(messages: List[BaseMessage], tools: Optional[list]) -> int:
+    """Rough token count (4 characters per token) of the prompt and tool schemas."""
+    chars = sum(len(m.content) if isinstance(m.content, str) else len(str(m.content)) for m in messages)
+    if tools:
+        chars += len(json.dumps(tools))
+    return max(1, chars // 4)
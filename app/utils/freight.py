@@ -0,0 +1,187 @@
+"""
+Volume, loading meters and chargeable weight of shipment items, vectorized with NumPy.
+
+All items of a batch are laid out as flat column arrays (one entry per
+`ShipmentItem`, plus the index of its booking), computed in one pass and
+summed per booking with `np.bincount` - re-pricing a few hundred thousand
+historical bookings takes well under a second once the columns are loaded.
+The item table of `app.utils.export` can be passed in as columns
+(`item_table_metrics`).
+
+Conventions:
+- dimensions in cm, `weight` in kg per piece, `quantity` pieces
+- loading meters (LDM): floor positions x length x width / trailer width;
+  stackable items share a floor position up to `max_stack` high as long as
+  the stack fits under `trailer_height_cm`
+- volumetric weight: volume in cm³ / `volume_divisor` (3000 = 333 kg/m³ for
+  road freight, 6000 for air, 5000 for express)
+- chargeable weight: max(actual, volumetric, LDM x `ldm_weight`) per booking
+  (`ldm_weight=0` disables the LDM rule)
+
+Items with a missing dimension get NaN volume (and NaN loading meters if
+length or width is missing; a stackable item of unknown height is not
+stacked), items with a missing weight NaN actual weight. Both are counted in
+"incomplete_items"; the booking totals leave NaN values out.
+"""
+import operator
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Sequence, Union
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.utils.serialization import booking_value
+
+VOLUME_DIVISORS = {"road": 3000, "express": 5000, "air": 6000}
+
+
+@dataclass(frozen=True)
+class FreightParameters:
+    """Divisors and trailer dimensions for the calculation (see the module docstring)."""
+
+    volume_divisor: float = VOLUME_DIVISORS["road"]
+    ldm_weight: float = 1850.0
+    trailer_width_cm: float = 240.0
+    trailer_height_cm: float = 270.0
+    max_stack: int = 2
+
+
+DEFAULT_PARAMETERS = FreightParameters()
+
+
+_ITEM_FIELDS = ("quantity", "length", "width", "height", "weight", "stackable")
+_get_item_fields = operator.itemgetter(*_ITEM_FIELDS)
+_get_item_attributes = operator.attrgetter(*_ITEM_FIELDS)
+
+
+def _item_matrix(rows: Sequence[tuple]) -> np.ndarray:
+    """(items x 6) float matrix of `_ITEM_FIELDS`; None -> NaN, stackable True -> 1."""
+    try:
+        return np.array(rows, dtype=np.float64).reshape(len(rows), len(_ITEM_FIELDS))
+    except (TypeError, ValueError):
+        # Platzhalter wie "N/A" (z.B. aus einer mit booking_json serialisierten Buchung)
+        return np.array(
+            [[v if isinstance(v, (int, float)) else np.nan for v in row] for row in rows], dtype=np.float64
+        ).reshape(len(rows), len(_ITEM_FIELDS))
+
+
+def compute_item_metrics(
+    booking_index: np.ndarray,
+    quantity: np.ndarray,
+    length: np.ndarray,
+    width: np.ndarray,
+    height: np.ndarray,
+    weight: np.ndarray,
+    stackable: np.ndarray,
+    bookings: Optional[int] = None,
+    params: FreightParameters = DEFAULT_PARAMETERS,
+) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Compute the metrics from column arrays of shipment items.
+
+    Args:
+        booking_index: Booking number (0..n-1) of each item
+        quantity, length, width, height, weight: Float arrays, NaN for missing values
+            (a missing quantity counts as 1 piece)
+        stackable: Bool array
+        bookings (int, optional): Number of bookings (default: max index + 1)
+        params (FreightParameters): Divisors and trailer dimensions
+
+    Returns:
+        dict: "items" and "bookings", each a dict of arrays: "volume_m3",
+            "loading_meters", "actual_weight", "volumetric_weight" and
+            "chargeable_weight"; "bookings" also has "incomplete_items"
+    """
+    booking_index = np.asarray(booking_index, dtype=np.intp)
+    if bookings is None:
+        bookings = int(booking_index.max()) + 1 if booking_index.size else 0
+    quantity = np.where(np.isnan(quantity), 1.0, quantity)
+
+    piece_cm3 = length * width * height
+    volume_cm3 = piece_cm3 * quantity
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fits = np.floor(params.trailer_height_cm / height)
+    # Ohne Höhe ist nicht sicher, dass der Stapel passt: dann nicht stapeln
+    stack = np.where(stackable & ~np.isnan(height), np.clip(fits, 1, params.max_stack), 1.0)
+    floor_positions = np.ceil(quantity / stack)
+    loading_meters = floor_positions * length * width / (params.trailer_width_cm * 100.0)
+    actual_weight = weight * quantity
+    volumetric_weight = volume_cm3 / params.volume_divisor
+    items = {
+        "volume_m3": volume_cm3 / 1e6,
+        "loading_meters": loading_meters,
+        "actual_weight": actual_weight,
+        "volumetric_weight": volumetric_weight,
+        "chargeable_weight": np.fmax(
+            np.fmax(actual_weight, volumetric_weight), loading_meters * params.ldm_weight
+        ),
+    }
+
+    def per_booking(values):
+        return np.bincount(booking_index, weights=np.nan_to_num(values), minlength=bookings).astype(np.float64)
+
+    totals = {name: per_booking(items[name]) for name in ("volume_m3", "loading_meters", "actual_weight", "volumetric_weight")}
+    totals["chargeable_weight"] = np.maximum(
+        np.maximum(totals["actual_weight"], totals["volumetric_weight"]),
+        totals["loading_meters"] * params.ldm_weight,
+    )
+    incomplete = np.isnan(piece_cm3) | np.isnan(weight)
+    totals["incomplete_items"] = np.bincount(booking_index, weights=incomplete, minlength=bookings).astype(np.int64)
+    return {"items": items, "bookings": totals}
+
+
+def freight_metrics(bookings: Iterable[Union[BaseModel, Dict[str, Any]]], params: FreightParameters = DEFAULT_PARAMETERS) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Compute the metrics for a batch of bookings (`ShipmentBooking` models or dicts).
+
+    Returns:
+        dict: See `compute_item_metrics`; "bookings" arrays are in input order
+    """
+    index, rows = [], []
+    count = 0
+    for count, booking in enumerate(bookings, start=1):
+        items = booking_value(booking_value(booking, "shipment"), "items") or []
+        index.extend([count - 1] * len(items))
+        if isinstance(booking, BaseModel):
+            rows += list(map(_get_item_attributes, items))
+            continue
+        try:
+            rows += list(map(_get_item_fields, items))
+        except KeyError:
+            # Unvollständige Dicts (nicht aus model_dump)
+            rows += [tuple(map(item.get, _ITEM_FIELDS)) for item in items]
+    matrix = _item_matrix(rows)
+    return compute_item_metrics(
+        np.array(index, dtype=np.intp), *matrix[:, :5].T, stackable=matrix[:, 5] == 1,
+        bookings=count, params=params,
+    )
+
+
+def item_table_metrics(table: Dict[str, Sequence[Any]], params: FreightParameters = DEFAULT_PARAMETERS) -> Dict[str, Any]:
+    """
+    Compute the metrics from an item table with a "booking_id" column.
+
+    Args:
+        table (dict): Columns as written by `app.utils.export` (e.g.
+            `pyarrow.parquet.read_table(path).to_pydict()` or a pandas DataFrame)
+
+    Returns:
+        dict: See `compute_item_metrics`, plus "booking_ids" in the order of the "bookings" arrays
+    """
+    booking_ids, booking_index = np.unique(np.asarray(table["booking_id"]), return_inverse=True)
+    columns = {
+        name: np.asarray(table[name], dtype=np.float64)
+        for name in ("quantity", "length", "width", "height", "weight")
+    }
+    stackable = np.asarray(table["stackable"], dtype=object)
+    metrics = compute_item_metrics(
+        booking_index, stackable=np.equal(stackable, True), bookings=len(booking_ids), params=params, **columns
+    )
+    metrics["booking_ids"] = booking_ids
+    return metrics
+
+
+def booking_metrics(booking: Union[BaseModel, Dict[str, Any]], params: FreightParameters = DEFAULT_PARAMETERS) -> Dict[str, float]:
+    """Totals of a single booking as plain numbers."""
+    totals = freight_metrics([booking], params)["bookings"]
+    return {name: values[0].item() for name, values in totals.items()}
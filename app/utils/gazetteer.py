@@ -0,0 +1,363 @@
+"""
+Postal-code gazetteer for filling and checking extracted addresses.
+
+The index is a read-only binary file that is memory-mapped on first use, so
+importing costs nothing and all processes on a host share the same pages of
+the OS page cache. Layout (little endian):
+
+    header   magic b"PLZ2", slot count (power of two), entry count, strings
+             offset, ISO codes of the contained countries (64 bytes), ISO
+             codes of the countries whose postal codes are complete (64 bytes)
+    slots    slot count x (12-byte key, uint32 offset); key = country + postal
+             code, NUL-padded; offset 0 marks an empty slot
+    strings  per key: uint16 length + city names (UTF-8, separated by \\x1f)
+
+Lookups hash the key with CRC32 and probe linearly - one or two struct reads
+per lookup; decoded results of recent lookups are kept in a small LRU cache. Build the index from GeoNames postal-code dumps (tab-separated:
+country, postal code, place name, ...) and name the countries they cover
+completely::
+
+    python -m app.utils.gazetteer data/DE.txt data/AT.txt data/CH.txt --complete DE,AT,CH
+
+A postal code is only reported as unknown for a complete country; for other
+countries (e.g. the sample data in data/postal_codes.tsv, compiled on first use
+without an index file) a missing code says nothing. A TSV file can declare its
+coverage in a comment line ("# complete: DE,AT"). The index path can be set
+via `POSTAL_INDEX_PATH`.
+"""
+import functools
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import unicodedata
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from pydantic import BaseModel
+
+from app.utils.serialization import PLACEHOLDERS, booking_value
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data")
+SAMPLE_TSV = os.path.join(DATA_DIR, "postal_codes.tsv")
+DEFAULT_INDEX = os.path.join(DATA_DIR, "postal_codes.idx")
+
+_MAGIC = b"PLZ2"
+_HEADER = struct.Struct("<4sIII64s64s")
+_SLOT = struct.Struct("<12sI")
+_LENGTH = struct.Struct("<H")
+_KEY_SIZE = 12
+_SEPARATOR = "\x1f"
+_COVERAGE_RE = re.compile(r"^#\s*complete:\s*(.*)$", re.IGNORECASE)
+
+# Postleitzahl-Formate je Land (nach Normalisierung: Großbuchstaben, ohne Länderpräfix)
+POSTAL_CODE_FORMATS = {
+    "DE": re.compile(r"\d{5}"),
+    "AT": re.compile(r"\d{4}"),
+    "CH": re.compile(r"\d{4}"),
+    "LI": re.compile(r"\d{4}"),
+    "FR": re.compile(r"\d{5}"),
+    "IT": re.compile(r"\d{5}"),
+    "ES": re.compile(r"\d{5}"),
+    "NL": re.compile(r"\d{4}(?: ?[A-Z]{2})?"),
+    "BE": re.compile(r"\d{4}"),
+    "LU": re.compile(r"\d{4}"),
+    "DK": re.compile(r"\d{4}"),
+    "PL": re.compile(r"\d{2}-\d{3}"),
+    "CZ": re.compile(r"\d{3} ?\d{2}"),
+    "GB": re.compile(r"[A-Z]{1,2}\d[A-Z\d]? ?\d[A-Z]{2}"),
+}
+# Länderpräfixe wie "D-70173", "A-1010", "CH-8001", "L-1234"
+_PREFIXES = {"D": "DE", "A": "AT", "CH": "CH", "F": "FR", "I": "IT", "E": "ES", "NL": "NL",
+             "B": "BE", "L": "LU", "DK": "DK", "PL": "PL", "CZ": "CZ", "DE": "DE", "AT": "AT", "FR": "FR"}
+_PREFIX_RE = re.compile(r"^([A-Z]{1,2})[- ](?=\d)")
+# Ländernamen, die das Modell statt des ISO-Codes liefert
+_COUNTRY_NAMES = {"DEUTSCHLAND": "DE", "GERMANY": "DE", "ÖSTERREICH": "AT", "AUSTRIA": "AT",
+                  "SCHWEIZ": "CH", "SWITZERLAND": "CH", "FRANKREICH": "FR", "FRANCE": "FR",
+                  "NIEDERLANDE": "NL", "NETHERLANDS": "NL", "POLEN": "PL", "POLAND": "PL",
+                  "ITALIEN": "IT", "ITALY": "IT", "BELGIEN": "BE", "BELGIUM": "BE"}
+# Zusätze, die nicht zum Ortsnamen gehören ("Frankfurt am Main", "Halle (Saale)", "Weil am Rhein")
+_CITY_QUALIFIER_RE = re.compile(r"\s*(?:[(,/]|\s(?:am|an der|im|in der|ob der|bei|sur|on|upon)\s).*$", re.IGNORECASE)
+_MISSING = (None, "", *PLACEHOLDERS)
+
+
+def normalize_postal_code(postal_code: str, country: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """
+    Normalize a postal code and split off a country prefix ("D-70173").
+
+    Returns:
+        tuple: (postal code, country from the prefix or `country`)
+    """
+    code = " ".join(postal_code.upper().split())
+    match = _PREFIX_RE.match(code)
+    if match and match.group(1) in _PREFIXES:
+        country = country or _PREFIXES[match.group(1)]
+        code = code[match.end():]
+    return code, country
+
+
+def _key(country: str, postal_code: str) -> bytes:
+    return (country + postal_code).encode("ascii", "ignore")[:_KEY_SIZE].ljust(_KEY_SIZE, b"\0")
+
+
+def _index_code(country: str, postal_code: str) -> str:
+    # Niederlande: "1011 AB" - GeoNames führt nur die 4 Ziffern
+    return postal_code[:4] if country == "NL" else postal_code
+
+
+def build_index(sources: Iterable[str], path: str = DEFAULT_INDEX, complete: Iterable[str] = ()) -> int:
+    """
+    Compile GeoNames-style TSV files into an index file.
+
+    Args:
+        sources: TSV files (country, postal code, place name, ...); a line
+            "# complete: DE,AT" marks countries the file covers completely
+        path (str): Output file; written atomically
+        complete: ISO codes of further countries with complete postal codes
+
+    Returns:
+        int: Number of postal codes in the index
+    """
+    cities: Dict[bytes, List[str]] = defaultdict(list)
+    complete = {c.strip().upper() for c in complete if c.strip()}
+    for source in sources:
+        with open(source, encoding="utf-8") as f:
+            for line in f:
+                coverage = _COVERAGE_RE.match(line)
+                if coverage:
+                    complete.update(c.strip().upper() for c in coverage.group(1).split(",") if c.strip())
+                    continue
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) < 3 or not fields[0] or not fields[1]:
+                    continue
+                country = fields[0].upper()
+                code, _ = normalize_postal_code(fields[1], country)
+                key = _key(country, _index_code(country, code))
+                if fields[2] not in cities[key]:
+                    cities[key].append(fields[2])
+
+    slot_count = 1
+    while slot_count < max(8, len(cities) * 2):  # Füllgrad <= 50 %
+        slot_count *= 2
+    slots = bytearray(slot_count * _SLOT.size)
+    strings = bytearray(b"\0")  # Offset 0 = leerer Slot
+    for key, names in cities.items():
+        value = _SEPARATOR.join(names).encode("utf-8")
+        offset = len(strings)
+        strings += _LENGTH.pack(len(value)) + value
+        slot = zlib.crc32(key) & (slot_count - 1)
+        while _SLOT.unpack_from(slots, slot * _SLOT.size)[1]:
+            slot = (slot + 1) & (slot_count - 1)
+        _SLOT.pack_into(slots, slot * _SLOT.size, key, offset)
+
+    strings_offset = _HEADER.size + len(slots)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        contained = {key[:2].decode() for key in cities}
+        countries = "".join(sorted(contained)).encode()
+        # Nur enthaltene Länder können vollständig sein
+        complete_countries = "".join(sorted(complete & contained)).encode()
+        f.write(_HEADER.pack(_MAGIC, slot_count, len(cities), strings_offset, countries, complete_countries))
+        f.write(slots)
+        f.write(strings)
+    os.replace(tmp, path)
+    return len(cities)
+
+
+def _country_set(codes: bytes) -> frozenset:
+    codes = codes.rstrip(b"\0").decode()
+    return frozenset(codes[i:i + 2] for i in range(0, len(codes), 2))
+
+
+class PostalIndex:
+    """
+    Memory-mapped postal-code index (see the module docstring for the layout).
+
+    Args:
+        path (str): Index file
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.slot_count, self.entries, self._strings, countries, complete = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a postal-code index (version {_MAGIC.decode()})")
+        self._mask = self.slot_count - 1
+        # Häufige PLZ (Depots, Stammkunden) landen dekodiert im Cache
+        self.cities = functools.lru_cache(maxsize=4096)(self._cities)
+        self.countries = _country_set(countries)
+        # Nur hier bedeutet eine fehlende Postleitzahl, dass es sie nicht gibt
+        self.complete = _country_set(complete)
+
+    def _cities(self, country: str, postal_code: str) -> Tuple[str, ...]:
+        """City names for a normalized postal code, () if unknown (`cities` is the cached variant)."""
+        key = _key(country, _index_code(country, postal_code))
+        mm, unpack, mask = self._mm, _SLOT.unpack_from, self._mask
+        slot = zlib.crc32(key) & mask
+        while True:
+            slot_key, offset = unpack(mm, _HEADER.size + slot * _SLOT.size)
+            if not offset:
+                return ()
+            if slot_key == key:
+                (length,) = _LENGTH.unpack_from(mm, self._strings + offset)
+                start = self._strings + offset + 2
+                return tuple(mm[start:start + length].decode("utf-8").split(_SEPARATOR))
+            slot = (slot + 1) & mask
+
+
+_index: Optional[PostalIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> PostalIndex:
+    """The shared index, opened (and built from the sample data if missing) on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                path = os.environ.get("POSTAL_INDEX_PATH", DEFAULT_INDEX)
+                if not os.path.exists(path) or (path == DEFAULT_INDEX and (
+                    os.path.getmtime(SAMPLE_TSV) > os.path.getmtime(path) or not _current_format(path)
+                )):
+                    count = build_index([SAMPLE_TSV], path)
+                    logger.info(f"Postleitzahl-Index aus {SAMPLE_TSV} erstellt ({count} Einträge)")
+                _index = PostalIndex(path)
+    return _index
+
+
+def _current_format(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(_MAGIC)) == _MAGIC
+
+
+def _fold(name: str) -> str:
+    """Compare city names case-, accent- and punctuation-insensitively."""
+    name = unicodedata.normalize("NFKD", name.casefold().replace("ß", "ss"))
+    return "".join(c for c in name if c.isalnum())
+
+
+def _city_matches(city: str, candidates: Tuple[str, ...]) -> bool:
+    folded = _fold(city)
+    # Ganze Namen vergleichen; "Frankfurt" passt zu "Frankfurt am Main", "F" oder "Frank" nicht
+    return bool(folded) and any(
+        folded == _fold(c) or folded == _fold(_CITY_QUALIFIER_RE.sub("", c)) for c in candidates
+    )
+
+
+def _value(address: Union[BaseModel, Dict[str, Any]], name: str) -> Optional[str]:
+    value = booking_value(address, name)
+    if isinstance(value, str):
+        value = value.strip()
+    return None if value in _MISSING else value
+
+
+def _updated(obj: Union[BaseModel, Dict[str, Any]], changes: Dict[str, Any]) -> Union[BaseModel, Dict[str, Any]]:
+    if not changes:
+        return obj
+    return obj.model_copy(update=changes) if isinstance(obj, BaseModel) else {**obj, **changes}
+
+
+def check_address(address: Union[BaseModel, Dict[str, Any]], fill: bool = True) -> Tuple[Any, List[str]]:
+    """
+    Fill `city`/`country` from the postal code and check their consistency.
+
+    Placeholder values ("NULL", "<UNKNOWN>") count as missing.
+
+    Args:
+        address: Address (model or dict) with "postal_code", "city", "country"; not modified
+        fill (bool): Fill missing city and country
+
+    Returns:
+        tuple: The address (a corrected copy if values were filled, otherwise
+            the same object) and human-readable issues (empty if the address is
+            consistent or has no postal code)
+    """
+    raw = _value(address, "postal_code")
+    if not raw:
+        return address, []
+    country = (_value(address, "country") or "").upper() or None
+    country = _COUNTRY_NAMES.get(country, country)
+    code, country = normalize_postal_code(str(raw), country)
+    index = get_index()
+    issues = []
+
+    if country:
+        pattern = POSTAL_CODE_FORMATS.get(country)
+        if pattern and not pattern.fullmatch(code):
+            return address, [f"Postleitzahl '{raw}' hat nicht das Format für {country}"]
+        candidates = [country]
+    else:
+        candidates = [c for c, p in POSTAL_CODE_FORMATS.items() if p.fullmatch(code) and c in index.countries]
+
+    matches = {c: index.cities(c, code) for c in candidates}
+    matches = {c: cities for c, cities in matches.items() if cities}
+    city = _value(address, "city")
+    if city and len(matches) > 1:
+        # Mehrdeutige Formate (z.B. 4 Ziffern in AT/CH/NL) über die Stadt auflösen
+        matches = {c: cities for c, cities in matches.items() if _city_matches(city, cities)} or matches
+
+    if not matches:
+        # Im Beispiel-Index fehlt fast jede echte Postleitzahl - das ist kein Befund
+        if country and country in index.complete:
+            issues.append(f"Postleitzahl {code} ist für {country} unbekannt")
+        return address, issues
+    if len(matches) > 1:
+        return address, [f"Land zu Postleitzahl {code} nicht eindeutig ({', '.join(sorted(matches))})"]
+
+    (found_country, cities), = matches.items()
+    filled = {}
+    if fill and not _value(address, "country"):
+        filled["country"] = found_country
+    if city:
+        if not _city_matches(city, cities):
+            issues.append(f"Stadt '{city}' passt nicht zu Postleitzahl {code} ({' / '.join(cities)})")
+    elif fill:
+        filled["city"] = cities[0]
+    return _updated(address, filled), issues
+
+
+def check_booking(booking: Union[BaseModel, Dict[str, Any]], fill: bool = True) -> Tuple[Any, Dict[str, List[str]]]:
+    """
+    Run `check_address` on the pickup, delivery and billing address of a booking.
+
+    Returns:
+        tuple: The booking (`ShipmentBooking` or dict; a copy with the corrected
+            addresses if values were filled, otherwise the same object - the
+            input is not modified) and the
+            issues per address key, only for addresses with issues
+    """
+    issues = {}
+    corrected = {}
+    for key in ("pickup_address", "delivery_address", "billing_address"):
+        address = booking_value(booking, key)
+        if address:
+            checked, found = check_address(address, fill=fill)
+            if checked is not address:
+                corrected[key] = checked
+            if found:
+                issues[key] = found
+    return _updated(booking, corrected), issues
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("usage: python -m app.utils.gazetteer <geonames.tsv>... [--out PATH] [--complete DE,AT,...]")
+    args = sys.argv[1:]
+    out = DEFAULT_INDEX
+    complete = []
+    if "--out" in args:
+        i = args.index("--out")
+        out = args[i + 1]
+        del args[i:i + 2]
+    if "--complete" in args:
+        i = args.index("--complete")
+        complete = args[i + 1].split(",")
+        del args[i:i + 2]
+    print(f"{build_index(args, out, complete)} postal codes written to {out}")
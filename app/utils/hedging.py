@@ -0,0 +1,268 @@
+"""
+Hedged requests across API keys/models to cut tail latency.
+
+`HedgedChatModel` streams the request from the primary model. If no first token
+arrives within an adaptive delay (a percentile of the observed time to first
+token, p90 by default), a duplicate request is issued to the next model - e.g.
+the same model on the other API key. Whichever finishes first wins; the other
+attempt is cancelled, even while it still waits for its first token, and its
+stream is closed. Both attempts report to the callbacks of the request, so
+`UsageTracker` counts the tokens of the losing attempt too. Sync requests race
+on a shared background event loop; cancelling a sync HTTP read would not be
+possible. A budget caps the share of requests that may be hedged, and
+`metrics()` reports latency percentiles against the extra requests and tokens.
+"""
+import asyncio
+import logging
+import threading
+import time
+from asyncio import FIRST_COMPLETED
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import CallbackManager
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, message_chunk_to_message
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Event loop of the sync requests (one daemon thread per process)."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="hedge-loop", daemon=True).start()
+        return _loop
+
+
+def _child_callbacks(run_manager) -> Optional[CallbackManager]:
+    """Callbacks for the attempts, as child runs of the hedged run."""
+    if run_manager is None:
+        return None
+    manager = CallbackManager(
+        handlers=run_manager.inheritable_handlers,
+        inheritable_handlers=run_manager.inheritable_handlers,
+        parent_run_id=run_manager.run_id,
+    )
+    manager.add_tags(run_manager.inheritable_tags)
+    manager.add_metadata(run_manager.inheritable_metadata)
+    return manager
+
+
+def _merge_chunks(chunks) -> AIMessage:
+    # Einmal am Ende zusammenführen; chunk + chunk parst die Tool-Argumente jedes Mal neu
+    return message_chunk_to_message(chunks[0] + chunks[1:] if len(chunks) > 1 else chunks[0])
+
+
+class LatencyTracker:
+    """Thread-safe rolling window of latencies with percentile lookup."""
+
+    def __init__(self, window: int = 500):
+        self._values = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._values.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            values = sorted(self._values)
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class HedgeBudget:
+    """
+    Caps hedges at `max_rate` of all requests (plus a small burst allowance).
+
+    A hedge is allowed while hedges + 1 <= max_rate * requests + burst.
+    """
+
+    def __init__(self, max_rate: float = 0.1, burst: int = 2):
+        self.max_rate = max_rate
+        self.burst = burst
+        self.requests = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 <= self.max_rate * self.requests + self.burst:
+                self.hedges += 1
+                return True
+            return False
+
+
+class HedgedChatModel(BaseChatModel):
+    """
+    Chat model that hedges slow requests to the next model in `models`.
+
+    Args:
+        models: Primary model first, then the hedge targets (other key/model)
+        percentile: Time-to-first-token percentile used as hedge delay
+        initial_delay: Hedge delay until `min_samples` observations exist
+        min_samples: Observations needed before the delay becomes adaptive
+        max_hedge_rate: Maximum share of requests that may be hedged
+    """
+
+    models: List[BaseChatModel]
+    percentile: float = 0.9
+    initial_delay: float = 2.0
+    min_samples: int = 20
+    max_hedge_rate: float = 0.1
+
+    _ttft: LatencyTracker = PrivateAttr(default_factory=LatencyTracker)
+    _latency: LatencyTracker = PrivateAttr(default_factory=LatencyTracker)
+    _budget: HedgeBudget = PrivateAttr()
+    _stats: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        if len(self.models) < 2:
+            raise ValueError("HedgedChatModel needs at least two models")
+        self._budget = HedgeBudget(self.max_hedge_rate)
+        self._stats = {"hedges": 0, "hedge_wins": 0, "budget_denied": 0, "extra_input_tokens": 0}
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"models": [m._identifying_params for m in self.models], "percentile": self.percentile}
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        formatted = [convert_to_openai_tool(t) for t in tools]
+        return self.bind(tools=formatted, tool_choice=tool_choice, **kwargs)
+
+    def hedge_delay(self) -> float:
+        """Current hedge delay in seconds."""
+        if len(self._ttft) < self.min_samples:
+            return self.initial_delay
+        return self._ttft.percentile(self.percentile)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Snapshot of hedging statistics and latency percentiles."""
+        with self._lock:
+            stats = dict(self._stats)
+        requests = self._budget.requests
+        return {
+            "requests": requests,
+            **stats,
+            "hedge_rate": stats["hedges"] / requests if requests else 0.0,
+            "hedge_delay": self.hedge_delay(),
+            "ttft_p50": self._ttft.percentile(0.5),
+            "latency_p50": self._latency.percentile(0.5),
+            "latency_p99": self._latency.percentile(0.99),
+        }
+
+    def _count(self, key: str, value: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += value
+
+    def _runnable(self, index, tools, tool_choice, kwargs):
+        model = self.models[index]
+        if tools:
+            return model.bind_tools(tools, tool_choice=tool_choice, **kwargs)
+        return model.bind(**kwargs) if kwargs else model
+
+    def _finish(self, start: float, winner: int, attempts: int, message: AIMessage) -> ChatResult:
+        self._latency.add(time.monotonic() - start)
+        if winner > 0:
+            self._count("hedge_wins")
+        if attempts > 1:
+            # Die Hedge-Anfrage kostet mindestens ihren Prompt noch einmal
+            usage = message.usage_metadata or {}
+            self._count("extra_input_tokens", usage.get("input_tokens", 0) * (attempts - 1))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _hedge_target(self) -> Optional[int]:
+        """Index of the model to hedge to, or None if the budget is exhausted."""
+        if not self._budget.try_acquire():
+            self._count("budget_denied")
+            return None
+        with self._lock:
+            self._stats["hedges"] += 1
+            # Bei mehreren Ausweichmodellen reihum verteilen
+            target = 1 + (self._stats["hedges"] - 1) % (len(self.models) - 1)
+        logger.debug(f"Kein erstes Token nach {self.hedge_delay():.2f}s - Hedge-Anfrage an Modell {target}")
+        return target
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, tool_choice=None, **kwargs) -> ChatResult:
+        callbacks = _child_callbacks(run_manager)
+        future = asyncio.run_coroutine_threadsafe(
+            self._race(messages, stop, callbacks, tools, tool_choice, kwargs), _background_loop()
+        )
+        try:
+            return future.result()
+        finally:
+            # z.B. bei KeyboardInterrupt: Versuche nicht weiterlaufen lassen
+            future.cancel()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, tools=None, tool_choice=None, **kwargs) -> ChatResult:
+        callbacks = _child_callbacks(run_manager)
+        return await self._race(messages, stop, callbacks, tools, tool_choice, kwargs)
+
+    async def _race(self, messages, stop, callbacks, tools, tool_choice, kwargs) -> ChatResult:
+        self._budget.record_request()
+        start = time.monotonic()
+        first_token = asyncio.Event()
+
+        async def consume(index):
+            attempt_start = time.monotonic()
+            runnable = self._runnable(index, tools, tool_choice, kwargs)
+            # Callbacks des Requests an jeden Versuch weitergeben, damit auch die Tokens des Verlierers gezählt werden
+            stream = runnable.astream(messages, config={"callbacks": callbacks}, stop=stop)
+            chunks = []
+            try:
+                async for chunk in stream:
+                    if not chunks:
+                        self._ttft.add(time.monotonic() - attempt_start)
+                        first_token.set()
+                    chunks.append(chunk)
+            finally:
+                await stream.aclose()
+            return _merge_chunks(chunks)
+
+        tasks = [asyncio.create_task(consume(0))]
+        try:
+            waiter = asyncio.create_task(first_token.wait())
+            await asyncio.wait({waiter, tasks[0]}, timeout=self.hedge_delay(), return_when=FIRST_COMPLETED)
+            waiter.cancel()
+            if not first_token.is_set() and not tasks[0].done():
+                target = self._hedge_target()
+                if target is not None:
+                    tasks.append(asyncio.create_task(consume(target)))
+            pending = set(tasks)
+            errors = []
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return self._finish(start, tasks.index(task), len(tasks), task.result())
+                    errors.append(task.exception())
+            raise errors[0]
+        finally:
+            # Verlierer abbrechen - auch vor dem ersten Token - und warten, bis ihr Stream geschlossen ist
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,224 @@
+"""
+Shared, pooled HTTP clients for the LLM providers.
+
+All models of a provider (base URL and proxy) send their requests through
+one keep-alive `httpx` client, so TCP and TLS handshakes are paid once per
+pooled connection instead of once per model instance. The API key is a request
+header, so models on different keys share the pool too - unlike the client
+cache of langchain-anthropic, which is keyed by base URL and timeout as well
+and uses the SDK's default limits. Async clients are kept per running event
+loop: their connections belong to the loop that opened them, so successive
+`asyncio.run` calls each get their own pool.
+
+Every pooled client counts requests, newly opened connections and the time
+spent connecting (via the transport's trace extension); `pool_stats()` returns
+a snapshot together with the current number of open and idle connections.
+
+Pool limits can be tuned via `LLM_POOL_MAX_CONNECTIONS` (default 100),
+`LLM_POOL_MAX_KEEPALIVE` (default 20) and `LLM_POOL_KEEPALIVE_EXPIRY`
+(seconds, default 60).
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+from functools import cached_property
+from typing import Any, Dict, Optional, Tuple
+
+import anthropic
+from langchain_anthropic import ChatAnthropic
+
+_CONNECT_EVENTS = ("connection.connect_tcp", "connection.start_tls")
+
+
+class PoolStats:
+    """Thread-safe counters of one pooled client."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self.connect_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def record_connect(self, event: str, seconds: float) -> None:
+        with self._lock:
+            if event == "connection.connect_tcp":
+                self.connections_opened += 1
+            else:
+                self.tls_handshakes += 1
+            self.connect_seconds += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            requests, opened = self.requests, self.connections_opened
+            return {
+                "requests": requests,
+                "connections_opened": opened,
+                "tls_handshakes": self.tls_handshakes,
+                "connect_seconds": self.connect_seconds,
+                "reuse_rate": 1 - opened / requests if requests else 0.0,
+            }
+
+
+def _tracer(stats: PoolStats):
+    # Pro Request ein eigener Tracer, damit sich Start-Zeitpunkte paralleler Requests nicht überschreiben
+    started = {}
+
+    def observe(name: str) -> None:
+        event, _, phase = name.rpartition(".")
+        if event not in _CONNECT_EVENTS:
+            return
+        if phase == "started":
+            started[event] = time.perf_counter()
+        elif phase == "complete" and event in started:
+            stats.record_connect(event, time.perf_counter() - started.pop(event))
+
+    def trace(name, info):
+        observe(name)
+
+    async def atrace(name, info):
+        observe(name)
+
+    return trace, atrace
+
+
+def _sync_hook(stats: PoolStats):
+    def on_request(request):
+        stats.record_request()
+        request.extensions["trace"] = _tracer(stats)[0]
+    return on_request
+
+
+def _async_hook(stats: PoolStats):
+    async def on_request(request):
+        stats.record_request()
+        request.extensions["trace"] = _tracer(stats)[1]
+    return on_request
+
+
+def _limits():
+    # Limits-Klasse der HTTP-Bibliothek, die das SDK mitbringt
+    return type(anthropic.DEFAULT_CONNECTION_LIMITS)(
+        max_connections=int(os.environ.get("LLM_POOL_MAX_CONNECTIONS", 100)),
+        max_keepalive_connections=int(os.environ.get("LLM_POOL_MAX_KEEPALIVE", 20)),
+        keepalive_expiry=float(os.environ.get("LLM_POOL_KEEPALIVE_EXPIRY", 60)),
+    )
+
+
+_clients: Dict[Tuple[str, str, str, bool], Any] = {}
+# Async-Clients je Event-Loop; mit der Loop verschwinden auch ihre Clients
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[tuple, Any]]" = weakref.WeakKeyDictionary()
+_stats: Dict[Tuple[str, str, str, bool], PoolStats] = {}
+_lock = threading.Lock()
+
+
+def _client_classes(provider: str):
+    if provider == "anthropic":
+        return anthropic.DefaultHttpxClient, anthropic.DefaultAsyncHttpxClient
+    if provider == "openai":
+        import openai
+        return openai.DefaultHttpxClient, openai.DefaultAsyncHttpxClient
+    raise ValueError(f"Unbekannter Provider: {provider}")
+
+
+def get_http_client(provider: str, base_url: Optional[str] = None, is_async: bool = False, proxy: Optional[str] = None):
+    """
+    Get the shared pooled HTTP client for a provider, base URL and proxy.
+
+    Args:
+        provider (str): "anthropic" or "openai"
+        base_url (str, optional): API base URL; None for the provider default
+        is_async (bool): Return the async client of the running event loop
+            (must be called inside it) instead of the sync one
+        proxy (str, optional): Proxy URL for the requests
+
+    Returns:
+        The provider SDK's default httpx client, shared by all callers (of the same loop).
+    """
+    key = (provider, base_url or "", proxy or "", is_async)
+    loop = asyncio.get_running_loop() if is_async else None
+    with _lock:
+        clients = _async_clients.setdefault(loop, {}) if is_async else _clients
+        client = clients.get(key)
+        if client is None or client.is_closed:
+            sync_cls, async_cls = _client_classes(provider)
+            stats = _stats.setdefault(key, PoolStats())
+            options = {"limits": _limits(), **({"proxy": proxy} if proxy else {})}
+            if is_async:
+                client = async_cls(**options, event_hooks={"request": [_async_hook(stats)]})
+            else:
+                client = sync_cls(**options, event_hooks={"request": [_sync_hook(stats)]})
+            clients[key] = client
+        return client
+
+
+def _open_connections(clients) -> Tuple[int, int]:
+    connections = []
+    for client in clients:
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections += list(getattr(pool, "connections", []))
+    return len(connections), sum(1 for c in connections if c.is_idle())
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Snapshot of all pooled clients.
+
+    Returns:
+        dict: Per "provider[-async] base_url [via proxy]" the request and connection
+            counters, the reuse rate and the currently open and idle connections
+            (of all event loops for async clients).
+    """
+    with _lock:
+        loop_clients = list(_async_clients.values())
+        items = [
+            (key, [c[key] for c in loop_clients if key in c] if key[3] else [_clients[key]] if key in _clients else [], stats)
+            for key, stats in _stats.items()
+        ]
+    snapshot = {}
+    for (provider, base_url, proxy, is_async), clients, stats in items:
+        name = f"{provider}{'-async' if is_async else ''} {base_url or 'default'}{f' via {proxy}' if proxy else ''}"
+        entry = stats.snapshot()
+        entry["open_connections"], entry["idle_connections"] = _open_connections(clients)
+        snapshot[name] = entry
+    return snapshot
+
+
+def close_pools() -> None:
+    """Close all sync pooled clients and forget every pool (stats included)."""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        # Async-Clients gehören zu ihrer Event-Loop und werden dort beim Garbage Collect geschlossen
+        _async_clients.clear()
+        _stats.clear()
+    for client in clients:
+        client.close()
+
+
+class PooledChatAnthropic(ChatAnthropic):
+    """ChatAnthropic that sends its requests through the shared connection pool."""
+
+    @cached_property
+    def _client(self) -> anthropic.Client:
+        params = self._client_params
+        http_client = get_http_client("anthropic", params["base_url"], proxy=self.anthropic_proxy)
+        return anthropic.Client(**params, http_client=http_client)
+
+    @property
+    def _async_client(self) -> anthropic.AsyncClient:
+        # Ein SDK-Client je Event-Loop, passend zum Pool dieser Loop
+        loop = asyncio.get_running_loop()
+        clients = self.__dict__.setdefault("_async_clients", weakref.WeakKeyDictionary())
+        client = clients.get(loop)
+        if client is None:
+            params = self._client_params
+            http_client = get_http_client("anthropic", params["base_url"], is_async=True, proxy=self.anthropic_proxy)
+            client = clients[loop] = anthropic.AsyncClient(**params, http_client=http_client)
+        return client
@@ -0,0 +1,137 @@
+"""
+Text diffs for incremental re-extraction.
+
+When a user edits a few words of an input that was already extracted, the
+booking is updated from a diff of the two texts instead of being extracted
+again (see `update_shipment_booking` in app/nodes/fixed_node.py). Large edits
+fall back to the full extraction, where a diff would not save anything.
+
+`is_small_edit` runs on every click (and in the background after each edit),
+so it stays near-linear: a character-count bound rejects rewrites before any
+diff, the diff runs over lines first, and only the changed lines are compared
+by characters (long blocks are first aligned by content-defined word groups).
+"""
+import difflib
+import re
+import zlib
+from collections import Counter
+from typing import List, Optional
+
+# Obergrenzen für den inkrementellen Pfad
+MAX_CHANGED_CHARS = 400
+MIN_SIMILARITY = 0.7
+# Geänderte Blöcke bis zu dieser Länge zeichenweise vergleichen, längere über Wortgruppen
+CHAR_DIFF_MAX = 2000
+# Mittlere Länge der Wortgruppen
+CHUNK_WORDS = 12
+
+_WORD_RE = re.compile(r"\s*\S+\s*|\s+")
+
+
+def _common_affix(a: str, b: str) -> tuple:
+    """Lengths of the common prefix and suffix (not overlapping)."""
+    limit = min(len(a), len(b))
+    prefix = 0
+    while prefix < limit and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    return prefix, suffix
+
+
+def _chunks(text: str) -> List[str]:
+    """Split text into runs of words that end at content-defined words, so an edit only changes its own chunk."""
+    chunks, current = [], []
+    for word in _WORD_RE.findall(text):
+        current.append(word)
+        if zlib.crc32(word.strip().encode("utf-8")) % CHUNK_WORDS == 0:
+            chunks.append("".join(current))
+            current = []
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def _block_changes(a: str, b: str) -> int:
+    prefix, suffix = _common_affix(a, b)
+    a, b = a[prefix:len(a) - suffix], b[prefix:len(b) - suffix]
+    if not a or not b:
+        return max(len(a), len(b))
+    if max(len(a), len(b)) <= CHAR_DIFF_MAX:
+        matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+        return sum(max(i2 - i1, j2 - j1) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal")
+    # Lange Blöcke (z.B. Text ohne Zeilenumbrüche) erst über Wortgruppen ausrichten
+    a_chunks, b_chunks = _chunks(a), _chunks(b)
+    matcher = difflib.SequenceMatcher(None, a_chunks, b_chunks, autojunk=False)
+    changed = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        old, new = "".join(a_chunks[i1:i2]), "".join(b_chunks[j1:j2])
+        # Ohne eine gemeinsame Wortgruppe auf dieser Länge gilt der Bereich als neu geschrieben
+        changed += max(len(old), len(new)) if max(len(old), len(new)) > CHAR_DIFF_MAX else _block_changes(old, new)
+    return changed
+
+
+def min_changed_chars(old: str, new: str) -> int:
+    """Lower bound of `changed_chars` from character counts alone (linear)."""
+    return max(len(old), len(new)) - sum((Counter(old) & Counter(new)).values())
+
+
+def changed_chars(old: str, new: str, limit: Optional[int] = None) -> int:
+    """
+    Number of characters inserted, deleted or replaced between two texts.
+
+    Args:
+        old (str): Previous text
+        new (str): Edited text
+        limit (int, optional): Stop counting once the result exceeds it (the
+            returned value is then only known to be larger than `limit`)
+    """
+    old_lines, new_lines = old.splitlines(keepends=True), new.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    changed = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        changed += _block_changes("".join(old_lines[i1:i2]), "".join(new_lines[j1:j2]))
+        if limit is not None and changed > limit:
+            break
+    return changed
+
+
+def text_diff(old: str, new: str, context: int = 1) -> str:
+    """
+    Line-based unified diff of two texts, without file headers.
+
+    Args:
+        old (str): Previous text
+        new (str): Edited text
+        context (int): Unchanged lines shown around each change
+
+    Returns:
+        str: The diff ("-" old lines, "+" new lines); empty if the texts are equal
+    """
+    lines = list(difflib.unified_diff(old.splitlines(), new.splitlines(), n=context, lineterm=""))
+    # Nur die beiden Kopfzeilen entfernen; "--- Lieferung ---" im Text ist eine echte Änderung
+    return "\n".join(lines[2:])
+
+
+def is_small_edit(old: str, new: str, max_changed_chars: int = MAX_CHANGED_CHARS, min_similarity: float = MIN_SIMILARITY) -> bool:
+    """
+    Whether `new` is close enough to `old` to update the booking from a diff.
+
+    Args:
+        old (str): Input of the previous extraction
+        new (str): Current input
+        max_changed_chars (int): Maximum number of changed characters
+        min_similarity (float): Minimum share of unchanged characters
+
+    Returns:
+        bool: True for the incremental path, False for a full extraction
+    """
+    limit = min(max_changed_chars, (1 - min_similarity) * max(len(old), len(new), 1))
+    if abs(len(old) - len(new)) > limit or min_changed_chars(old, new) > limit:
+        return False
+    return changed_chars(old, new, limit=limit) <= limit
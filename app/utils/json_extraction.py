@@ -0,0 +1,252 @@
+"""
+Tolerant JSON extraction from LLM replies.
+
+Used by the mock extractor (`mock_trustcall.py`) and, via `parse_patch_list`,
+for patch lists in the vendored TrustCall code (`notes/_base`, which has the
+parser injected with `set_patch_list_parser` so it does not import the app).
+Values are located with C-level searches and decoded incrementally with
+`json.JSONDecoder.raw_decode`, so prose with stray braces or several JSON
+objects in one reply is handled without a Python-level character walk. Only
+malformed candidates (trailing commas, replies cut off at `max_tokens`) go
+through the slower repair pass. A truncated value is completed by closing its
+open string and brackets, or - with `drop_incomplete=True` - cut back to its
+last complete element, so a half-written value such as "Musterstra" is never
+returned.
+"""
+import json
+import re
+from typing import Any, Iterator, Optional, Tuple, Type, Union
+
+try:
+    import orjson
+except ImportError:  # optional fast path
+    orjson = None
+
+_decoder = json.JSONDecoder()
+
+_FENCE_RE = re.compile(r"```[ \t]*(?:json|JSON)?[ \t]*\r?\n?(.*?)(?:```|\Z)", re.DOTALL)
+_START_RE = {
+    dict: re.compile(r"\{"),
+    list: re.compile(r"\["),
+    None: re.compile(r"[\[{]"),
+}
+_CLOSERS = {"{": "}", "[": "]"}
+_WHITESPACE = " \t\r\n"
+
+# How many earlier cut points are tried when repairing a truncated tail
+_MAX_TRUNCATION_CUTS = 8
+
+ExpectedType = Optional[Union[Type[dict], Type[list]]]
+
+
+def loads(text: str) -> Any:
+    """Parse a complete JSON document, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def iter_json_values(text: str, expect: ExpectedType = None, drop_incomplete: bool = False) -> Iterator[Any]:
+    """
+    Yield the JSON objects/arrays embedded in `text`, in order of appearance.
+
+    Code fences are searched first; if they contain JSON, the surrounding prose
+    is ignored. Malformed candidates are repaired where possible (trailing commas,
+    truncated tails); anything that still does not parse is skipped.
+
+    Args:
+        text (str): LLM reply or other free text
+        expect (type, optional): `dict` or `list` to only yield values of that
+            type; a nested value of the expected type is found inside others
+        drop_incomplete (bool): Cut a truncated value back to its complete
+            top-level elements instead of closing its open strings
+
+    Yields:
+        The decoded JSON values
+    """
+    if not text:
+        return
+    stripped = text.strip()
+    if stripped[:1] in ("{", "[") and stripped[-1:] in ("}", "]"):
+        try:
+            value = loads(stripped)
+        except ValueError:
+            pass
+        else:
+            if expect is None or isinstance(value, expect):
+                yield value
+                return
+
+    if "```" in text:
+        found = False
+        for fence in _FENCE_RE.finditer(text):
+            for value in _scan(fence.group(1), expect, drop_incomplete):
+                found = True
+                yield value
+        if found:
+            return
+
+    yield from _scan(text, expect, drop_incomplete)
+
+
+def extract_json(text: str, expect: ExpectedType = None, default: Any = None, drop_incomplete: bool = False) -> Any:
+    """
+    Return the first JSON value in `text`, or `default` if there is none.
+
+    Args:
+        text (str): LLM reply or other free text
+        expect (type, optional): `dict` or `list` to require that type
+        default: Value returned when nothing parseable is found
+        drop_incomplete (bool): See `iter_json_values`
+
+    Returns:
+        The decoded JSON value or `default`
+    """
+    return next(iter_json_values(text, expect, drop_incomplete), default)
+
+
+def parse_patch_list(text: str) -> list:
+    """
+    First JSON list in `text` (e.g. JSON patches the model returned as a string).
+
+    A list cut off mid-element keeps only its complete elements: a truncated
+    patch value must not be applied.
+
+    Returns:
+        list: The decoded list, or an empty list
+    """
+    return extract_json(text, expect=list, default=[], drop_incomplete=True)
+
+
+def _scan(text: str, expect: ExpectedType, drop_incomplete: bool = False) -> Iterator[Any]:
+    start_re = _START_RE[expect]
+    pos = 0
+    length = len(text)
+    while pos < length:
+        match = start_re.search(text, pos)
+        if match is None:
+            return
+        start = match.start()
+        try:
+            value, end = _decoder.raw_decode(text, start)
+        except json.JSONDecodeError as exc:
+            # Only trailing commas and truncated tails are worth repairing;
+            # anything else is prose that happens to contain a bracket.
+            repairable = (
+                exc.pos >= length
+                or text[exc.pos] in "}]"
+                or exc.msg.startswith("Unterminated string")
+            )
+            repaired = _repair(text, start, drop_incomplete) if repairable else None
+            if repaired is None:
+                pos = start + 1
+                continue
+            value, end = repaired
+        if expect is None or isinstance(value, expect):
+            yield value
+            pos = end
+        else:
+            # A value of the wrong type may still contain the expected one
+            pos = start + 1
+
+
+def _repair(text: str, start: int, drop_incomplete: bool = False) -> Optional[Tuple[Any, int]]:
+    """
+    Repair the JSON value starting at `start`.
+
+    Drops trailing commas and, if the text ends inside the value, closes the open
+    string and brackets - falling back to earlier element boundaries when the last
+    element is itself incomplete. With `drop_incomplete`, only boundaries between
+    top-level elements are used: the value is cut back to its complete elements.
+
+    Returns:
+        tuple: (value, end offset in `text`) or None
+    """
+    stack = []
+    drop = []  # offsets of trailing commas
+    cuts = []  # (offset, open brackets) at element boundaries
+    last_comma = -1
+    in_string = False
+    escaped = False
+    end = None
+    i = start
+    length = len(text)
+    while i < length:
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+            last_comma = -1
+        elif ch in "{[":
+            stack.append(ch)
+            cuts.append((i + 1, tuple(stack)))
+            last_comma = -1
+        elif ch in "}]":
+            if not stack or _CLOSERS[stack[-1]] != ch:
+                return None
+            if last_comma >= 0:
+                drop.append(last_comma)
+            stack.pop()
+            last_comma = -1
+            if not stack:
+                end = i + 1
+                break
+        elif ch == ",":
+            last_comma = i
+            cuts.append((i, tuple(stack)))
+        elif ch not in _WHITESPACE:
+            last_comma = -1
+        i += 1
+
+    if end is not None:
+        candidate = _without(text, start, end, drop)
+        return _decode_candidate(candidate, end)
+
+    # Truncated: close everything that is still open, then retry at earlier
+    # element boundaries in case the last element itself is incomplete.
+    tail = _without(text, start, length, drop)
+    tail = tail + '"' if in_string else tail.rstrip(_WHITESPACE + ",")
+    candidates = [tail + _close(stack)]
+    if drop_incomplete:
+        # Only cut between top-level elements; the open remainder is dropped
+        complete = len(stack) == 1 and not in_string and tail[-1:] in ('"', "}", "]")
+        candidates = candidates if complete else []
+        cuts = [(offset, open_brackets) for offset, open_brackets in cuts if len(open_brackets) == 1]
+    for offset, open_brackets in reversed(cuts[-_MAX_TRUNCATION_CUTS:]):
+        body = _without(text, start, offset, [d for d in drop if d < offset])
+        candidates.append(body.rstrip(_WHITESPACE + ",") + _close(open_brackets))
+    for candidate in candidates:
+        result = _decode_candidate(candidate, length)
+        if result is not None:
+            return result
+    return None
+
+
+def _without(text: str, start: int, end: int, drop: list) -> str:
+    if not drop:
+        return text[start:end]
+    parts = []
+    prev = start
+    for offset in drop:
+        parts.append(text[prev:offset])
+        prev = offset + 1
+    parts.append(text[prev:end])
+    return "".join(parts)
+
+
+def _close(open_brackets) -> str:
+    return "".join(_CLOSERS[b] for b in reversed(open_brackets))
+
+
+def _decode_candidate(candidate: str, end: int) -> Optional[Tuple[Any, int]]:
+    try:
+        value, _ = _decoder.raw_decode(candidate)
+    except json.JSONDecodeError:
+        return None
+    return value, end
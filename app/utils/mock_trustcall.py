@@ -1,115 +1,254 @@
-"""
+"""
 Mock implementation of TrustCall for development and testing.
 
 This file provides a simplified version of the TrustCall API for local development
 when the actual TrustCall package is not available.
 """
-from typing import List, Any, Dict, Optional, Type, TypedDict, Union, Callable, Sequence
-from pydantic import BaseModel
 import json
+import logging
+from typing import List, Any, Dict, Iterator, AsyncIterator, Optional, Type
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+    convert_to_messages,
+    message_chunk_to_message,
+)
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import ensure_config
+from pydantic import BaseModel, ValidationError
+
+from app.utils.json_extraction import extract_json
+
+logger = logging.getLogger(__name__)
+
+# Same default as TrustCall
+DEFAULT_MAX_ATTEMPTS = 3
+EMPTY_RESPONSE_ERROR = "The model returned an empty response."
+
+
+def _is_empty_stream_error(error: ValueError) -> bool:
+    return "No generation chunks were returned" in str(error)
+
+
+class MockExtractor(Runnable[Any, Dict[str, Any]]):
+    """
+    Runnable stand-in for TrustCall's extractor graph.
+
+    Asks the LLM for one instance of the schema - as a tool call when the model
+    supports `bind_tools`, otherwise as JSON in the reply text - and validates it.
+    Invalid output is sent back with the validation error until
+    `config["configurable"]["max_attempts"]` is reached.
+
+    `batch`/`abatch` come from `Runnable` and run inputs concurrently, limited by
+    `config["max_concurrency"]`.
+    """
+
+    def __init__(self, llm, schema_class: Type[BaseModel]):
+        self.llm = llm
+        self.schema_class = schema_class
+        self.schema_name = schema_class.__name__
+        try:
+            self.bound_llm = llm.bind_tools([schema_class], tool_choice=self.schema_name)
+            self.use_tools = True
+        except (AttributeError, NotImplementedError):
+            self.bound_llm = llm
+            self.use_tools = False
+
+    def _initial_messages(self, input) -> List[BaseMessage]:
+        existing = None
+        if isinstance(input, str):
+            messages = [HumanMessage(content=input)]
+        elif isinstance(input, dict):
+            messages = convert_to_messages(input.get("messages", []))
+            existing = (input.get("existing") or {}).get(self.schema_name)
+        else:
+            messages = convert_to_messages(input)
+        if existing is not None:
+            # Kein JSON-Patch wie bei TrustCall: das LLM liefert das vollständige, aktualisierte Dokument
+            if isinstance(existing, BaseModel):
+                existing = existing.model_dump()
+            update = (
+                f"Update this existing {self.schema_name} and respond with the complete updated instance:\n"
+                f"{json.dumps(existing, ensure_ascii=False, default=str)}"
+            )
+            messages = [SystemMessage(content=update), *messages]
+        if not self.use_tools:
+            # Without tool calling the schema has to be part of the prompt
+            schema = json.dumps(self.schema_class.model_json_schema())
+            instruction = (
+                f"Extract data according to this schema: {self.schema_name}\n{schema}\n"
+                "Respond with a single JSON object."
+            )
+            messages = [SystemMessage(content=instruction), *messages]
+        return messages
+
+    def _parse(self, response: AIMessage):
+        """
+        Validate the LLM response.
+
+        Returns:
+            tuple: (model instance or None, error message or None, tool call id)
+        """
+        if self.use_tools and response.tool_calls:
+            call = response.tool_calls[0]
+            data, call_id = call["args"], call["id"]
+        elif self.use_tools and response.invalid_tool_calls:
+            call = response.invalid_tool_calls[0]
+            data = extract_json(call.get("args") or "", expect=dict, default={})
+            call_id = call.get("id")
+        else:
+            data = extract_json(response.text, expect=dict, default={})
+            call_id = None
+        try:
+            return self.schema_class.model_validate(data), None, call_id
+        except ValidationError as e:
+            return None, str(e), call_id
+
+    def _retry_messages(self, response: AIMessage, error: str, call_id: Optional[str]) -> List[BaseMessage]:
+        feedback = f"Error: {error}\nPlease fix the errors and respond again with the complete {self.schema_name}."
+        if call_id:
+            return [response, ToolMessage(content=feedback, tool_call_id=call_id, status="error")]
+        return [response, HumanMessage(content=feedback)]
+
+    def _result(self, messages, instance, error, attempts) -> Dict[str, Any]:
+        metadata = {"schema": self.schema_name}
+        if instance is None:
+            # Simplified error handling: return an empty model
+            logger.warning(f"Error extracting data: {error}")
+            instance = self.schema_class()
+            metadata["error"] = error
+        return {
+            "messages": messages,
+            "responses": [instance],
+            "response_metadata": [metadata],
+            "attempts": attempts,
+        }
+
+    @staticmethod
+    def _max_attempts(config: RunnableConfig) -> int:
+        return config.get("configurable", {}).get("max_attempts", DEFAULT_MAX_ATTEMPTS)
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Process input text and extract structured data.
+
+        Args:
+            input: Text, a list of messages or a dict with a "messages" field
+            config: Optional configuration (`configurable.max_attempts`)
+
+        Returns:
+            Dict with extracted data
+        """
+        result = None
+        for result in self.stream(input, config, **kwargs):
+            pass
+        return result
+
+    async def ainvoke(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> Dict[str, Any]:
+        result = None
+        async for result in self.astream(input, config, **kwargs):
+            pass
+        return result
+
+    def stream(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the extraction.
+
+        Yields `{"messages": [AIMessageChunk]}` for every chunk of every LLM call,
+        followed by the final result dict (as returned by `invoke`).
+        """
+        config = ensure_config(config)
+        max_attempts = self._max_attempts(config)
+        history = self._initial_messages(input)
+        new_messages: List[BaseMessage] = []
+        instance = error = None
+        attempts = 0
+        while attempts < max_attempts:
+            attempts += 1
+            response = None
+            try:
+                for chunk in self.bound_llm.stream(history, config):
+                    response = chunk if response is None else response + chunk
+                    yield {"messages": [chunk]}
+            except ValueError as e:
+                # langchain_core meldet einen Stream ohne Chunks als ValueError
+                if response is not None or not _is_empty_stream_error(e):
+                    raise
+            if response is None:
+                # Leerer Stream: Fehlversuch, mit denselben Nachrichten erneut anfragen
+                error = EMPTY_RESPONSE_ERROR
+                continue
+            response = message_chunk_to_message(response)
+            instance, error, call_id = self._parse(response)
+            if instance is not None:
+                new_messages.append(response)
+                break
+            retry = self._retry_messages(response, error, call_id)
+            history = [*history, *retry]
+            new_messages.extend(retry)
+        yield self._result(new_messages, instance, error, attempts)
+
+    async def astream(self, input, config: Optional[RunnableConfig] = None, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        config = ensure_config(config)
+        max_attempts = self._max_attempts(config)
+        history = self._initial_messages(input)
+        new_messages: List[BaseMessage] = []
+        instance = error = None
+        attempts = 0
+        while attempts < max_attempts:
+            attempts += 1
+            response = None
+            try:
+                async for chunk in self.bound_llm.astream(history, config):
+                    response = chunk if response is None else response + chunk
+                    yield {"messages": [chunk]}
+            except ValueError as e:
+                # langchain_core meldet einen Stream ohne Chunks als ValueError
+                if response is not None or not _is_empty_stream_error(e):
+                    raise
+            if response is None:
+                # Leerer Stream: Fehlversuch, mit denselben Nachrichten erneut anfragen
+                error = EMPTY_RESPONSE_ERROR
+                continue
+            response = message_chunk_to_message(response)
+            instance, error, call_id = self._parse(response)
+            if instance is not None:
+                new_messages.append(response)
+                break
+            retry = self._retry_messages(response, error, call_id)
+            history = [*history, *retry]
+            new_messages.extend(retry)
+        yield self._result(new_messages, instance, error, attempts)
+
 
 # Simple mock version of TrustCall's create_extractor function
 def create_extractor(
-    llm, 
-    tools: List[Type[BaseModel]], 
+    llm,
+    tools: List[Type[BaseModel]],
     tool_choice: Optional[str] = None
 ):
     """
     Creates a mock extractor that uses LangChain to generate JSON data.
-    
+
     Args:
         llm: The language model to use (ChatAnthropic or compatible model)
         tools: A list of Pydantic models defining the extraction schema
         tool_choice: Optional tool to use (schema name)
-        
+
     Returns:
-        A callable that processes input and returns extracted data
+        MockExtractor: A Runnable that processes input and returns extracted data
     """
-    schema_name = None
-    schema_class = None
-    
+    schema_class = tools[0]
+
     # Determine which schema to use
     if tool_choice:
         for tool in tools:
             if tool.__name__ == tool_choice:
                 schema_class = tool
-                schema_name = tool.__name__
                 break
-    else:
-        schema_class = tools[0]
-        schema_name = schema_class.__name__
-    
-    # Create schema info for the prompt
-    schema_dict = schema_class.schema()
-    
-    # Basic extractor function
-    def invoke(input_text, config=None):
-        """
-        Process input text and extract structured data.
-        
-        Args:
-            input_text: Text to process
-            config: Optional configuration
-            
-        Returns:
-            Dict with extracted data
-        """
-        # Prepare the message
-        if isinstance(input_text, str):
-            messages = [{
-                "role": "user",
-                "content": input_text
-            }]
-        else:
-            # Assume it's already messages or has a messages field
-            messages = input_text.get("messages", input_text)
-            
-        # Generate a JSON response with the LLM
-        json_content = f"Extract data according to this schema: {schema_name}"
-        if isinstance(messages, str):
-            content = messages
-        else:
-            content = messages[-1].get("content", "") if isinstance(messages, list) else ""
-            
-        response = llm.invoke(content)
-        
-        try:
-            # Parse the LLM response to JSON
-            # This is a simplified approach - real TrustCall has more complex logic
-            response_text = response.content
-            
-            # Extract JSON from the response if there's an explanation
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}')
-            if json_start >= 0 and json_end >= 0:
-                json_str = response_text[json_start:json_end+1]
-                result_dict = json.loads(json_str)
-            else:
-                # Use empty result if no JSON found
-                result_dict = {}
-            
-            # Create a model instance
-            model_instance = schema_class(**result_dict)
-            
-            # Return in the format expected by the real TrustCall
-            return {
-                "messages": [response],
-                "responses": [model_instance],
-                "response_metadata": [{"schema": schema_name}],
-                "attempts": 1
-            }
-        except Exception as e:
-            # Simplified error handling
-            print(f"Error extracting data: {str(e)}")
-            # Return empty model
-            model_instance = schema_class()
-            return {
-                "messages": [response],
-                "responses": [model_instance],
-                "response_metadata": [{"schema": schema_name, "error": str(e)}],
-                "attempts": 1
-            }
-    
-    # Return the extractor function
-    extractor = lambda x, **kwargs: invoke(x, **kwargs)
-    return extractor
+
+    return MockExtractor(llm, schema_class)
@@ -2,14 +2,48 @@
 Konfiguration für LLM-Modelle mit Unterstützung für mehrere API-Keys.
 """
 import os
-from langchain_anthropic import ChatAnthropic
 import logging
+import threading
+
+from app.utils.fake_llm import FakeShipmentChatModel, fake_llm_enabled
+from app.utils.hedging import HedgedChatModel
+from app.utils.http_pool import PooledChatAnthropic, get_http_client
 
 # Logger konfigurieren
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_anthropic_llm(model="claude-3-7-sonnet-20250219", temperature=0, key_index=1):
+# Registry der Modell-Instanzen: gleiche Parameter -> gleiche Instanz (und damit gleicher SDK-Client)
+_models = {}
+_models_lock = threading.Lock()
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def _memoized(key, factory):
+    """Return the registered model for `key`, creating it with `factory` on first use."""
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            model = _models[key] = factory()
+        return model
+
+
+def _model_key(provider, model, temperature, key_index, params):
+    # Weitere Parameter können unhashbar sein (z.B. default_headers), daher über repr
+    extra = tuple(sorted((k, repr(v)) for k, v in params.items() if k != "max_tokens"))
+    return provider, model, temperature, key_index, params.get("max_tokens"), extra
+
+
+def clear_model_registry():
+    """Forget all registered model instances (e.g. after API keys changed)."""
+    with _models_lock:
+        _models.clear()
+
+
+def get_anthropic_llm(model="claude-3-7-sonnet-20250219", temperature=0, key_index=1, fake=None, hedge=None, **kwargs):
     """
     Get a ChatAnthropic LLM with the specified parameters.
     
@@ -17,10 +51,64 @@ def get_anthropic_llm(model="claude-3-7-sonnet-20250219", temperature=0, key_ind
         model (str): The model to use.
         temperature (float): The temperature for generation.
         key_index (int): Which API key to use (1 or 2)
+        fake (bool, optional): Return the offline FakeShipmentChatModel instead.
+            Defaults to the `FAKE_LLM` environment variable.
+        hedge (bool, optional): Hedge slow requests to the other API key.
+            Defaults to the `LLM_HEDGING` environment variable; tuned via
+            `LLM_HEDGE_PERCENTILE` (default 0.9) and `LLM_HEDGE_MAX_RATE` (default 0.1).
+        **kwargs: Further ChatAnthropic parameters (e.g. max_retries, base_url),
+            overriding the defaults max_tokens=1000 and timeout=10.
+        
+    Model instances (and hedged wrappers) are registered by their parameters
+    and reused, and all of them share the pooled HTTP clients of
+    `app.utils.http_pool`.
         
     Returns:
-        ChatAnthropic: A ChatAnthropic model instance.
+        ChatAnthropic: A ChatAnthropic model instance (or FakeShipmentChatModel,
+            wrapped in HedgedChatModel when hedging is enabled).
     """
+    if hedge is None:
+        hedge = _env_flag("LLM_HEDGING")
+    # Offline-Modus für Lasttests: kein API-Key, kein Netzwerk
+    if fake is None:
+        fake = fake_llm_enabled()
+    if hedge:
+        percentile = float(os.environ.get("LLM_HEDGE_PERCENTILE", 0.9))
+        max_hedge_rate = float(os.environ.get("LLM_HEDGE_MAX_RATE", 0.1))
+        # Registriert wie die Modelle selbst, damit die Latenzstatistik des Hedgings erhalten bleibt;
+        # die Modelle werden außerhalb der Registry-Sperre geholt (kein verschachteltes _memoized)
+        key = _model_key("hedged", model, temperature, key_index, {**kwargs, "fake": fake,
+                         "percentile": percentile, "max_hedge_rate": max_hedge_rate})
+        with _models_lock:
+            hedged = _models.get(key)
+        if hedged is not None:
+            return hedged
+        # Gleiches Modell auf dem jeweils anderen API-Key als Hedge-Ziel
+        other_index = 2 if key_index == 1 else 1
+        models = [
+            get_anthropic_llm(model, temperature, key_index, fake=fake, hedge=False, **kwargs),
+            get_anthropic_llm(model, temperature, other_index, fake=fake, hedge=False, **kwargs),
+        ]
+        return _memoized(
+            key,
+            lambda: HedgedChatModel(models=models, percentile=percentile, max_hedge_rate=max_hedge_rate),
+        )
+    
+    if fake:
+        logger.info(f"FAKE_LLM aktiv - verwende FakeShipmentChatModel statt {model}")
+        # Eigener Zufallsstrom pro Key, damit die Latenzen der Keys unabhängig sind
+        seed = os.environ.get("FAKE_LLM_SEED")
+        overrides = {"seed": int(seed) + key_index} if seed else {}
+        return FakeShipmentChatModel.from_env(model=f"fake-{model}", metadata={"key_index": key_index}, **overrides)
+    
+    params = {"max_tokens": 1000, "timeout": 10, **kwargs}
+    return _memoized(
+        _model_key("anthropic", model, temperature, key_index, params),
+        lambda: _create_anthropic_llm(model, temperature, key_index, params),
+    )
+
+
+def _create_anthropic_llm(model, temperature, key_index, params):
     # Versuche zuerst, den spezifischen API-Key zu bekommen
     api_key = os.environ.get(f"ANTHROPIC_API_KEY_{key_index}")
     
@@ -40,12 +128,84 @@ def get_anthropic_llm(model="claude-3-7-sonnet-20250219", temperature=0, key_ind
         logger.error(error_msg)
         raise ValueError(error_msg)
     
-    logger.info(f"Verwende API-Key für Index {key_index}")
+    logger.info(f"Erzeuge {model} (temperature={temperature}) mit API-Key für Index {key_index}")
     
-    return ChatAnthropic(
+    return PooledChatAnthropic(
         model=model,
         anthropic_api_key=api_key,
         temperature=temperature,
-        max_tokens=1000,
-        timeout=10,
-    ) 
\ No newline at end of file
+        metadata={"key_index": key_index},  # für die Kostenaufschlüsselung pro API-Key
+        **params,
+    )
+
+
+def get_openai_llm(model="gpt-4o-mini", temperature=0, key_index=1, fake=None, **kwargs):
+    """
+    Get a ChatOpenAI LLM with the specified parameters (failover provider).
+    
+    Args:
+        model (str): The model to use.
+        temperature (float): The temperature for generation.
+        key_index (int): Which API key to use (OPENAI_API_KEY_<index>, falls back to OPENAI_API_KEY)
+        fake (bool, optional): Return the offline FakeShipmentChatModel instead.
+        **kwargs: Further ChatOpenAI parameters (e.g. max_retries, base_url).
+        
+    Returns:
+        ChatOpenAI: A ChatOpenAI model instance (or FakeShipmentChatModel).
+    """
+    if fake is None:
+        fake = fake_llm_enabled()
+    if fake:
+        logger.info(f"FAKE_LLM aktiv - verwende FakeShipmentChatModel statt {model}")
+        return FakeShipmentChatModel.from_env(model=f"fake-{model}", metadata={"key_index": key_index})
+    
+    params = {"max_tokens": 1000, "timeout": 10, **kwargs}
+    return _memoized(
+        _model_key("openai", model, temperature, key_index, params),
+        lambda: _create_openai_llm(model, temperature, key_index, params),
+    )
+
+
+def _create_openai_llm(model, temperature, key_index, params):
+    # Import erst bei Bedarf, OpenAI ist nur Ausweich-Provider
+    from langchain_openai import ChatOpenAI
+    
+    api_key = os.environ.get(f"OPENAI_API_KEY_{key_index}") or os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        error_msg = f"Kein API-Key für OpenAI gefunden. Weder OPENAI_API_KEY_{key_index} noch OPENAI_API_KEY sind gesetzt."
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+    
+    logger.info(f"Erzeuge {model} (temperature={temperature}) mit OpenAI-Key für Index {key_index}")
+    base_url = params.get("base_url") or os.environ.get("OPENAI_BASE_URL")
+    return ChatOpenAI(
+        model=model,
+        api_key=api_key,
+        temperature=temperature,
+        metadata={"key_index": key_index},
+        # Nur der Sync-Client wird geteilt: ChatOpenAI bindet den Async-Client bei der Erzeugung,
+        # dessen Verbindungen aber an die Event-Loop, in der sie geöffnet wurden
+        http_client=get_http_client("openai", base_url),
+        **params,
+    )
+
+
+def get_llm(provider, model, temperature=0, key_index=1, **kwargs):
+    """
+    Get an LLM of the given provider ("anthropic" or "openai").
+    
+    Args:
+        provider (str): Provider name.
+        model (str): The model to use.
+        temperature (float): The temperature for generation.
+        key_index (int): Which API key to use.
+        **kwargs: Passed on to the provider-specific factory.
+        
+    Returns:
+        BaseChatModel: The model instance.
+    """
+    if provider == "anthropic":
+        return get_anthropic_llm(model, temperature, key_index, **kwargs)
+    if provider == "openai":
+        return get_openai_llm(model, temperature, key_index, **kwargs)
+    raise ValueError(f"Unbekannter Provider: {provider}") 
\ No newline at end of file
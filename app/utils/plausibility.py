@@ -0,0 +1,215 @@
+"""
+Batched plausibility checks of extraction results.
+
+A result that validates against the schema can still be wrong: a pallet of
+4000 kg, 1200 x 800 read as centimeters, 5 pallets where the text says 4, a
+delivery before the pickup. `check_batch` runs these checks over a batch of
+(input text, booking) pairs - the item checks on flat NumPy columns, the text
+totals with one regex pass per input - and reports the issues per section to
+re-extract:
+
+- "shipment": weights, dimensions, and the piece and weight totals the text
+  states explicitly ("insgesamt 4 Paletten", "Gesamtgewicht 400 kg")
+- "dates": pickup and delivery date
+
+Only flagged bookings and only their flagged sections go back to the LLM
+(`app.nodes.fixed_node.reextract_sections`), instead of raising
+`max_attempts` for every request. The check is free of LLM calls.
+"""
+import functools
+import operator
+import re
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.schemas.shipment_booking_schema import LoadCarrierType
+from app.utils.serialization import booking_value
+
+# Plausibles Gewicht pro Stück in kg je Ladungsträger
+CARRIER_WEIGHT_RANGES = {
+    LoadCarrierType.PALLET: (5, 1500),
+    LoadCarrierType.PACKAGE: (0.1, 100),
+    LoadCarrierType.EURO_PALLET_CAGE: (20, 1500),
+    LoadCarrierType.DOCUMENT: (0, 5),
+}
+# Größer kann ein Stück im Sattelzug nicht sein (cm); darüber waren es vermutlich mm
+MAX_DIMENSIONS_CM = {"length": 1360, "width": 250, "height": 300}
+# Grundflächen üblicher Ladungsträger in cm; dieselben Zahlen x10 deuten auf mm hin
+STANDARD_FOOTPRINTS_CM = [(120, 80), (120, 100), (124, 84), (80, 60), (60, 40)]
+# Zulässige Abweichung zwischen Gesamtgewicht im Text und extrahierter Summe
+WEIGHT_TOLERANCE = 0.1
+
+_ITEM_FIELDS = ("load_carrier", "quantity", "length", "width", "height", "weight")
+_get_item_fields = operator.itemgetter(*_ITEM_FIELDS)
+_get_item_attributes = operator.attrgetter(*_ITEM_FIELDS)
+
+_NUMBER = r"(\d{1,3}(?:[.\s]\d{3})+|\d+(?:,\d+)?)"
+_TOTAL_WEIGHT_RE = re.compile(
+    rf"(?:gesamt\w*|insgesamt|total|summe|brutto\w*)[^\d\n]{{0,30}}{_NUMBER}\s*(kg|t)\b", re.IGNORECASE
+)
+_PIECES = (
+    r"(?<![\d.,])(\d{1,4})\s*(?:x\s*)?(?:paletten|palette|pallets?|pal\b|eur-?paletten|europaletten|gitterbox(?:en)?"
+    r"|pakete?|packages?|parcels?|kartons?|cartons?|colli|kisten?|crates?|packstücke?)\b"
+)
+# Nur ausdrückliche Summen: "4 Paletten, davon 2 stapelbar" oder "1 Palette mit 20 Kartons" sind keine
+_TOTAL_PIECES_RE = re.compile(
+    rf"(?:insgesamt|gesamt|total|in total)\s*:?\s*{_PIECES}|{_PIECES}\s*(?:insgesamt|gesamt|total|in total)\b",
+    re.IGNORECASE,
+)
+_DATE_RE = re.compile(r"^\s*(\d{1,2})\.(\d{1,2})\.(\d{4})\s*$")
+
+
+def _parse_number(text: str) -> float:
+    # "12.400" / "12 400" = 12400, "1,5" = 1.5
+    if re.fullmatch(r"\d{1,3}(?:[.\s]\d{3})+", text):
+        return float(re.sub(r"[.\s]", "", text))
+    return float(text.replace(",", "."))
+
+
+def text_totals(text: str) -> Dict[str, float]:
+    """
+    Totals stated in an input text.
+
+    Returns:
+        dict: "weight" (kg, from "Gesamtgewicht 12.400 kg" etc.) and "pieces"
+            (from "insgesamt 4 Paletten", "6 Pakete gesamt", ...); NaN if the text states none
+    """
+    weight = np.nan
+    match = _TOTAL_WEIGHT_RE.search(text)
+    if match:
+        weight = _parse_number(match.group(1)) * (1000 if match.group(2).lower() == "t" else 1)
+    pieces = np.nan
+    match = _TOTAL_PIECES_RE.search(text)
+    if match:
+        pieces = float(match.group(1) or match.group(2))
+    return {"weight": weight, "pieces": pieces}
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_day(value: str) -> np.datetime64:
+    match = _DATE_RE.match(value)
+    if not match:
+        return np.datetime64("NaT")
+    day, month, year = match.groups()
+    try:
+        return np.datetime64(f"{year}-{int(month):02d}-{int(day):02d}", "D")
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def _to_day(value: Any) -> np.datetime64:
+    # Wenige verschiedene Termine je Batch, daher gecacht
+    return _parse_day(value) if isinstance(value, str) else np.datetime64("NaT")
+
+
+def _numeric(rows: List[tuple]) -> np.ndarray:
+    try:
+        return np.array(rows, dtype=np.float64).reshape(len(rows), len(_ITEM_FIELDS))
+    except (TypeError, ValueError):
+        return np.array(
+            [[v if isinstance(v, (int, float)) else np.nan for v in row] for row in rows], dtype=np.float64
+        ).reshape(len(rows), len(_ITEM_FIELDS))
+
+
+def check_batch(texts: Sequence[str], bookings: Sequence[Union[BaseModel, Dict[str, Any]]]) -> List[Dict[str, List[str]]]:
+    """
+    Check a batch of extraction results against plausibility rules.
+
+    Args:
+        texts: Input text of each booking (the text the booking was extracted from)
+        bookings: Bookings (`ShipmentBooking` models or dicts) in the same order
+
+    Returns:
+        list: Per booking a dict of issues per section ("shipment", "dates");
+            empty dict if the booking looks plausible
+    """
+    count = len(bookings)
+    issues: List[Dict[str, List[str]]] = [{} for _ in range(count)]
+
+    def flag(index: int, section: str, message: str) -> None:
+        issues[index].setdefault(section, []).append(message)
+
+    # Positionen als Spalten: Buchungsindex, Ladungsträger, Menge, Maße, Gewicht
+    index, rows = [], []
+    for i, booking in enumerate(bookings):
+        items = booking_value(booking_value(booking, "shipment"), "items") or []
+        index.extend([i] * len(items))
+        if isinstance(booking, BaseModel):
+            rows += list(map(_get_item_attributes, items))
+            continue
+        try:
+            rows += list(map(_get_item_fields, items))
+        except KeyError:
+            rows += [tuple(map(item.get, _ITEM_FIELDS)) for item in items]
+    index = np.array(index, dtype=np.intp)
+    carrier, quantity, length, width, height, weight = _numeric(rows).T
+    position = np.arange(len(index)) - np.searchsorted(index, index)  # 0-basiert je Buchung
+
+    # Gewicht pro Stück außerhalb des Bereichs des Ladungsträgers
+    for carrier_type, (low, high) in CARRIER_WEIGHT_RANGES.items():
+        bad = (carrier == carrier_type) & ((weight < low) | (weight > high))
+        for i in np.flatnonzero(bad):
+            flag(index[i], "shipment", (
+                f"Position {position[i] + 1}: {weight[i]:g} kg pro {carrier_type.name.lower()} "
+                f"liegt außerhalb von {low:g}-{high:g} kg"
+            ))
+
+    # Maße in mm statt cm
+    too_large = (length > MAX_DIMENSIONS_CM["length"]) | (width > MAX_DIMENSIONS_CM["width"]) | (height > MAX_DIMENSIONS_CM["height"])
+    footprint_mm = np.zeros(len(index), dtype=bool)
+    for a, b in STANDARD_FOOTPRINTS_CM:
+        footprint_mm |= ((length == a * 10) & (width == b * 10)) | ((length == b * 10) & (width == a * 10))
+    for i in np.flatnonzero(too_large | footprint_mm):
+        flag(index[i], "shipment", (
+            f"Position {position[i] + 1}: Maße {length[i]:g} x {width[i]:g} x {height[i]:g} cm "
+            f"sehen nach Millimetern aus"
+        ))
+
+    # Summen gegen die Angaben im Text
+    pieces = np.where(np.isnan(quantity), 0, quantity)
+    total_pieces = np.bincount(index, weights=pieces, minlength=count)
+    total_weight = np.bincount(index, weights=np.nan_to_num(weight) * pieces, minlength=count)
+    weight_sum = np.bincount(index, weights=np.nan_to_num(weight), minlength=count)
+    stated = [text_totals(text) for text in texts]
+    stated_weight = np.array([s["weight"] for s in stated])
+    stated_pieces = np.array([s["pieces"] for s in stated])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Gesamtgewicht passt weder zu Menge x Gewicht noch zur Summe der Positionsgewichte
+        weight_off = (
+            (np.abs(total_weight - stated_weight) > WEIGHT_TOLERANCE * stated_weight)
+            & (np.abs(weight_sum - stated_weight) > WEIGHT_TOLERANCE * stated_weight)
+        )
+    for i in np.flatnonzero(weight_off):
+        flag(i, "shipment", f"Gesamtgewicht laut Text {stated_weight[i]:g} kg, extrahiert {total_weight[i]:g} kg")
+    for i in np.flatnonzero(~np.isnan(stated_pieces) & (stated_pieces != total_pieces)):
+        flag(i, "shipment", f"Laut Text {stated_pieces[i]:g} Packstücke, extrahiert {total_pieces[i]:g}")
+
+    # Lieferung vor Abholung
+    pickup = np.array(
+        [_to_day(booking_value(booking_value(b, "pickup_address"), "pickup_date")) for b in bookings], dtype="datetime64[D]"
+    )
+    delivery = np.array(
+        [_to_day(booking_value(booking_value(b, "delivery_address"), "delivery_date")) for b in bookings], dtype="datetime64[D]"
+    )
+    for i in np.flatnonzero(delivery < pickup):
+        flag(i, "dates", f"Lieferdatum {delivery[i]} liegt vor dem Abholdatum {pickup[i]}")
+
+    return issues
+
+
+def check_booking(text: str, booking: Union[BaseModel, Dict[str, Any]]) -> Dict[str, List[str]]:
+    """`check_batch` for a single booking."""
+    return check_batch([text], [booking])[0]
+
+
+def count_issues(issues: Dict[str, List[str]]) -> int:
+    """Number of issues over all sections."""
+    return sum(map(len, issues.values()))
+
+
+def format_issues(issues: Dict[str, List[str]], section: Optional[str] = None) -> str:
+    """Issues as a bullet list (of one section or all), e.g. for a re-extraction prompt."""
+    sections = [section] if section else list(issues)
+    return "\n".join(f"- {message}" for name in sections for message in issues.get(name, []))
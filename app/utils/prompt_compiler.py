@@ -0,0 +1,183 @@
+"""
+System prompt compiled from the booking schema.
+
+The tool definition sent with every extraction call already carries each
+field's description from `Field(description=...)`. The hand-written part of
+the prompt (`instructions/shipment_booking_rules.md`) therefore only holds the
+task rules - role, how to tell the addresses apart, what to do with missing
+data - and a `<!-- fields -->` marker. The compiler fills the marker with the
+sections of the schema:
+
+- "outline": one line per section with its field names, so the
+  rules can refer to them; the descriptions stay in the tool schema only
+- "full": every field with its description, for models called without tool
+  definitions
+
+The legacy hand-written prompt (`instructions/shipment_booking_system_prompt.md`)
+stays the default until `benchmarks/verify_compiled_prompt.py` has shown on
+the sample corpus, against the real model, that the compiled prompt yields
+equivalent bookings; the compiled variants are opt-in via `SYSTEM_PROMPT`.
+`python -m app.utils.prompt_compiler` prints the compiled prompt's tokens per
+section next to the legacy prompt.
+"""
+import argparse
+import functools
+import json
+import os
+import re
+import typing
+from typing import Dict, List, Optional, Type
+
+from pydantic import BaseModel
+
+from app.schemas.shipment_booking_schema import ShipmentBooking
+from app.utils.email_preprocessing import estimate_tokens
+
+INSTRUCTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "instructions")
+RULES_PATH = os.path.join(INSTRUCTIONS_DIR, "shipment_booking_rules.md")
+LEGACY_PROMPT_PATH = os.path.join(INSTRUCTIONS_DIR, "shipment_booking_system_prompt.md")
+FIELDS_MARKER = "<!-- fields -->"
+DETAILS = ("outline", "full")
+
+_HEADING_RE = re.compile(r"^(#{1,2}) (.+)$", re.MULTILINE)
+
+
+def _model_of(annotation) -> Optional[Type[BaseModel]]:
+    """The pydantic model inside Optional[...] / List[...], if any."""
+    if isinstance(annotation, type):
+        return annotation if issubclass(annotation, BaseModel) else None
+    for arg in typing.get_args(annotation):
+        model = _model_of(arg)
+        if model is not None:
+            return model
+    return None
+
+
+def _is_list(annotation) -> bool:
+    if typing.get_origin(annotation) in (list, List):
+        return True
+    return any(_is_list(arg) for arg in typing.get_args(annotation))
+
+
+def _field_lines(model: Type[BaseModel], indent: str = "") -> List[str]:
+    lines = []
+    for name, field in model.model_fields.items():
+        nested = _model_of(field.annotation)
+        label = f"{name}[]" if _is_list(field.annotation) else name
+        if nested is not None:
+            lines.append(f"{indent}- {label}: {field.description or nested.__doc__ or ''}".rstrip(": "))
+            lines.extend(_field_lines(nested, indent + "  "))
+        else:
+            lines.append(f"{indent}- {label}: {field.description}" if field.description else f"{indent}- {label}")
+    return lines
+
+
+def _outline(model: Type[BaseModel]) -> str:
+    parts = []
+    for name, field in model.model_fields.items():
+        nested = _model_of(field.annotation)
+        if nested is not None:
+            if _is_list(field.annotation):
+                parts.append(f"{name}[] (one entry per distinct item: {_outline(nested)})")
+            else:
+                parts.append(f"{name} ({_outline(nested)})")
+        else:
+            parts.append(name)
+    return ", ".join(parts)
+
+
+def render_fields(model: Type[BaseModel] = ShipmentBooking, detail: str = "outline") -> str:
+    """
+    Render the sections of a schema as Markdown.
+
+    Args:
+        model: Top-level schema; each field is one section
+        detail (str): "outline" (field names) or "full" (field names and descriptions)
+
+    Returns:
+        str: One "## N. SECTION (`field`)" block per section
+    """
+    if detail not in DETAILS:
+        raise ValueError(f"Unknown prompt detail '{detail}', expected one of {DETAILS}")
+    blocks = []
+    for number, (name, field) in enumerate(model.model_fields.items(), start=1):
+        section = _model_of(field.annotation)
+        lines = [f"## {number}. {name.replace('_', ' ').upper()} (`{name}`)"]
+        if field.description:
+            lines.append(field.description)
+        if section is not None and detail == "outline":
+            lines.append(f"Fields: {_outline(section)}")
+        elif section is not None:
+            lines.extend(_field_lines(section))
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def compile_prompt(model: Type[BaseModel] = ShipmentBooking, detail: str = "outline", rules_path: str = RULES_PATH) -> str:
+    """
+    Build the system prompt from the hand-written rules and the schema.
+
+    Returns:
+        str: The rules with the `<!-- fields -->` marker replaced by `render_fields`
+    """
+    with open(rules_path, "r", encoding="utf-8") as f:
+        rules = f.read()
+    if FIELDS_MARKER not in rules:
+        raise ValueError(f"{rules_path} has no {FIELDS_MARKER} marker for the field sections")
+    return rules.replace(FIELDS_MARKER, render_fields(model, detail))
+
+
+@functools.lru_cache(maxsize=None)
+def get_system_prompt(variant: Optional[str] = None) -> str:
+    """
+    System prompt for the extraction.
+
+    Args:
+        variant (str, optional): "legacy" (the hand-written prompt), "outline" or
+            "full"; default `SYSTEM_PROMPT` from the environment, else "legacy"
+    """
+    variant = variant or os.environ.get("SYSTEM_PROMPT", "legacy")
+    if variant == "legacy":
+        with open(LEGACY_PROMPT_PATH, "r", encoding="utf-8") as f:
+            return f.read()
+    return compile_prompt(detail=variant)
+
+
+def section_tokens(prompt: str) -> Dict[str, int]:
+    """
+    Estimated tokens per top-level section ("# ...") of a Markdown prompt.
+
+    Returns:
+        dict: Heading -> tokens, in prompt order ("(preamble)" for text before the first heading)
+    """
+    sections: Dict[str, int] = {}
+    starts = [m for m in _HEADING_RE.finditer(prompt) if m.group(1) == "#"]
+    if not starts or starts[0].start() > 0:
+        sections["(preamble)"] = estimate_tokens(prompt[:starts[0].start() if starts else len(prompt)])
+    for i, match in enumerate(starts):
+        end = starts[i + 1].start() if i + 1 < len(starts) else len(prompt)
+        sections[match.group(2).strip()] = estimate_tokens(prompt[match.start():end])
+    return sections
+
+
+def _schema_tokens(model: Type[BaseModel]) -> int:
+    return estimate_tokens(json.dumps(model.model_json_schema(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the system prompt from the booking schema")
+    parser.add_argument("--detail", choices=DETAILS, default="outline")
+    parser.add_argument("--print", action="store_true", help="Print the compiled prompt")
+    args = parser.parse_args()
+    compiled = compile_prompt(detail=args.detail)
+    legacy = get_system_prompt("legacy")
+    if args.print:
+        print(compiled)
+        print()
+    compiled_sections, legacy_sections = section_tokens(compiled), section_tokens(legacy)
+    width = max(map(len, list(compiled_sections) + list(legacy_sections)))
+    print(f"{'section':<{width}}  {'legacy':>7}  {'compiled':>8}")
+    for name in dict.fromkeys(list(legacy_sections) + list(compiled_sections)):
+        print(f"{name:<{width}}  {legacy_sections.get(name, 0):>7}  {compiled_sections.get(name, 0):>8}")
+    print(f"{'total':<{width}}  {estimate_tokens(legacy):>7}  {estimate_tokens(compiled):>8}")
+    print(f"\nTool schema (ShipmentBooking, sent with every call): {_schema_tokens(ShipmentBooking)} tokens")
@@ -0,0 +1,67 @@
+"""
+JSON output of extraction results.
+
+The extraction nodes keep the validated `ShipmentBooking` in the workflow
+state; it is serialized once, at the edge (UI, API response, results file), by
+pydantic's Rust serializer - `model_dump_json` for a `ShipmentBooking`,
+`pydantic_core.to_json` for its dict form (e.g. a booking loaded from the
+thread store). Placeholders the model writes for unknown values ("NULL",
+"<UNKNOWN>") are replaced in that JSON text when asked to, instead of walking
+and rewriting the booking in memory; the booking itself stays untouched.
+`booking_value` reads a field from either form.
+"""
+import re
+from typing import Any, Dict, Optional, Union
+
+import pydantic_core
+from pydantic import BaseModel
+
+PLACEHOLDERS = ("NULL", "<UNKNOWN>")
+
+# Nur komplette String-Werte (auch in eingerücktem JSON); maskierte Anführungszeichen in Texten (\") passen nicht
+_PLACEHOLDER_RE = re.compile(
+    r'([:\[,]\s*)"(?:' + "|".join(re.escape(p) for p in PLACEHOLDERS) + r')"(?=\s*[,\]}])'
+)
+
+
+def booking_value(obj: Union[BaseModel, Dict[str, Any], None], name: str, default: Any = None) -> Any:
+    """Value of field `name` of a booking, section or item, in model or dict form."""
+    if isinstance(obj, BaseModel):
+        return getattr(obj, name, default)
+    return obj.get(name, default) if obj else default
+
+
+def booking_json(
+    booking: Union[BaseModel, Dict[str, Any]],
+    placeholder: Optional[str] = None,
+    indent: Optional[int] = None,
+) -> str:
+    """
+    Serialize a booking to JSON in one pass.
+
+    Args:
+        booking: `ShipmentBooking` (or any model) or its dict form
+        placeholder (str, optional): Replacement for "NULL" / "<UNKNOWN>" values, e.g. "N/A"
+        indent (int, optional): Pretty-print with this indentation
+
+    Returns:
+        str: JSON text
+    """
+    if isinstance(booking, BaseModel):
+        text = booking.model_dump_json(indent=indent)
+    else:
+        text = pydantic_core.to_json(booking, indent=indent).decode()
+    if placeholder is not None:
+        replacement = pydantic_core.to_json(placeholder).decode()
+        text = _PLACEHOLDER_RE.sub(lambda match: match.group(1) + replacement, text)
+    return text
+
+
+def display_values(section: Union[BaseModel, Dict[str, Any], None], placeholder: str = "N/A") -> Dict[str, Any]:
+    """
+    Shallow dict of one booking section (or item) for display, with "NULL" /
+    "<UNKNOWN>" values replaced by `placeholder`; the booking stays untouched.
+    """
+    # dict(model) liefert die Felder ohne rekursives model_dump
+    values = dict(section) if isinstance(section, BaseModel) else (section or {})
+    return {key: placeholder if value in PLACEHOLDERS else value for key, value in values.items()}
@@ -0,0 +1,268 @@
+"""
+Speculative background extraction while the user is still reading.
+
+Users paste a request and read it for a few seconds before they click
+"Extract". `SpeculativeExtractor` starts the extraction in the background as
+soon as the text changes and looks complete (`looks_complete`), debounced by
+`SPECULATION_DEBOUNCE_SECONDS` (default 1.5):
+
+- a further edit cancels the pending speculation; a run that already started
+  is stopped at its next LLM call (the call in progress cannot be aborted) and
+  its result dropped
+- edits that are small against the last extraction (`is_small_edit`) go
+  through the incremental update and are not speculated; the check runs in
+  the debounce thread, not in the UI callback
+- on the click, `take(text)` returns the finished result for exactly this
+  text, waits for the one in flight, or returns None (normal extraction)
+
+`metrics()` records how often speculation saved time (and how much) against
+the extra spend of runs that were never used. `SPECULATIVE_EXTRACTION=0`
+disables it in the app.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+
+from app.utils.cancellation import RequestCancelled
+from app.utils.incremental import is_small_edit
+from app.utils.tracing import invoke_traced
+from app.utils.usage import UsageTracker
+
+logger = logging.getLogger(__name__)
+
+SPECULATIVE_EXTRACTION = os.environ.get("SPECULATIVE_EXTRACTION", "1") != "0"
+DEBOUNCE_SECONDS = float(os.environ.get("SPECULATION_DEBOUNCE_SECONDS", "1.5"))
+MIN_CHARS = 60
+# Für alle Sitzungen des Prozesses; abgebrochene Läufe können noch ihren letzten LLM-Aufruf beenden
+WORKERS = int(os.environ.get("SPECULATION_WORKERS", "4"))
+
+_POSTAL_CODE_RE = re.compile(r"\b\d{4,5}\b")
+_GOODS_RE = re.compile(
+    r"\d+\s*(?:x\s*)?(?:kg|t|cm|mm|cbm|m³|paletten?|pallets?|pakete?|packages?|colli|kartons?|cartons?|kisten?|stück|stk|pcs)\b"
+    r"|\d+\s*[x×]\s*\d+",
+    re.IGNORECASE,
+)
+
+
+def looks_complete(text: str) -> bool:
+    """A request worth extracting: long enough, with a postal code and goods (quantity, weight or dimensions)."""
+    text = text.strip()
+    return len(text) >= MIN_CHARS and bool(_POSTAL_CODE_RE.search(text)) and bool(_GOODS_RE.search(text))
+
+
+_executor: Optional[ContextThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _shared_executor() -> ContextThreadPoolExecutor:
+    # Ein Pool pro Prozess statt einem pro Streamlit-Sitzung, die nie aufgeräumt würde
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ContextThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="speculation")
+        return _executor
+
+
+def _key(text: str) -> str:
+    return hashlib.sha1(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+class SpeculationCancelled(RequestCancelled):
+    """The text changed; the speculative run stops before its next LLM call."""
+
+
+class _CancelBeforeCall(BaseCallbackHandler):
+    raise_error = True
+
+    def __init__(self, cancelled: threading.Event):
+        self._cancelled = cancelled
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        if self._cancelled.is_set():
+            raise SpeculationCancelled()
+
+
+class _Speculation:
+    def __init__(self, text: str, baseline: Optional[str] = None):
+        self.key = _key(text)
+        self.text = text
+        self.baseline = baseline
+        self.cancelled = threading.Event()
+        self.future = None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.cost = 0.0
+        self.done = False
+
+
+@dataclass
+class SpeculationHit:
+    """Result of a speculative run taken on the click."""
+
+    state: Dict[str, Any]
+    duration: float       # Laufzeit der Extraktion
+    saved_seconds: float  # Davon vor dem Klick erledigt
+
+
+class SpeculativeExtractor:
+    """
+    Debounced background runs of an extraction runnable for the latest text.
+
+    Args:
+        runnable: Extraction workflow (e.g. `build_shipment_runnable()`), invoked with {"input": text}
+        debounce (float): Seconds without further edits before a run starts
+        config (RunnableConfig, optional): Base config of the runs (no UI callbacks - they run in a thread)
+        executor (Executor, optional): Runs the extractions; default a pool shared by all extractors of the process
+    """
+
+    def __init__(self, runnable: Runnable, debounce: float = DEBOUNCE_SECONDS, config: Optional[dict] = None, executor=None):
+        self._runnable = runnable
+        self._debounce = debounce
+        self._config = config or {}
+        self._executor = executor or _shared_executor()
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._current: Optional[_Speculation] = None
+        self._stats = {
+            "started": 0, "cancelled": 0, "hits_ready": 0, "hits_in_flight": 0, "misses": 0,
+            "saved_seconds": 0.0, "used_cost_usd": 0.0, "wasted_cost_usd": 0.0,
+        }
+
+    def text_changed(self, text: str, baseline: Optional[str] = None) -> bool:
+        """
+        Report an edit of the input; cancels the previous speculation and schedules a new one.
+
+        Args:
+            text (str): Current input
+            baseline (str, optional): Input of the last extraction; if `text` is only
+                a small edit of it, no run is started after the debounce delay
+
+        Returns:
+            bool: True if a speculation for `text` is scheduled, running or finished
+        """
+        with self._lock:
+            current = self._current
+            if current is not None and current.key == _key(text) and not current.cancelled.is_set():
+                return True
+            self._cancel_current()
+            if not looks_complete(text):
+                return False
+            speculation = self._current = _Speculation(text, baseline)
+            self._timer = threading.Timer(self._debounce, self._start, args=(speculation,))
+            self._timer.daemon = True
+            self._timer.start()
+            return True
+
+    def _cancel_current(self) -> None:
+        # Aufruf nur mit gehaltenem Lock
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        speculation, self._current = self._current, None
+        if speculation is None:
+            return
+        speculation.cancelled.set()
+        if speculation.future is None:
+            return
+        self._stats["cancelled"] += 1
+        speculation.future.cancel()
+        if speculation.done:
+            # Fertig, aber nie verwendet
+            self._stats["wasted_cost_usd"] += speculation.cost
+
+    def _start(self, speculation: _Speculation) -> None:
+        if speculation.baseline is not None and is_small_edit(speculation.baseline, speculation.text):
+            # Läuft beim Klick über das inkrementelle Update
+            return
+        with self._lock:
+            if speculation is not self._current or speculation.cancelled.is_set() or speculation.future is not None:
+                return
+            self._stats["started"] += 1
+            speculation.future = self._executor.submit(self._run, speculation)
+
+    def _run(self, speculation: _Speculation) -> Optional[Dict[str, Any]]:
+        usage = UsageTracker()
+        config = {**self._config, "callbacks": [*self._config.get("callbacks", []), usage, _CancelBeforeCall(speculation.cancelled)]}
+        speculation.started = time.perf_counter()
+        state = None
+        try:
+            state = invoke_traced(self._runnable, {"input": speculation.text}, config=config)
+        except SpeculationCancelled:
+            logger.info("Spekulative Extraktion abgebrochen (Text geändert)")
+        except Exception as e:
+            # Der Klick extrahiert dann normal
+            logger.warning(f"Spekulative Extraktion fehlgeschlagen: {e}")
+        finally:
+            speculation.finished = time.perf_counter()
+            with self._lock:
+                speculation.cost = usage.report()["totals"]["cost_usd"]
+                speculation.done = True
+                if speculation.cancelled.is_set():
+                    self._stats["wasted_cost_usd"] += speculation.cost
+        return state
+
+    def take(self, text: str, timeout: Optional[float] = None) -> Optional[SpeculationHit]:
+        """
+        Use the speculation for `text` on the click.
+
+        A finished run is returned right away, a run in flight (or still in its
+        debounce delay) is awaited.
+
+        Returns:
+            SpeculationHit or None: None if there is no usable speculation for this text
+        """
+        clicked = time.perf_counter()
+        with self._lock:
+            speculation = self._current
+            if speculation is None or speculation.key != _key(text) or speculation.cancelled.is_set():
+                self._stats["misses"] += 1
+                return None
+            if speculation.future is None:
+                # Noch in der Entprellzeit: sofort starten
+                self._timer.cancel()
+                self._timer = None
+                self._stats["started"] += 1
+                speculation.future = self._executor.submit(self._run, speculation)
+            self._current = None
+        state = speculation.future.result(timeout=timeout)
+        with self._lock:
+            if state is None:
+                self._stats["misses"] += 1
+                self._stats["wasted_cost_usd"] += speculation.cost
+                return None
+            ready = speculation.finished <= clicked
+            saved = max((speculation.finished if ready else clicked) - speculation.started, 0.0)
+            self._stats["hits_ready" if ready else "hits_in_flight"] += 1
+            self._stats["saved_seconds"] += saved
+            self._stats["used_cost_usd"] += speculation.cost
+        logger.info(f"Spekulative Extraktion verwendet ({'fertig' if ready else 'lief noch'}), {saved:.1f}s gespart")
+        return SpeculationHit(state, speculation.finished - speculation.started, saved)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Counters of this extractor.
+
+        Returns:
+            dict: "started", "cancelled", "hits_ready", "hits_in_flight", "misses"
+                (clicks without a usable speculation), "hit_rate", "saved_seconds",
+                "used_cost_usd" and "wasted_cost_usd" (runs never used)
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        clicks = stats["hits_ready"] + stats["hits_in_flight"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits_ready"] + stats["hits_in_flight"]) / clicks if clicks else None
+        return stats
+
+    def shutdown(self) -> None:
+        """Cancel the current speculation (the shared worker threads keep running)."""
+        with self._lock:
+            self._cancel_current()
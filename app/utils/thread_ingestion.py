@@ -0,0 +1,89 @@
+"""
+Thread-aware ingestion of booking emails.
+
+The first message of a thread runs through the full extraction graph; every
+follow-up ("Abholung auf Donnerstag verschoben", "2 Paletten mehr") is applied
+as a trustcall update (`existing` + PatchDoc) to the booking stored for the
+thread. Only the new message is sent - quoted history is removed by the email
+preprocessing - so latency and tokens per message stay flat as threads grow.
+
+Several processes may ingest the same thread: if another one stored a message
+in the meantime, the message is applied again to the newer booking.
+"""
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from app.nodes.fixed_node import apply_followup_message
+from app.utils.email_preprocessing import preprocess_email
+from app.utils.thread_store import ThreadConflict, ThreadStore
+from app.utils.workflow import build_shipment_runnable
+
+logger = logging.getLogger(__name__)
+
+# Neue Versuche, wenn ein anderer Prozess den Thread zwischenzeitlich aktualisiert hat
+CONFLICT_RETRIES = 3
+
+_runnables = {}
+_store = None
+_init_lock = threading.Lock()
+
+
+def _default_store() -> ThreadStore:
+    global _store
+    if _store is None:
+        with _init_lock:
+            if _store is None:
+                _store = ThreadStore()
+    return _store
+
+
+def _extraction(mode: Optional[str]):
+    if mode not in _runnables:
+        with _init_lock:
+            if mode not in _runnables:
+                _runnables[mode] = build_shipment_runnable(mode)
+    return _runnables[mode]
+
+
+def ingest_message(
+    thread_id: str, message: str, store: Optional[ThreadStore] = None, config=None, extraction_mode: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Process one email of a thread and store the thread's updated booking.
+
+    Args:
+        thread_id (str): Thread identifier (e.g. the Message-ID of the first mail)
+        message (str): Raw email text (HTML, quotes and signatures are stripped)
+        store (ThreadStore, optional): Booking store (default: `THREAD_STORE_PATH`)
+        config (RunnableConfig, optional): Config of the request (callbacks etc.)
+        extraction_mode (str, optional): Execution mode of the first extraction, "graph" or
+            "direct" (default: `EXTRACTION_MODE`)
+
+    Returns:
+        dict: "thread_id", "message_index" (1-based), "mode" ("extract" or
+            "update"), the current booking as "result" and the "usage" report
+    """
+    store = store if store is not None else _default_store()
+    for attempt in range(CONFLICT_RETRIES + 1):
+        with store.lock(thread_id):
+            state = store.get(thread_id)
+            if state is None:
+                final_state = _extraction(extraction_mode).invoke({"input": message}, config=config)
+                result, usage, mode = final_state["result"], final_state.get("usage"), "extract"
+                index = 1
+            else:
+                # Die zitierte Historie steckt bereits in der gespeicherten Buchung
+                text, report = preprocess_email(message, keep_quoted_facts=False)
+                logger.info(f"Thread {thread_id}: Nachricht {state['messages'] + 1}, {report['tokens_after']} Tokens nach Vorverarbeitung")
+                update = apply_followup_message(text, state["booking"], config)
+                result, usage, mode = update["result"], update["usage"], "update"
+                index = state["messages"] + 1
+            try:
+                store.put(thread_id, result, index, expected=index - 1)
+            except ThreadConflict:
+                if attempt == CONFLICT_RETRIES:
+                    raise
+                logger.warning(f"Thread {thread_id}: von einem anderen Prozess aktualisiert, Nachricht wird neu angewendet")
+                continue
+        return {"thread_id": thread_id, "message_index": index, "mode": mode, "result": result, "usage": usage}
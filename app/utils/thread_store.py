@@ -0,0 +1,128 @@
+"""
+Local store of the current booking per email thread.
+
+Each thread ID maps to the latest `ShipmentBooking` (stored as JSON, read back
+as a dict) plus a message counter, kept in a SQLite file so the state survives
+restarts and can be shared by several processes. `lock(thread_id)` serializes the processing of
+messages of the same thread within a process; across processes `put` is a
+compare-and-set on the message counter, so a message processed concurrently
+by another process fails with `ThreadConflict` instead of overwriting its
+update. The caller re-reads the thread and applies the message again.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional, Union
+
+from pydantic import BaseModel
+
+from app.utils.serialization import booking_json
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data", "threads.sqlite3")
+# Feste Anzahl Sperren; Threads mit gleichem Hash teilen sich eine (der Speicher wächst nicht mit den Threads)
+LOCK_STRIPES = 64
+
+
+class ThreadConflict(Exception):
+    """The thread was updated by someone else since it was read."""
+
+
+class ThreadStore:
+    """
+    SQLite-backed booking state per thread.
+
+    Args:
+        path (str, optional): Database file (default: `THREAD_STORE_PATH` or
+            data/threads.sqlite3); ":memory:" for a temporary store
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.environ.get("THREAD_STORE_PATH", DEFAULT_PATH)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        if self.path != ":memory:":
+            # WAL: Leser blockieren den Schreiber anderer Prozesse nicht
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS threads ("
+            " thread_id TEXT PRIMARY KEY,"
+            " booking TEXT NOT NULL,"
+            " messages INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db_lock = threading.Lock()
+        self._thread_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def lock(self, thread_id: str) -> threading.Lock:
+        """
+        Lock for processing one message of `thread_id` at a time (within this process, see `put`).
+
+        One of `LOCK_STRIPES` locks, chosen by a hash of the thread ID; unrelated
+        threads may share a lock and then wait for each other.
+        """
+        return self._thread_locks[zlib.crc32(thread_id.encode("utf-8")) % LOCK_STRIPES]
+
+    def get(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Current state of a thread.
+
+        Returns:
+            dict: "booking", "messages" and "updated_at", or None for unknown threads
+        """
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT booking, messages, updated_at FROM threads WHERE thread_id = ?", (thread_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"booking": json.loads(row[0]), "messages": row[1], "updated_at": row[2]}
+
+    def put(self, thread_id: str, booking: Union[BaseModel, Dict[str, Any]], messages: int, expected: Optional[int] = None) -> None:
+        """
+        Store the booking after the thread's `messages`-th message.
+
+        Args:
+            thread_id (str): Thread identifier
+            booking (ShipmentBooking | dict): Booking after the message
+            messages (int): Message counter after the message
+            expected (int, optional): Counter the update is based on (0 for a new
+                thread); None writes unconditionally
+
+        Raises:
+            ThreadConflict: The stored counter is not `expected`
+        """
+        data = booking_json(booking)
+        with self._db_lock:
+            if expected is None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO threads (thread_id, booking, messages, updated_at) VALUES (?, ?, ?, ?)",
+                    (thread_id, data, messages, time.time()),
+                )
+                return
+            # Prüfen und Schreiben in einer Anweisung, damit atomar auch gegenüber anderen Prozessen
+            if expected == 0:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO threads (thread_id, booking, messages, updated_at) VALUES (?, ?, ?, ?)",
+                    (thread_id, data, messages, time.time()),
+                )
+            else:
+                cursor = self._conn.execute(
+                    "UPDATE threads SET booking = ?, messages = ?, updated_at = ? WHERE thread_id = ? AND messages = ?",
+                    (data, messages, time.time(), thread_id, expected),
+                )
+        if cursor.rowcount == 0:
+            raise ThreadConflict(f"Thread {thread_id} wurde seit dem Lesen geändert (erwartet: Nachricht {expected})")
+
+    def delete(self, thread_id: str) -> None:
+        with self._db_lock:
+            self._conn.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+
+    def __len__(self) -> int:
+        with self._db_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0]
+
+    def close(self) -> None:
+        with self._db_lock:
+            self._conn.close()
@@ -0,0 +1,264 @@
+"""
+Sampled, non-blocking LangSmith tracing.
+
+Instead of tracing every request through LangChain's per-run tracer (which
+posts each run start and end as it happens), a request is traced by a
+`BufferedTracer` that keeps the run tree in memory and decides once the request
+has finished whether to keep it:
+
+- successful requests are kept with `TRACE_SAMPLE_RATE` (default 1.0)
+- failed requests with the rate configured for their exception class in
+  `TRACE_ERROR_SAMPLE_RATES`, e.g. `TimeoutError=1,ValidationError=0.5,*=1`
+  (`*` applies to all other errors and defaults to `TRACE_SAMPLE_RATE`); base
+  classes match their subclasses
+
+The decision is made at the end of a request, so every request that might be
+kept has to be buffered: an error rate above the success rate means buffering
+that share of all requests.
+
+Kept traces are handed to a background thread that serializes and uploads them,
+so the request thread never waits for LangSmith. `TRACE_QUEUE_SIZE` (default
+1000) bounds the buffer; traces beyond it are dropped rather than blocking.
+
+Tracing stays off unless LangSmith tracing is enabled in the environment
+(`LANGSMITH_TRACING=true`). `invoke_traced(..., trace=False)` skips tracing for
+a single call, e.g. on hot paths such as batch runs and benchmarks.
+"""
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+from typing import Any, Dict, List, Optional, Type
+from uuid import UUID
+
+import langsmith as ls
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.tracers.base import BaseTracer
+from langchain_core.tracers.schemas import Run
+from langsmith import utils as ls_utils
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        name, sep, rate = entry.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid TRACE_ERROR_SAMPLE_RATES entry '{entry}', expected ErrorClass=rate")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+class TraceSampler:
+    """
+    Decides which requests are traced.
+
+    A request that may be kept is buffered with probability `buffer_rate` (the
+    highest configured rate); on completion it is kept with the conditional
+    probability that makes the overall rate match its outcome.
+
+    Args:
+        rate: Share of successful requests to keep
+        error_rates: Share of failed requests to keep per exception class name
+            ("*" for all others, defaults to `rate`)
+    """
+
+    def __init__(self, rate: float = 1.0, error_rates: Optional[Dict[str, float]] = None, rng: Optional[random.Random] = None):
+        self.rate = rate
+        self.error_rates = {"*": rate, **(error_rates or {})}
+        self.buffer_rate = max(rate, *self.error_rates.values())
+        self._rng = rng or random.Random()
+
+    @classmethod
+    def from_env(cls) -> "TraceSampler":
+        return cls(
+            float(os.environ.get("TRACE_SAMPLE_RATE", 1.0)),
+            _parse_rates(os.environ.get("TRACE_ERROR_SAMPLE_RATES", "")),
+        )
+
+    def error_rate(self, error_type: Type[BaseException]) -> float:
+        for cls in error_type.__mro__:
+            if cls.__name__ in self.error_rates:
+                return self.error_rates[cls.__name__]
+        return self.error_rates["*"]
+
+    def should_buffer(self) -> bool:
+        return self.buffer_rate > 0 and self._rng.random() < self.buffer_rate
+
+    def should_keep(self, error_type: Optional[Type[BaseException]]) -> bool:
+        rate = self.rate if error_type is None else self.error_rate(error_type)
+        return self._rng.random() < rate / self.buffer_rate
+
+
+class TraceExporter:
+    """
+    Uploads finished run trees to LangSmith from a background thread.
+
+    Args:
+        client: LangSmith client; created from the environment on first upload
+        project_name: LangSmith project (default: `LANGSMITH_PROJECT`)
+        max_queue: Traces buffered before new ones are dropped
+    """
+
+    def __init__(self, client: Optional[ls.Client] = None, project_name: Optional[str] = None, max_queue: int = 1000):
+        self.project_name = project_name or os.environ.get("LANGSMITH_PROJECT", "sb_trustcall")
+        self._client = client
+        self._queue: "queue.Queue[Run]" = queue.Queue(maxsize=max_queue)
+        self.submitted = 0
+        self.dropped = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._worker, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    @property
+    def client(self) -> ls.Client:
+        if self._client is None:
+            self._client = ls.Client()
+        return self._client
+
+    def submit(self, run: Run) -> None:
+        """Queue a finished root run; never blocks."""
+        try:
+            self._queue.put_nowait(run)
+            self.submitted += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _worker(self) -> None:
+        while True:
+            run = self._queue.get()
+            try:
+                self._post(run)
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"Trace-Upload fehlgeschlagen: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _post(self, run: Run) -> None:
+        stack = [run]
+        while stack:
+            current = stack.pop()
+            current.ls_client = self.client
+            current.session_name = self.project_name
+            stack.extend(current.child_runs)
+        run.post(exclude_child_runs=False)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Wait until all queued traces are handed to the LangSmith client and sent."""
+        self._queue.join()
+        if self._client is not None:
+            self._client.flush(timeout=timeout)
+
+
+class BufferedTracer(BaseTracer):
+    """
+    Tracer that keeps one request's run tree in memory and exports it at the end.
+
+    Args:
+        sampler: Decides whether the finished trace is kept
+        exporter: Receives kept traces
+    """
+
+    def __init__(self, sampler: TraceSampler, exporter: TraceExporter, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.sampler = sampler
+        self.exporter = exporter
+        self._root_errors: Dict[UUID, Type[BaseException]] = {}
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> Run:
+        if parent_run_id is None:
+            self._root_errors[run_id] = type(error)
+        return super().on_chain_error(error, run_id=run_id, parent_run_id=parent_run_id, **kwargs)
+
+    def _persist_run(self, run: Run) -> None:
+        error_type = self._root_errors.pop(run.id, None)
+        if self.sampler.should_keep(error_type):
+            self.exporter.submit(run)
+
+
+_sampler: Optional[TraceSampler] = None
+_exporter: Optional[TraceExporter] = None
+_lock = threading.Lock()
+
+
+def _tracing_parts():
+    global _sampler, _exporter
+    with _lock:
+        if _exporter is None:
+            _sampler = TraceSampler.from_env()
+            _exporter = TraceExporter(max_queue=int(os.environ.get("TRACE_QUEUE_SIZE", 1000)))
+            atexit.register(_exporter.flush, 5.0)
+        return _sampler, _exporter
+
+
+def tracing_callbacks(trace: Optional[bool] = None) -> List[BaseTracer]:
+    """
+    Callbacks for one request: a BufferedTracer if the request is sampled, else none.
+
+    Args:
+        trace (bool, optional): False disables tracing for this request; None
+            traces if LangSmith tracing is enabled in the environment
+
+    Returns:
+        list: Callback handlers to add to the request's config
+    """
+    if trace is False or (trace is None and ls_utils.tracing_is_enabled() is not True):
+        return []
+    sampler, exporter = _tracing_parts()
+    if not sampler.should_buffer():
+        return []
+    return [BufferedTracer(sampler, exporter)]
+
+
+def _traced_config(config: Optional[RunnableConfig], trace: Optional[bool]) -> RunnableConfig:
+    config = dict(config or {})
+    callbacks = config.get("callbacks") or []
+    if not isinstance(callbacks, list):
+        raise TypeError("invoke_traced expects callbacks as a list of handlers")
+    config["callbacks"] = [*callbacks, *tracing_callbacks(trace)]
+    return config
+
+
+def invoke_traced(runnable: Runnable, input: Any, config: Optional[RunnableConfig] = None, trace: Optional[bool] = None) -> Any:
+    """
+    Invoke a runnable with sampled, non-blocking tracing.
+
+    LangChain's own per-run tracing is switched off for the call, so only the
+    sampled BufferedTracer (if any) records it.
+
+    Args:
+        runnable: The runnable to invoke (e.g. the compiled graph)
+        input: Its input
+        config (RunnableConfig, optional): Config; callbacks must be a list
+        trace (bool, optional): False disables tracing for this call
+
+    Returns:
+        The runnable's output.
+    """
+    config = _traced_config(config, trace)
+    with ls.tracing_context(enabled=False):
+        return runnable.invoke(input, config=config)
+
+
+async def ainvoke_traced(runnable: Runnable, input: Any, config: Optional[RunnableConfig] = None, trace: Optional[bool] = None) -> Any:
+    """Async variant of `invoke_traced`."""
+    config = _traced_config(config, trace)
+    with ls.tracing_context(enabled=False):
+        return await runnable.ainvoke(input, config=config)
+
+
+def flush_traces(timeout: Optional[float] = None) -> None:
+    """Block until all kept traces are uploaded (e.g. before shutdown)."""
+    if _exporter is not None:
+        _exporter.flush(timeout)
+
+
+def tracing_stats() -> Dict[str, int]:
+    """Counts of submitted, dropped and failed trace uploads."""
+    if _exporter is None:
+        return {"submitted": 0, "dropped": 0, "failed": 0}
+    return {"submitted": _exporter.submitted, "dropped": _exporter.dropped, "failed": _exporter.failed}
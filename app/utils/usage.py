@@ -0,0 +1,295 @@
+"""
+Token and cost accounting for the extraction.
+
+`UsageTracker` is a callback handler that collects `usage_metadata` from every
+chat model call of a request - the first extraction, trustcall's patch rounds
+for validation errors (`PatchFunctionErrors`) and updates of an existing
+document (`PatchDoc`). Providers report input tokens only as a total, so they
+are split across the prompt sections in proportion to their size:
+
+- system_prompt: system messages
+- tool_schema: the JSON schema of the bound tools
+- input_text: the user's text
+- patch_rounds: everything of a patch round, plus the error/tool-message
+  context carried into later calls
+- output: generated tokens of the extraction and update calls
+
+`combine_usage` rolls request reports up into a batch summary (per API key and
+per model), `format_usage_report` renders it as text.
+"""
+import json
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+COMPONENTS = ("system_prompt", "tool_schema", "input_text", "patch_rounds", "output")
+
+# Listenpreise in USD pro 1 Mio. Tokens: input, output, cache_read, cache_write
+PRICES = {
+    "claude-3-7-sonnet": (3.00, 15.00, 0.30, 3.75),
+    "claude-3-5-sonnet": (3.00, 15.00, 0.30, 3.75),
+    "claude-3-5-haiku": (0.80, 4.00, 0.08, 1.00),
+    "gpt-4o-mini": (0.15, 0.60, 0.075, 0.15),
+    "gpt-4o": (2.50, 10.00, 1.25, 2.50),
+}
+
+_PATCH_TOOLS = {"PatchFunctionErrors", "PatchFunctionName"}
+# Wrapper-Modelle, deren Versuche als eigene Aufrufe gemeldet werden (sonst doppelt gezählt)
+_WRAPPER_TYPES = {"hedged"}
+_UPDATE_TOOLS = {"PatchDoc"}
+
+
+def _price(model: str) -> Optional[tuple]:
+    # Fake-Modelle ("fake-claude-...") werden wie das echte Modell abgerechnet
+    model = model[len("fake-"):] if model.startswith("fake-") else model
+    for prefix in sorted(PRICES, key=len, reverse=True):
+        if model.startswith(prefix):
+            return PRICES[prefix]
+    return None
+
+
+def call_cost(model: str, input_tokens: int, output_tokens: int, cache_read: int = 0, cache_write: int = 0) -> Optional[float]:
+    """
+    Cost of one call in USD at list prices, None for unknown models.
+
+    `input_tokens` includes the cached tokens, as in LangChain's usage_metadata.
+    """
+    price = _price(model)
+    if price is None:
+        return None
+    uncached = max(0, input_tokens - cache_read - cache_write)
+    return (
+        uncached * price[0] + output_tokens * price[1] + cache_read * price[2] + cache_write * price[3]
+    ) / 1_000_000
+
+
+def _text(content) -> str:
+    if isinstance(content, str):
+        return content
+    return json.dumps(content, ensure_ascii=False, default=str)
+
+
+def _tool_names(tools) -> set:
+    names = set()
+    for tool in tools or []:
+        if isinstance(tool, dict):
+            # OpenAI-Format {"function": {"name": ...}}, Anthropic-Format {"name": ...}
+            names.add((tool.get("function") or {}).get("name") or tool.get("name"))
+    return names
+
+
+def _phase(tool_names: set) -> str:
+    if tool_names & _PATCH_TOOLS:
+        return "patch"
+    if tool_names & _UPDATE_TOOLS:
+        return "update"
+    return "extract"
+
+
+def _sections(messages, tools) -> Dict[str, int]:
+    sections = {"system_prompt": 0, "tool_schema": 0, "input_text": 0, "patch_rounds": 0}
+    sections["tool_schema"] = len(json.dumps(tools, ensure_ascii=False, default=str)) if tools else 0
+    seen_ai = False
+    for message in messages:
+        size = len(_text(message.content))
+        if message.type == "system":
+            sections["system_prompt"] += size
+        elif message.type == "human" and not seen_ai:
+            sections["input_text"] += size
+        else:
+            # Antworten, Tool-Ergebnisse und Fehlermeldungen früherer Runden
+            seen_ai = True
+            size += len(_text(getattr(message, "tool_calls", None) or ""))
+            sections["patch_rounds"] += size
+    return sections
+
+
+def _split(total: int, weights: Dict[str, int]) -> Dict[str, int]:
+    """Split `total` proportionally to `weights` (largest remainder, sums exactly)."""
+    weight_sum = sum(weights.values())
+    if not weight_sum:
+        return {key: 0 for key in weights}
+    shares = {key: total * w / weight_sum for key, w in weights.items()}
+    result = {key: int(share) for key, share in shares.items()}
+    rest = total - sum(result.values())
+    for key in sorted(shares, key=lambda k: shares[k] - result[k], reverse=True)[:rest]:
+        result[key] += 1
+    return result
+
+
+def _usage(response) -> Dict[str, Any]:
+    usage = {}
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            if message is not None and message.usage_metadata:
+                usage = message.usage_metadata
+    return usage
+
+
+class UsageTracker(BaseCallbackHandler):
+    """
+    Collects token usage of all chat model calls it is attached to (thread-safe).
+
+    Attach it via the `callbacks` of a request's config; `report()` returns the
+    aggregated usage.
+    """
+
+    def __init__(self):
+        self._pending: Dict[UUID, Dict[str, Any]] = {}
+        self.calls: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, metadata=None, invocation_params=None, **kwargs):
+        metadata = metadata or {}
+        invocation_params = invocation_params or {}
+        if invocation_params.get("_type") in _WRAPPER_TYPES:
+            return
+        tools = invocation_params.get("tools")
+        flat = [m for batch in messages for m in batch]
+        with self._lock:
+            self._pending[run_id] = {
+                "phase": _phase(_tool_names(tools)),
+                "model": invocation_params.get("model") or metadata.get("ls_model_name") or "unknown",
+                "key": f"{metadata.get('ls_provider', 'unknown')}:{metadata.get('key_index', 1)}",
+                "sections": _sections(flat, tools),
+            }
+
+    def on_llm_error(self, error, *, run_id: UUID, response=None, **kwargs):
+        with self._lock:
+            call = self._pending.pop(run_id, None)
+        # Abgebrochene Streams (z.B. verlorene Hedge-Versuche) liefern die bis dahin gemeldeten Tokens
+        if call is not None and response is not None and _usage(response):
+            self._record(call, response)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        with self._lock:
+            call = self._pending.pop(run_id, None)
+        if call is not None:
+            self._record(call, response)
+
+    def _record(self, call: Dict[str, Any], response) -> None:
+        usage = _usage(response)
+        details = usage.get("input_token_details") or {}
+        input_tokens = usage.get("input_tokens", 0)
+        output_tokens = usage.get("output_tokens", 0)
+        cache_read = details.get("cache_read", 0) or 0
+        cache_write = details.get("cache_creation", 0) or 0
+        if call["phase"] == "patch":
+            components = {"patch_rounds": input_tokens + output_tokens}
+        else:
+            components = _split(input_tokens, call.pop("sections"))
+            components["output"] = output_tokens
+        call.pop("sections", None)
+        call.update({
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cache_read_tokens": cache_read,
+            "cache_write_tokens": cache_write,
+            "components": components,
+            "cost_usd": call_cost(call["model"], input_tokens, output_tokens, cache_read, cache_write),
+        })
+        with self._lock:
+            self.calls.append(call)
+
+    def report(self) -> Dict[str, Any]:
+        """Usage of all finished calls (see `combine_usage` for the layout)."""
+        with self._lock:
+            calls = list(self.calls)
+        return _aggregate(calls, requests=1)
+
+
+def _empty_totals() -> Dict[str, Any]:
+    return {
+        "calls": 0, "input_tokens": 0, "output_tokens": 0,
+        "cache_read_tokens": 0, "cache_write_tokens": 0, "cost_usd": 0.0,
+    }
+
+
+def _add(totals: Dict[str, Any], other: Dict[str, Any]) -> None:
+    for key in totals:
+        value = other.get(key)
+        if value is not None:
+            totals[key] += value
+
+
+def _aggregate(calls: Iterable[Dict[str, Any]], requests: int) -> Dict[str, Any]:
+    summary = {
+        "requests": requests,
+        "totals": _empty_totals(),
+        "components": dict.fromkeys(COMPONENTS, 0),
+        "by_phase": defaultdict(_empty_totals),
+        "by_key": defaultdict(_empty_totals),
+        "by_model": defaultdict(_empty_totals),
+        "unpriced_calls": 0,
+    }
+    for call in calls:
+        call = {**call, "calls": 1}
+        for totals in (summary["totals"], summary["by_phase"][call["phase"]],
+                       summary["by_key"][call["key"]], summary["by_model"][call["model"]]):
+            _add(totals, call)
+        for component, tokens in call["components"].items():
+            summary["components"][component] += tokens
+        if call["cost_usd"] is None:
+            summary["unpriced_calls"] += 1
+    for key in ("by_phase", "by_key", "by_model"):
+        summary[key] = dict(summary[key])
+    return summary
+
+
+def combine_usage(reports: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Roll request reports up into one summary (e.g. for a batch job).
+
+    Args:
+        reports: Reports from `UsageTracker.report()` or earlier `combine_usage` calls
+
+    Returns:
+        dict: "requests", "totals" (calls, input/output/cache tokens, cost_usd),
+            "components" (tokens per prompt section), "by_phase", "by_key",
+            "by_model" and "unpriced_calls"
+    """
+    summary = _aggregate([], requests=0)
+    for report in reports:
+        if not report:
+            continue
+        summary["requests"] += report["requests"]
+        summary["unpriced_calls"] += report["unpriced_calls"]
+        _add(summary["totals"], report["totals"])
+        for component, tokens in report["components"].items():
+            summary["components"][component] += tokens
+        for key in ("by_phase", "by_key", "by_model"):
+            for name, totals in report[key].items():
+                _add(summary[key].setdefault(name, _empty_totals()), totals)
+    return summary
+
+
+def format_usage_report(summary: Dict[str, Any]) -> str:
+    """Render a usage summary as a plain-text report."""
+    totals = summary["totals"]
+    total_tokens = totals["input_tokens"] + totals["output_tokens"]
+    requests = max(1, summary["requests"])
+    lines = [
+        f"Requests: {summary['requests']}, LLM calls: {totals['calls']}",
+        f"Tokens: {totals['input_tokens']} input ({totals['cache_read_tokens']} cache read, "
+        f"{totals['cache_write_tokens']} cache write), {totals['output_tokens']} output",
+        f"Cost: ${totals['cost_usd']:.4f} total, ${totals['cost_usd'] / requests:.5f} per request"
+        + (f" ({summary['unpriced_calls']} calls of unknown models not priced)" if summary["unpriced_calls"] else ""),
+        "",
+        "By component:",
+    ]
+    for component in COMPONENTS:
+        tokens = summary["components"][component]
+        share = tokens / total_tokens if total_tokens else 0.0
+        lines.append(f"  {component:<14}{tokens:>10}  {share:6.1%}")
+    for title, key in (("By phase:", "by_phase"), ("By API key:", "by_key"), ("By model:", "by_model")):
+        lines += ["", title]
+        for name, group in sorted(summary[key].items()):
+            lines.append(
+                f"  {name:<32}{group['calls']:>6} calls{group['input_tokens']:>10} in"
+                f"{group['output_tokens']:>9} out  ${group['cost_usd']:.4f}"
+            )
+    return "\n".join(lines)
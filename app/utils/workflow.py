@@ -2,29 +2,37 @@
 LangGraph workflow for coordinating extraction.
 """
 import os
-from typing import Dict, List, Any, TypedDict, Annotated, Callable
-import operator
+import logging
+from typing import Dict, List, Any, TypedDict, Callable
 from pydantic import BaseModel
 
 from langchain_anthropic import ChatAnthropic
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableLambda
 
 from langgraph.graph import StateGraph, END, START
 import langgraph.prebuilt as prebuilt
 
 # Import the combined node instead of individual nodes
-from app.nodes.fixed_node import extract_shipment_booking
+from app.nodes.fixed_node import extract_shipment_booking, reextract_sections
+from app.nodes.chunked_node import extract_shipment_booking_chunked, needs_chunking
+from app.utils.email_preprocessing import preprocess_email
+from app.utils.gazetteer import check_booking
+from app.utils.plausibility import check_batch, count_issues
+from app.utils.usage import combine_usage
 
 # Import the combined schema
 from app.schemas.shipment_booking_schema import ShipmentBooking
 
-# Helper function to merge dictionaries
-def merge_dicts(dict1: Dict[str, Any], dict2: Dict[str, Any]) -> Dict[str, Any]:
-    """Merges two dictionaries by adding values from dict2 to dict1."""
-    result = dict1.copy()
-    result.update(dict2)
-    return result
+logger = logging.getLogger(__name__)
+
+# Unplausible Ergebnisse gezielt nachextrahieren (PLAUSIBILITY_RECHECK=0 schaltet das ab)
+PLAUSIBILITY_RECHECK = os.environ.get("PLAUSIBILITY_RECHECK", "1") != "0"
+
+# "graph": Knoten als LangGraph-StateGraph; "direct": dieselben Knoten in einfachem Python
+EXTRACTION_MODES = ("graph", "direct")
+EXTRACTION_MODE = os.environ.get("EXTRACTION_MODE", "graph")
 
 
 # Define the workflow state
@@ -33,54 +41,173 @@ class WorkflowState(TypedDict):
     # Input text to process
     input: str
     
-    # Extraction results for different components
-    pickup_address: Annotated[Dict[str, Any], merge_dicts]
-    delivery_address: Annotated[Dict[str, Any], merge_dicts]
-    billing_address: Annotated[Dict[str, Any], merge_dicts]
-    shipment: Annotated[Dict[str, Any], merge_dicts]
+    # Token reduction report of the preprocessing step
+    preprocessing: Dict[str, Any]
+    
+    # Token and cost accounting of the extraction (see app/utils/usage.py)
+    usage: Dict[str, Any]
+    
+    # Sections whose address was taken from the address book (see app/utils/address_book.py)
+    known_addresses: List[str]
+    
+    # Postal code / city / country issues per address (see app/utils/gazetteer.py)
+    address_checks: Dict[str, List[str]]
     
-    # Final combined result
-    result: Dict[str, Any]
+    # Plausibility issues per section, before ("issues") and after ("remaining") re-extraction
+    plausibility: Dict[str, Any]
+    
+    # Validated ShipmentBooking, set by the extraction node and passed on by
+    # reference - serialize it once at the edge (app/utils/serialization.py)
+    result: ShipmentBooking
+
+
+def preprocess_input(state):
+    """Strip HTML, quoted replies, signatures and boilerplate from the input."""
+    text, report = preprocess_email(state["input"])
+    logger.info(
+        f"Vorverarbeitung: {report['tokens_removed']} von {report['tokens_before']} Tokens entfernt "
+        f"({report['removed']})"
+    )
+    return {"input": text, "preprocessing": report}
 
 
 def combine_results(state):
-    """Combine all extraction results into a single structure."""
-    # Create the final booking
-    booking = {
-        "pickup_address": state.get("pickup_address", {}),
-        "delivery_address": state.get("delivery_address", {}),
-        "billing_address": state.get("billing_address", {}),
-        "shipment": state.get("shipment", {"items": []}),
-    }
+    """Check the addresses of the extracted booking and hand it on as the final result."""
+    # Stadt/Land aus der Postleitzahl ergänzen (als Kopie) und Widersprüche markieren
+    booking, address_checks = check_booking(state["result"])
+    if address_checks:
+        logger.info(f"Adressprüfung: {address_checks}")
     
     # Return the result
-    return {"result": booking}
+    return {"result": booking, "address_checks": address_checks}
+
+
+def check_plausibility(state, config):
+    """
+    Re-extract the sections of the result that fail the plausibility checks.
+
+    The re-extraction replaces the result only if it has fewer issues; inputs
+    long enough for the chunked extraction are only flagged.
+    """
+    issues = check_batch([state["input"]], [state["result"]])[0]
+    if not issues:
+        return {"plausibility": {"issues": {}, "remaining": {}}}
+    logger.info(f"Plausibilitätsprüfung: {issues}")
+    if needs_chunking(state["input"]):
+        # Die Nachextraktion sendet den ganzen Text in einem Aufruf; lange Texte nur markieren
+        return {"plausibility": {"issues": issues, "remaining": issues}}
+    corrected = reextract_sections(state["input"], state["result"], issues, config)
+    remaining = check_batch([state["input"]], [corrected["result"]])[0]
+    usage = combine_usage([state.get("usage"), corrected["usage"]])
+    # Nachextraktion gehört zur selben Anfrage
+    usage["requests"] = state["usage"]["requests"] if state.get("usage") else 1
+    if count_issues(remaining) >= count_issues(issues):
+        # Nachextraktion nicht besser: ursprüngliches Ergebnis behalten
+        logger.info(f"Nachextraktion verworfen, weiterhin: {remaining}")
+        return {"usage": usage, "plausibility": {"issues": issues, "remaining": issues}}
+    return {
+        "result": corrected["result"],
+        "usage": usage,
+        "plausibility": {"issues": issues, "remaining": remaining},
+    }
+
+
+def route_extraction(state):
+    """Route long inputs to the chunked map-reduce extraction."""
+    if needs_chunking(state["input"]):
+        return "extract_shipment_booking_chunked"
+    return "extract_shipment_booking"
 
 
 def build_shipment_graph():
     """
     Build workflow with a single unified node for entity extraction.
     
+    Long inputs are routed to a chunked map-reduce variant of the node.
+    
     Returns:
         StateGraph: A compiled LangGraph workflow.
     """
     # Initialize the workflow graph
     graph = StateGraph(WorkflowState)
     
+    # Add the preprocessing node (token reduction for emails)
+    graph.add_node("preprocess_input", preprocess_input)
+    
     # Add the combined extraction node
     graph.add_node("extract_shipment_booking", extract_shipment_booking)
     
+    # Add the chunked extraction node for long inputs
+    graph.add_node("extract_shipment_booking_chunked", extract_shipment_booking_chunked)
+    
     # Add node for final result combination
     graph.add_node("combine_results", combine_results)
     
-    # Connect the extraction node to the start
-    graph.add_edge(START, "extract_shipment_booking")
+    # Preprocess first, then route to the single or the chunked extraction
+    graph.add_edge(START, "preprocess_input")
+    graph.add_conditional_edges(
+        "preprocess_input",
+        route_extraction,
+        ["extract_shipment_booking", "extract_shipment_booking_chunked"],
+    )
     
-    # Connect the extraction node to the combine_results node
+    # Connect the extraction nodes to the combine_results node
     graph.add_edge("extract_shipment_booking", "combine_results")
+    graph.add_edge("extract_shipment_booking_chunked", "combine_results")
     
-    # Final node connects to END
-    graph.add_edge("combine_results", END)
+    # Optional plausibility check with targeted re-extraction, then END
+    if PLAUSIBILITY_RECHECK:
+        graph.add_node("check_plausibility", check_plausibility)
+        graph.add_edge("combine_results", "check_plausibility")
+        graph.add_edge("check_plausibility", END)
+    else:
+        graph.add_edge("combine_results", END)
     
     # Compile the graph
     return graph.compile()
+
+
+def run_shipment_extraction(state, config=None):
+    """
+    Run the workflow nodes in plain Python, without the outer StateGraph (direct mode).
+    
+    Same nodes in the same order as `build_shipment_graph`, so the final state
+    (and its "result") is identical; only the graph's scheduling, channel and
+    reducer overhead is skipped.
+    
+    Args:
+        state (dict): Initial state with the "input" text
+        config (RunnableConfig, optional): Config of the request (callbacks etc.)
+    
+    Returns:
+        dict: The final workflow state
+    """
+    state = dict(state)
+    state.update(preprocess_input(state))
+    if route_extraction(state) == "extract_shipment_booking_chunked":
+        state.update(extract_shipment_booking_chunked(state, config))
+    else:
+        state.update(extract_shipment_booking(state, config))
+    state.update(combine_results(state))
+    if PLAUSIBILITY_RECHECK:
+        state.update(check_plausibility(state, config))
+    return state
+
+
+def build_shipment_runnable(mode=None):
+    """
+    Build the extraction workflow in the given execution mode.
+    
+    Args:
+        mode (str, optional): "graph" (LangGraph) or "direct" (plain Python);
+            default `EXTRACTION_MODE` from the environment
+    
+    Returns:
+        Runnable: Invoke with {"input": text}; returns the final workflow state
+    """
+    mode = mode or EXTRACTION_MODE
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode '{mode}', expected one of {EXTRACTION_MODES}")
+    if mode == "direct":
+        return RunnableLambda(run_shipment_extraction, name="shipment_extraction")
+    return build_shipment_graph()
@@ -0,0 +1,47 @@
+"""
+Shared helpers for the offline benchmarks.
+
+Run the benchmarks from the project root, e.g.::
+
+    python benchmarks/bench_message_store.py
+"""
+import os
+import sys
+import time
+
+# Projektverzeichnis zum Python-Pfad hinzufügen, damit `app` und `notes` importierbar sind
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+
+def timeit(fn, repeat=5, number=1):
+    """
+    Return the best wall-clock time of `repeat` runs of `number` calls to `fn`.
+
+    Args:
+        fn (callable): Zero-argument callable to time
+        repeat (int): Number of timing runs
+        number (int): Calls per run
+
+    Returns:
+        float: Best time per call in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def print_table(headers, rows):
+    """Print rows as a fixed-width table."""
+    widths = [
+        max(len(str(h)), *(len(str(r[i])) for r in rows)) if rows else len(str(h))
+        for i, h in enumerate(headers)
+    ]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(c).rjust(w) for c, w in zip(row, widths)))
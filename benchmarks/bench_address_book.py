@@ -0,0 +1,103 @@
+"""
+Address-book matching cost and the saving of skipping known addresses.
+
+Fills an in-memory address book with synthetic customers plus the three
+addresses of the sample booking, measures `match_sections` on the booking
+text, then runs the graph once with an empty and once with the filled book.
+The fake model adds 15 ms per output token on top of 0.4 s to first token.
+"""
+import os
+import random
+import statistics
+import time
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table, timeit
+
+# Must be set before app modules create their LLMs at import time
+os.environ.update({
+    "FAKE_LLM": "1",
+    # Die Fake-Antworten ignorieren den Text und würden die Plausibilitätsprüfung auslösen
+    "PLAUSIBILITY_RECHECK": "0",
+    "FAKE_LLM_LATENCY": "fixed",
+    "FAKE_LLM_LATENCY_MEDIAN": "0.4",
+    "FAKE_LLM_OUTPUT_TOKEN_LATENCY": "0.015",
+    "FAKE_LLM_SEED": "7",
+})
+
+import app.utils.address_book as address_book  # noqa: E402
+from app.nodes import fixed_node  # noqa: E402
+from app.utils.address_book import AddressBook  # noqa: E402
+from app.utils.workflow import build_shipment_graph  # noqa: E402
+
+BOOK_SIZES = (100, 10_000, 50_000)
+RUNS = 5
+TEXT = """Abholung bei Technik GmbH (Thomas Müller, Industriestraße 42, 33602 Bielefeld) am 03.03.2025 zwischen 7 und 9 Uhr.
+Lieferung an Logistik AG, Hauptstr. 123, 70173 Stuttgart, am 04.03.2025.
+4 Paletten Maschinenteile, nicht stapelbar, je 100 kg, 120x80x100 cm
+Rechnung an Finanz GmbH, Rechnungsweg 7, 10115 Berlin, USt-IdNr. DE123456789"""
+KNOWN = [
+    ({"company": "Technik GmbH", "street": "Industriestr. 42", "postal_code": "33602", "city": "Bielefeld", "country": "DE"}, "pickup_address"),
+    ({"company": "Logistik AG", "street": "Hauptstraße 123", "postal_code": "70173", "city": "Stuttgart", "country": "DE"}, "delivery_address"),
+    ({"company": "Finanz GmbH", "street": "Rechnungsweg 7", "postal_code": "10115", "city": "Berlin", "country": "DE"}, "billing_address"),
+]
+PREFIXES = ["Nord", "Süd", "West", "Ost", "Rhein", "Alpen", "Hanse", "Main", "Spree", "Elbe", "Donau", "Weser"]
+TRADES = ["Logistik", "Technik", "Metall", "Holz", "Bau", "Food", "Pharma", "Textil", "Handel", "Papier"]
+FORMS = ["GmbH", "AG", "KG", "GmbH & Co. KG", "e.K."]
+STREETS = ["Hauptstraße", "Industriestr.", "Am Hafen", "Gewerbering", "Bahnhofstraße", "Lindenweg", "Ringstraße"]
+
+
+def fill(book, size, rng):
+    for i in range(size):
+        address = {
+            "company": f"{rng.choice(PREFIXES)}{rng.choice(TRADES).lower()} {rng.choice(TRADES)} {i} {rng.choice(FORMS)}",
+            "street": f"{rng.choice(STREETS)} {rng.randint(1, 200)}",
+            "postal_code": f"{rng.randint(1067, 99998):05d}",
+            "city": "Musterstadt",
+            "country": "DE",
+        }
+        book.learn(address, rng.choice(address_book.SECTIONS))
+    for address, role in KNOWN:
+        book.learn(address, role)
+
+
+def run_graph(graph):
+    latencies = []
+    for i in range(RUNS):
+        start = time.perf_counter()
+        state = graph.invoke({"input": f"{TEXT}\nRef {i}"})
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies), state
+
+
+def main():
+    rng = random.Random(3)
+    rows = []
+    for size in BOOK_SIZES:
+        book = AddressBook(":memory:")
+        start = time.perf_counter()
+        fill(book, size, rng)
+        fill_seconds = time.perf_counter() - start
+        seconds = timeit(lambda: book.match_sections(TEXT), repeat=5, number=20)
+        rows.append((size, f"{fill_seconds:.2f}", f"{seconds * 1000:.2f}", ", ".join(sorted(book.match_sections(TEXT)))))
+    print("Matching the booking text against the address book")
+    print_table(("addresses", "learn s", "match ms", "sections found"), rows)
+
+    graph = build_shipment_graph()
+    rows = []
+    for name, book in (("empty address book", AddressBook(":memory:")), ("3 known addresses", None)):
+        if book is None:
+            book = AddressBook(":memory:")
+            fill(book, 0, rng)
+        address_book._book = book
+        # Gleiche Antworten des Fake-Modells für beide Varianten
+        fixed_node.base_llm._rng.seed(7)
+        latency, state = run_graph(graph)
+        totals = state["usage"]["totals"]
+        rows.append((name, f"{latency:.2f}", totals["input_tokens"], totals["output_tokens"], f"{totals['cost_usd']:.4f}"))
+    print("\nExtraction (fake model: 0.4 s to first token + 15 ms per output token)")
+    print_table(("variant", "median s", "input tokens", "output tokens", "cost $"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Memory per booking of the compact result store compared with dicts and models.
+
+Synthetic results are decoded from JSON one by one (like reading a results
+file or collecting API responses), so every booking has its own string
+objects as in production. Memory is measured with tracemalloc as the growth
+while holding the whole set.
+"""
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table
+
+from app.schemas.shipment_booking_schema import ShipmentBooking
+from app.utils.compact import CompactBookings
+
+BOOKINGS = 20_000
+CITIES = [("33602", "Bielefeld"), ("70173", "Stuttgart"), ("10115", "Berlin"), ("20095", "Hamburg"), ("80331", "München")]
+GOODS = ["Maschinenteile", "Getränke", "Papier", "Ersatzteile", "Elektronik", "Möbel"]
+
+
+def records(count):
+    rng = random.Random(5)
+    for i in range(count):
+        def address(**extra):
+            postal_code, city = rng.choice(CITIES)
+            return {"company": f"Kunde {rng.randint(1, 2000)} GmbH", "street": f"Hauptstraße {rng.randint(1, 200)}",
+                    "postal_code": postal_code, "city": city, "country": "DE", "phone": None, "email": None, **extra}
+        booking = {
+            "pickup_address": address(pickup_date="03.03.2025", pickup_time_from="07:00", pickup_time_to="09:00"),
+            "delivery_address": address(delivery_date="04.03.2025"),
+            "billing_address": address(vat_id="DE123456789"),
+            "shipment": {
+                "items": [
+                    {"load_carrier": 1, "name": rng.choice(GOODS), "quantity": rng.randint(1, 33),
+                     "length": 120, "width": 80, "height": rng.randint(50, 180), "weight": rng.randint(50, 900),
+                     "stackable": rng.random() < 0.5}
+                    for _ in range(rng.randint(1, 4))
+                ],
+                "shipment_notes": None,
+            },
+        }
+        yield json.dumps(booking, ensure_ascii=False)
+
+
+def as_dicts(lines):
+    return [ShipmentBooking.model_validate_json(line).model_dump() for line in lines]
+
+
+def as_models(lines):
+    return [ShipmentBooking.model_validate_json(line) for line in lines]
+
+
+def as_compact(lines):
+    return CompactBookings.from_bookings(ShipmentBooking.model_validate_json(line) for line in lines)
+
+
+def measure(build, lines):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    held = build(lines)
+    seconds = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return held, size, seconds
+
+
+def main():
+    lines = list(records(BOOKINGS))
+    rows = []
+    for name, build in (("model_dump() dicts", as_dicts), ("ShipmentBooking models", as_models), ("CompactBookings", as_compact)):
+        held, size, seconds = measure(build, lines)
+        rows.append((name, f"{size / BOOKINGS:,.0f}", f"{size / 1e6:.1f}", f"{seconds:.1f}"))
+        if isinstance(held, CompactBookings):
+            compact = held
+        del held
+    print(f"{BOOKINGS} bookings held in memory (times include tracemalloc overhead)")
+    print_table(("representation", "bytes per booking", "MB total", "build s"), rows)
+
+    start = time.perf_counter()
+    restored = [compact.to_dict(i) for i in range(len(compact))]
+    seconds = time.perf_counter() - start
+    lossless = all(restored[i] == ShipmentBooking.model_validate_json(lines[i]).model_dump() for i in range(0, BOOKINGS, 97))
+    print(f"\nto_dict for all bookings: {seconds:.2f} s, round trip lossless: {lossless}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Overhead of the outer LangGraph compared with the direct execution mode.
+
+Runs the same requests through `build_shipment_runnable("graph")` and
+`build_shipment_runnable("direct")` against the fake model with zero latency,
+so the difference is the outer graph's scheduling, channel and reducer cost.
+Each mode is run sequentially (latency per request) and from a thread pool
+(throughput at high request rates); the results of both modes are compared
+for equality.
+"""
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table
+
+# Must be set before app modules create their LLMs at import time
+os.environ.update({
+    "FAKE_LLM": "1",
+    "FAKE_LLM_LATENCY": "fixed",
+    "FAKE_LLM_LATENCY_MEDIAN": "0",
+    "FAKE_LLM_SEED": "7",
+    # Die Fake-Antworten ignorieren den Text und würden die Plausibilitätsprüfung auslösen
+    "PLAUSIBILITY_RECHECK": "0",
+})
+
+from app.nodes import fixed_node  # noqa: E402
+from app.utils.workflow import build_shipment_runnable  # noqa: E402
+
+SEQUENTIAL = 200
+CONCURRENT = 2_000
+WORKERS = 16
+TEXT = """Bitte holen Sie bei Technik GmbH (Industriestraße 42, 33602 Bielefeld) am 03.03.2025 ab.
+Lieferung an Logistik AG, Hauptstr. 123, 70173 Stuttgart, am 04.03.2025.
+4 Paletten Maschinenteile, nicht stapelbar, je 100 kg, 120x80x100 cm"""
+
+
+def sequential(runnable):
+    latencies = []
+    for i in range(SEQUENTIAL):
+        start = time.perf_counter()
+        runnable.invoke({"input": f"{TEXT}\nRef {i}"})
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies)
+
+
+def concurrent(runnable):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(WORKERS) as executor:
+        list(executor.map(lambda i: runnable.invoke({"input": f"{TEXT}\nRef {i}"}), range(CONCURRENT)))
+    return CONCURRENT / (time.perf_counter() - start)
+
+
+def main():
+    runnables = {mode: build_shipment_runnable(mode) for mode in ("graph", "direct")}
+    states = {}
+    for mode, runnable in runnables.items():
+        fixed_node.base_llm._rng.seed(7)
+        states[mode] = runnable.invoke({"input": TEXT})
+    print(f"Identical results: {states['graph']['result'] == states['direct']['result']}, "
+          f"identical state keys: {sorted(states['graph']) == sorted(states['direct'])}")
+
+    rows = []
+    for mode, runnable in runnables.items():
+        runnable.invoke({"input": TEXT})  # warm-up
+        latency = sequential(runnable)
+        throughput = concurrent(runnable)
+        rows.append((mode, f"{latency * 1000:.2f}", f"{throughput:.0f}"))
+    print(f"\nFake model without latency; {WORKERS} threads for throughput")
+    print_table(("mode", "median ms per request", "requests/s"), rows)
+
+
+if __name__ == "__main__":
+    main()
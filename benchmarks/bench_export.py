@@ -0,0 +1,92 @@
+"""
+Throughput and peak memory of the streaming result export.
+
+Exports synthetic bookings (as the workflow returns them) from a generator
+and compares with the naive approach of collecting one dict per row and
+writing the tables at the end. Peak memory is measured with tracemalloc, so
+absolute times are inflated; compare the variants with each other.
+"""
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table
+
+from app.utils.export import ADDRESS_COLUMNS, ITEM_COLUMNS, ROLES, export_bookings
+
+BOOKINGS = 30_000
+
+
+def bookings(count):
+    rng = random.Random(5)
+    for i in range(count):
+        address = {"company": f"Firma {i}", "street": f"Hauptstraße {i % 200}", "postal_code": f"{10000 + i % 89999}",
+                   "city": "Musterstadt", "country": "DE", "phone": None, "email": None}
+        yield f"B{i:07d}", {
+            "pickup_address": {**address, "pickup_date": "03.03.2025", "pickup_time_from": "07:00"},
+            "delivery_address": {**address, "delivery_date": "04.03.2025"},
+            "billing_address": {**address, "vat_id": "DE123456789"},
+            "shipment": {
+                "items": [
+                    {"load_carrier": 1, "name": "Maschinenteile", "quantity": rng.randint(1, 33),
+                     "length": 120, "width": 80, "height": 100, "weight": 100, "stackable": False}
+                    for _ in range(rng.randint(1, 4))
+                ],
+                "shipment_notes": None,
+            },
+        }
+
+
+def naive_export(prefix, fmt):
+    """Collect all rows as dicts, then write both tables."""
+    addresses, items = [], []
+    for booking_id, booking in bookings(BOOKINGS):
+        for role in ROLES:
+            addresses.append({"booking_id": booking_id, "role": role, **booking[role]})
+        for position, item in enumerate(booking["shipment"]["items"], start=1):
+            items.append({"booking_id": booking_id, "position": position, **item,
+                          "shipment_notes": booking["shipment"]["shipment_notes"]})
+    for rows, columns, name in ((addresses, ADDRESS_COLUMNS, "addresses"), (items, ITEM_COLUMNS, "items")):
+        with open(f"{prefix}_{name}.{fmt}", "w", encoding="utf-8", newline="") as f:
+            if fmt == "csv":
+                writer = csv.DictWriter(f, [c for c, _ in columns])
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                f.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+    return {"addresses": len(addresses), "items": len(items)}
+
+
+def measure(fn):
+    start = time.perf_counter()
+    counts = fn()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, counts
+
+
+def main():
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in ("jsonl", "csv"):
+            seconds, peak, counts = measure(lambda: naive_export(os.path.join(tmp, f"naive_{fmt}"), fmt))
+            rows.append((f"collect dicts, {fmt}", f"{seconds:.1f}", f"{peak / 1e6:.1f}", counts["addresses"] + counts["items"]))
+        for fmt in ("jsonl", "csv", "parquet"):
+            prefix = os.path.join(tmp, f"stream_{fmt}")
+            seconds, peak, counts = measure(lambda: export_bookings(bookings(BOOKINGS), prefix, fmt))
+            size = sum(os.path.getsize(f"{prefix}_{t}.{fmt}") for t in ("addresses", "items"))
+            rows.append((f"streaming, {fmt} ({size / 1e6:.0f} MB)", f"{seconds:.1f}", f"{peak / 1e6:.1f}", counts["addresses"] + counts["items"]))
+    print(f"Export of {BOOKINGS} bookings")
+    print_table(("variant", "seconds", "peak MB", "rows"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Offline framework-overhead benchmark for the vendored TrustCall graph.
+
+Runs `notes._base.create_extractor` against a scripted chat model that answers
+instantly, so every millisecond measured is framework overhead (graph
+scheduling, reducers, validation, patch fan-out) rather than LLM latency.
+
+Also compares the validation node with the per-call executor and
+`model_validate` implementation it replaced.
+"""
+import itertools
+import json
+from typing import Any, List, Optional
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table, timeit
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables.config import get_executor_for_config
+
+import notes._base as trustcall_base
+from app.schemas.shipment_booking_schema import ShipmentBooking
+
+ITEMS_PER_BOOKING = 12
+
+
+def _booking_args(valid=True):
+    items = [
+        {"load_carrier": 1, "name": f"Luftreiniger {i}", "quantity": 34 if valid or i else "viele",
+         "length": 120, "width": 80, "height": 120, "weight": 150, "stackable": True}
+        for i in range(ITEMS_PER_BOOKING)
+    ]
+    return {
+        "pickup_address": {"company": "Technik GmbH", "postal_code": "33602", "city": "Bielefeld"},
+        "delivery_address": {"company": "Logistik AG", "postal_code": "70173", "city": "Stuttgart"},
+        "billing_address": {"company": "Finanz GmbH", "vat_id": "DE123456789"},
+        "shipment": {"items": items},
+    }
+
+
+def _tool_call_message(tool_calls):
+    """AIMessage in OpenAI format: parsed args plus the raw JSON arguments."""
+    return AIMessage(
+        content="",
+        tool_calls=tool_calls,
+        additional_kwargs={"tool_calls": [
+            {"id": tc["id"], "type": "function",
+             "function": {"name": tc["name"], "arguments": json.dumps(tc["args"])}}
+            for tc in tool_calls
+        ]},
+    )
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Answers instantly with `n_calls` booking tool calls and fixes them on request."""
+
+    n_calls: int = 1
+    invalid_calls: int = 0
+    ids: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        return self.bind(tools=tools, tool_choice=tool_choice)
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs) -> ChatResult:
+        ids = self.ids if self.ids is not None else itertools.count()
+        object.__setattr__(self, "ids", ids)
+        names = [t["function"]["name"] if isinstance(t, dict) else t.__name__ for t in tools or []]
+        if "PatchFunctionErrors" in names:
+            target = [m for m in messages if isinstance(m, ToolMessage)][-1].tool_call_id
+            tool_calls = [{
+                "id": f"patch_{next(ids)}", "name": "PatchFunctionErrors",
+                "args": {"json_doc_id": target, "planned_edits": "quantity must be int",
+                         "patches": [{"op": "replace", "path": "/shipment/items/0/quantity", "value": 34}]},
+            }]
+        else:
+            tool_calls = [
+                {"id": f"call_{next(ids)}", "name": "ShipmentBooking",
+                 "args": _booking_args(valid=c >= self.invalid_calls)}
+                for c in range(self.n_calls)
+            ]
+        return ChatResult(generations=[ChatGeneration(message=_tool_call_message(tool_calls))])
+
+
+class LegacyValidationNode(trustcall_base._ExtendedValidationNode):
+    """Validation as it was before: executor per call, model_validate on dicts."""
+
+    def _func(self, input, config):
+        output_type, message = self._get_message({"messages": input.messages})
+
+        def run_one(call):
+            try:
+                schema = self.schemas_by_name[call["name"]]
+                output = schema.model_validate(call["args"])
+                return ToolMessage(content=output.model_dump_json(), name=call["name"], tool_call_id=call["id"])
+            except Exception as e:
+                return ToolMessage(content=self._format_error(e, call, schema), name=call["name"],
+                                   tool_call_id=call["id"], status="error")
+
+        with get_executor_for_config(config) as executor:
+            outputs = [*executor.map(run_one, message.tool_calls)]
+        return outputs if output_type == "list" else {"messages": outputs}
+
+
+def make_extractor(n_calls, invalid_calls, legacy=False):
+    current = trustcall_base._ExtendedValidationNode
+    if legacy:
+        trustcall_base._ExtendedValidationNode = LegacyValidationNode
+    try:
+        llm = ScriptedChatModel(n_calls=n_calls, invalid_calls=invalid_calls)
+        return trustcall_base.create_extractor(
+            llm,
+            tools=[ShipmentBooking],
+            tool_choice="ShipmentBooking" if n_calls == 1 else "any",
+        )
+    finally:
+        trustcall_base._ExtendedValidationNode = current
+
+
+SCENARIOS = [
+    ("1 call, valid", 1, 0),
+    ("1 call, 1 patch", 1, 1),
+    ("6 calls, valid", 6, 0),
+    ("6 calls, 3 patches", 6, 3),
+]
+
+
+def bench_validation_node():
+    rows = []
+    for n_calls in (1, 6):
+        tool_calls = [{"id": f"c{i}", "name": "ShipmentBooking", "args": _booking_args()} for i in range(n_calls)]
+        state = trustcall_base.ExtractionState(messages=[_tool_call_message(tool_calls)])
+        tools = [ShipmentBooking, trustcall_base.PatchDoc, trustcall_base.PatchFunctionErrors]
+        legacy = LegacyValidationNode(tools)
+        current = trustcall_base._ExtendedValidationNode(tools)
+        config = {"configurable": {}}
+        legacy_t = timeit(lambda: legacy._func(state, config), repeat=7, number=50)
+        current_t = timeit(lambda: current._func(state, config), repeat=7, number=50)
+        rows.append((n_calls, f"{legacy_t * 1e6:.0f}", f"{current_t * 1e6:.0f}", f"{legacy_t / current_t:.1f}x"))
+    print("Validation node")
+    print_table(("tool calls", "legacy us", "current us", "speedup"), rows)
+
+
+def bench_end_to_end(number=30):
+    rows = []
+    config = {"configurable": {"max_attempts": 3}}
+    for name, n_calls, invalid in SCENARIOS:
+        times = []
+        for legacy in (True, False):
+            extractor = make_extractor(n_calls, invalid, legacy=legacy)
+            result = extractor.invoke("Bitte Transport buchen", config=config)
+            assert len(result["responses"]) == n_calls, result
+            times.append(timeit(lambda: extractor.invoke("Bitte Transport buchen", config=config), repeat=3, number=number))
+        rows.append((name, f"{times[0] * 1e3:.2f}", f"{times[1] * 1e3:.2f}", f"{times[0] / times[1]:.2f}x"))
+    print("End-to-end extractor overhead per request (instant model)")
+    print_table(("scenario", "legacy ms", "current ms", "speedup"), rows)
+
+
+def main():
+    bench_validation_node()
+    print()
+    bench_end_to_end()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Re-pricing a batch of historical bookings: NumPy columns vs. a Python loop.
+
+Computes volume, loading meters and chargeable weight for synthetic bookings
+with 1-4 items each, once from column arrays (as read from an exported item
+table), once from booking dicts, and with a straightforward per-item loop.
+"""
+import math
+import random
+import time
+
+import numpy as np
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table
+
+from app.utils.freight import DEFAULT_PARAMETERS, compute_item_metrics, freight_metrics
+
+BOOKINGS = 300_000
+GOODS = [(120, 80, 100, 100, False), (120, 80, 160, 510, True), (60, 40, 30, 15, True), (124, 84, 97, 250, False)]
+
+
+def make_bookings(count):
+    rng = random.Random(11)
+    bookings = []
+    for _ in range(count):
+        items = []
+        for _ in range(rng.randint(1, 4)):
+            length, width, height, weight, stackable = rng.choice(GOODS)
+            items.append({"quantity": rng.randint(1, 33), "length": length, "width": width, "height": height,
+                          "weight": weight, "stackable": stackable})
+        bookings.append({"shipment": {"items": items}})
+    return bookings
+
+
+def python_loop(bookings, params=DEFAULT_PARAMETERS):
+    totals = []
+    for booking in bookings:
+        volume = ldm = actual = 0.0
+        for item in booking["shipment"]["items"]:
+            quantity = item["quantity"] or 1
+            volume += item["length"] * item["width"] * item["height"] * quantity
+            stack = min(params.max_stack, max(1, params.trailer_height_cm // item["height"])) if item["stackable"] else 1
+            ldm += math.ceil(quantity / stack) * item["length"] * item["width"] / (params.trailer_width_cm * 100)
+            actual += item["weight"] * quantity
+        totals.append(max(actual, volume / params.volume_divisor, ldm * params.ldm_weight))
+    return totals
+
+
+def to_columns(bookings):
+    index, columns = [], {name: [] for name in ("quantity", "length", "width", "height", "weight", "stackable")}
+    for i, booking in enumerate(bookings):
+        for item in booking["shipment"]["items"]:
+            index.append(i)
+            for name, values in columns.items():
+                values.append(item[name])
+    arrays = {name: np.array(values, dtype=bool if name == "stackable" else np.float64) for name, values in columns.items()}
+    return np.array(index), arrays
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    bookings = make_bookings(BOOKINGS)
+    index, columns = to_columns(bookings)
+    loop_seconds, expected = timed(lambda: python_loop(bookings))
+    dict_seconds, from_dicts = timed(lambda: freight_metrics(bookings))
+    column_seconds, from_columns = timed(lambda: compute_item_metrics(index, bookings=BOOKINGS, **columns))
+    assert np.allclose(from_dicts["bookings"]["chargeable_weight"], expected)
+    assert np.allclose(from_columns["bookings"]["chargeable_weight"], expected)
+
+    print(f"{BOOKINGS} bookings, {len(index)} items")
+    print_table(
+        ("variant", "seconds", "bookings/s"),
+        [
+            ("python loop over dicts", f"{loop_seconds:.2f}", f"{BOOKINGS / loop_seconds:,.0f}"),
+            ("freight_metrics(dicts)", f"{dict_seconds:.2f}", f"{BOOKINGS / dict_seconds:,.0f}"),
+            ("compute_item_metrics(columns)", f"{column_seconds:.3f}", f"{BOOKINGS / column_seconds:,.0f}"),
+        ],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Open time, lookup latency and size of the memory-mapped postal-code index.
+
+Builds a synthetic index about the size of a full DACH + Benelux + PL GeoNames
+dump and compares it with loading the same data into a dict from the TSV.
+"""
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table, timeit
+
+from app.utils.gazetteer import PostalIndex, build_index
+
+ENTRIES = 120_000
+LOOKUPS = 20_000
+HOT = 1_000  # distinct codes in the LRU benchmark (depots, regular customers)
+
+
+def write_tsv(path):
+    rng = random.Random(7)
+    keys = []
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(ENTRIES):
+            country = rng.choice(("DE", "DE", "DE", "AT", "CH", "PL"))
+            if country == "PL":
+                code = f"{rng.randrange(100):02d}-{rng.randrange(1000):03d}"
+            else:
+                code = f"{rng.randrange(10 ** (5 if country == 'DE' else 4)):0{5 if country == 'DE' else 4}d}"
+            f.write(f"{country}\t{code}\tOrt {i}" + "\t" * 9 + "\n")
+            keys.append((country, code))
+    return keys
+
+
+def load_dict(path):
+    cities = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.split("\t")
+            cities.setdefault((fields[0], fields[1]), []).append(fields[2])
+    return cities
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        tsv, idx = os.path.join(tmp, "codes.tsv"), os.path.join(tmp, "codes.idx")
+        keys = write_tsv(tsv)
+        start = time.perf_counter()
+        count = build_index([tsv], idx)
+        build_seconds = time.perf_counter() - start
+        sample = random.Random(1).sample(keys, LOOKUPS)
+
+        tracemalloc.start()
+        open_seconds = timeit(lambda: PostalIndex(idx), repeat=3)
+        index = PostalIndex(idx)
+        mmap_heap = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        dict_seconds = timeit(lambda: load_dict(tsv), repeat=3)
+        cities = load_dict(tsv)
+        dict_heap = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        def lookup_all(fn):
+            for country, code in sample:
+                fn(country, code)
+
+        raw = timeit(lambda: lookup_all(index._cities), repeat=3) / LOOKUPS
+        hot = sample[:HOT] * (LOOKUPS // HOT)
+        for country, code in hot:
+            index.cities(country, code)
+        cached = timeit(lambda: [index.cities(c, p) for c, p in hot], repeat=3) / LOOKUPS
+        in_dict = timeit(lambda: lookup_all(lambda c, p: cities.get((c, p))), repeat=3) / LOOKUPS
+
+        print(f"{count} postal codes, index built in {build_seconds:.2f}s, {os.path.getsize(idx) / 1e6:.1f} MB on disk")
+        print_table(
+            ("variant", "open ms", "private heap MB", "lookup ns"),
+            [
+                ("mmap index", f"{open_seconds * 1000:.1f}", f"{mmap_heap / 1e6:.2f}", f"{raw * 1e9:.0f}"),
+                (f"mmap index, {HOT} hot codes", "-", "-", f"{cached * 1e9:.0f}"),
+                ("dict from TSV", f"{dict_seconds * 1000:.1f}", f"{dict_heap / 1e6:.2f}", f"{in_dict * 1e9:.0f}"),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    main()
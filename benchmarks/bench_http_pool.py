@@ -0,0 +1,179 @@
+"""
+Connection-setup benchmark for the shared HTTP pool and the model registry.
+
+Starts a local HTTPS stand-in for the Anthropic Messages API (self-signed
+certificate created with the `openssl` CLI) and sends concurrent requests:
+
+- plain ChatAnthropic: every request builds a `ChatAnthropic` as before;
+  langchain-anthropic caches its HTTP client per base URL, timeout and proxy
+  with the SDK's default pool limits
+- pooled registry: `get_anthropic_llm` returns the registered model, whose
+  requests go through the shared keep-alive pool
+- pooled registry, async: the same model via `ainvoke`, in two successive
+  `asyncio.run` calls (one pool per event loop)
+
+The stand-in can delay each new connection to mimic the round trips of a
+real network (TCP + TLS handshake); requests themselves are answered at once.
+"""
+import asyncio
+import json
+import os
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table
+
+from langchain_anthropic import ChatAnthropic
+from langchain_anthropic._client_utils import _get_default_httpx_client
+
+from app.utils import model_setup
+from app.utils.http_pool import close_pools, pool_stats
+
+REQUESTS = 400
+WORKERS = 16
+CONNECT_DELAYS = (0.0, 0.02)  # simulated handshake round trips per new connection
+RESPONSE = json.dumps({
+    "id": "msg_1", "type": "message", "role": "assistant", "model": "claude-3-7-sonnet-20250219",
+    "content": [{"type": "text", "text": "ok"}],
+    "stop_reason": "end_turn", "stop_sequence": None,
+    "usage": {"input_tokens": 10, "output_tokens": 1},
+}).encode()
+
+
+class StandIn(ThreadingHTTPServer):
+    daemon_threads = True
+    connect_delay = 0.0
+    connections = 0
+
+    def __init__(self, address, handler, context):
+        super().__init__(address, handler)
+        self.context = context
+        self._count_lock = threading.Lock()
+
+    def finish_request(self, request, client_address):
+        # Handshake im Verbindungs-Thread, damit die simulierte Verzögerung den Accept-Loop nicht blockiert
+        with self._count_lock:
+            self.connections += 1
+        time.sleep(self.connect_delay)
+        try:
+            tls = self.context.wrap_socket(request, server_side=True)
+        except (ssl.SSLError, OSError):
+            return
+        super().finish_request(tls, client_address)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+
+def self_signed_cert(directory):
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+         "-addext", "subjectAltName=IP:127.0.0.1", "-keyout", key, "-out", cert],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+def run(make_llm):
+    def one(i):
+        llm = make_llm()
+        start = time.perf_counter()
+        llm.invoke(f"ping {i}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        latencies = sorted(executor.map(one, range(REQUESTS)))
+    return time.perf_counter() - start, latencies
+
+
+def run_async(make_llm, loops=2):
+    async def one(i, semaphore):
+        async with semaphore:
+            llm = make_llm()
+            start = time.perf_counter()
+            await llm.ainvoke(f"ping {i}")
+            return time.perf_counter() - start
+
+    async def batch(requests):
+        semaphore = asyncio.Semaphore(WORKERS)
+        return await asyncio.gather(*(one(i, semaphore) for i in range(requests)))
+
+    start = time.perf_counter()
+    latencies = []
+    for _ in range(loops):
+        # Jede asyncio.run-Runde hat eine eigene Event-Loop
+        latencies += asyncio.run(batch(REQUESTS // loops))
+    return time.perf_counter() - start, sorted(latencies)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        cert, key = self_signed_cert(tmp)
+        os.environ["SSL_CERT_FILE"] = cert  # the SDK clients trust the stand-in's certificate
+        os.environ.setdefault("ANTHROPIC_API_KEY_1", "sk-ant-standin")
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server = StandIn(("127.0.0.1", 0), Handler, context)
+        server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"https://127.0.0.1:{server.server_address[1]}"
+        params = {"fake": False, "hedge": False, "base_url": base_url, "max_retries": 0}
+
+        rows = []
+        try:
+            for delay in CONNECT_DELAYS:
+                server.connect_delay = delay
+                setups = [
+                    ("plain ChatAnthropic", run, lambda: ChatAnthropic(
+                        model="claude-3-7-sonnet-20250219", api_key="sk-ant-standin", base_url=base_url,
+                        max_retries=0, timeout=10)),
+                    ("pooled registry", run, lambda: model_setup.get_anthropic_llm(**params)),
+                    ("pooled registry, async", run_async, lambda: model_setup.get_anthropic_llm(**params)),
+                ]
+                for name, runner, make_llm in setups:
+                    close_pools()
+                    model_setup.clear_model_registry()
+                    # Auch den Client-Cache von langchain-anthropic leeren, jede Runde beginnt ohne Verbindungen
+                    _get_default_httpx_client.cache_clear()
+                    before = server.connections
+                    total, latencies = runner(make_llm)
+                    rows.append((
+                        f"{delay * 1e3:.0f} ms", name, server.connections - before,
+                        f"{total:.2f}", f"{REQUESTS / total:.0f}",
+                        f"{latencies[len(latencies) // 2] * 1e3:.1f}",
+                        f"{latencies[int(0.99 * (len(latencies) - 1))] * 1e3:.1f}",
+                    ))
+                    if name.startswith("pooled"):
+                        stats = next(iter(pool_stats().values()))
+                        print(f"pool stats ({name}, {delay * 1e3:.0f} ms connect delay): {stats}")
+        finally:
+            server.shutdown()
+            close_pools()
+
+    print(f"\nHTTPS stand-in: {REQUESTS} requests, {WORKERS} workers")
+    print_table(("connect delay", "setup", "connections", "total s", "req/s", "p50 ms", "p99 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Latency of incremental re-extraction against a full extraction.
+
+Simulates a user who extracts a booking and then corrects a few words. The
+fake model charges a fixed time to first token plus decoding time per output
+token (roughly Claude's generation speed), so the short PatchDoc answers of
+the update path show up as lower latency. A large edit takes the full path.
+"""
+import os
+import statistics
+import time
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table, timeit
+
+# Must be set before app modules create their LLMs at import time
+os.environ.update({
+    "FAKE_LLM": "1",
+    # Die Fake-Antworten ignorieren den Text und würden die Plausibilitätsprüfung auslösen
+    "PLAUSIBILITY_RECHECK": "0",
+    "FAKE_LLM_LATENCY": "fixed",
+    "FAKE_LLM_LATENCY_MEDIAN": "0.4",
+    "FAKE_LLM_OUTPUT_TOKEN_LATENCY": "0.015",
+    "FAKE_LLM_SEED": "7",
+})
+
+from app.nodes.fixed_node import update_shipment_booking  # noqa: E402
+from app.utils.incremental import changed_chars, is_small_edit  # noqa: E402
+from app.utils.workflow import build_shipment_graph  # noqa: E402
+
+RUNS = 5
+TEXT = """Bitte holen Sie bei Technik GmbH (Thomas Müller, Industriestr. 42, 33602 Bielefeld) am 03.03.2025 zwischen 7 und 9 Uhr ab.
+Lieferung an Logistik AG, Hauptstraße 123, 70173 Stuttgart, am 04.03.2025.
+4 Paletten Maschinenteile, nicht stapelbar, je 100 kg, 120x80x100 cm
+2 Pakete Elektronik, stapelbar, je 15 kg, 60x40x30 cm
+Rechnung an Finanz GmbH, Rechnungsweg 7, 10115 Berlin, USt-IdNr. DE123456789"""
+EDITS = [
+    ("quantity 4 -> 5", lambda t: t.replace("4 Paletten", "5 Paletten")),
+    ("new delivery date", lambda t: t.replace("am 04.03.2025", "am 05.03.2025")),
+    ("extra position", lambda t: t + "\n1 Gitterbox Ersatzteile, 250 kg, 124x84x97 cm"),
+    ("rewritten text", lambda t: "Neue Anfrage: 10 Paletten Getränke von Hamburg nach München, Abholung am 10.03.2025."),
+]
+
+
+def main():
+    graph = build_shipment_graph()
+    rows = []
+    full_latencies = []
+    for i in range(RUNS):
+        start = time.perf_counter()
+        state = graph.invoke({"input": f"{TEXT}\nRef {i}"})
+        full_latencies.append(time.perf_counter() - start)
+    full = statistics.median(full_latencies)
+    rows.append(("full extraction", "-", "full", f"{full:.2f}", state["usage"]["totals"]["output_tokens"], "1.0x"))
+
+    for name, edit in EDITS:
+        old = f"{TEXT}\nRef 0"
+        new = edit(old)
+        latencies, output_tokens = [], 0
+        small = is_small_edit(old, new)
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            if small:
+                result = update_shipment_booking(old, new, state["result"])
+            else:
+                result = graph.invoke({"input": new})
+            latencies.append(time.perf_counter() - start)
+            output_tokens = result["usage"]["totals"]["output_tokens"]
+        latency = statistics.median(latencies)
+        rows.append((
+            name, changed_chars(old, new), "update" if small else "full",
+            f"{latency:.2f}", output_tokens, f"{full / latency:.1f}x",
+        ))
+    print("Incremental re-extraction (fake model: 0.4 s to first token + 15 ms per output token)")
+    print_table(("edit", "changed chars", "path", "median s", "output tokens", "speedup"), rows)
+
+    # Kosten der Entscheidung selbst (läuft bei jedem Klick)
+    long_text = "\n".join(f"{TEXT}\nRef {i}" for i in range(50))
+    one_line = long_text.replace("\n", " ")
+    cases = [
+        ("5 kB rewrite", long_text[:5500], long_text[5500:11000]),
+        ("20 kB, one character", long_text[:20000], long_text[:10000] + "X" + long_text[10001:20000]),
+        ("20 kB one line, two edits", one_line[:20000], one_line[:8000] + "X" + one_line[8001:15000] + "YY" + one_line[15001:20000]),
+    ]
+    rows = [(name, f"{timeit(lambda: is_small_edit(old, new), repeat=3, number=5) * 1000:.1f}") for name, old, new in cases]
+    print()
+    print_table(("is_small_edit", "ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
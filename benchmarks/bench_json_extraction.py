@@ -0,0 +1,130 @@
+"""
+Benchmark for the tolerant JSON extractor on long LLM replies.
+
+Compares `app.utils.json_extraction` (objects) and the vendored
+`_ensure_patches` (patch lists) with the approaches they replaced: the mock
+extractor's `find('{')`/`rfind('}')` slice and the character-by-character
+bracket walk of the old `_ensure_patches`. Reports time per reply and whether
+the expected value was recovered; a truncated patch list must keep only its
+complete patches.
+"""
+import json
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table, timeit
+
+from app.utils import json_extraction
+from app.utils.json_extraction import extract_json, parse_patch_list
+from notes._base import _ensure_patches, set_patch_list_parser
+
+# Die vendorte TrustCall-Kopie mit dem Parser der App (ohne ihn importiert sie nur reines JSON)
+set_patch_list_parser(parse_patch_list)
+
+
+def legacy_find_rfind(text):
+    start, end = text.find("{"), text.rfind("}")
+    if start >= 0 and end >= 0:
+        return json.loads(text[start:end + 1])
+    return {}
+
+
+def legacy_bracket_walk(patches):
+    try:
+        parsed = json.loads(patches)
+        if isinstance(parsed, list):
+            return parsed
+    except Exception:
+        pass
+    bracket_depth = 0
+    first_list_str = None
+    start = patches.find("[")
+    if start != -1:
+        for i in range(start, len(patches)):
+            if patches[i] == "[":
+                bracket_depth += 1
+            elif patches[i] == "]":
+                bracket_depth -= 1
+                if bracket_depth == 0:
+                    first_list_str = patches[start:i + 1]
+                    break
+        if first_list_str:
+            try:
+                parsed = json.loads(first_list_str)
+                if isinstance(parsed, list):
+                    return parsed
+            except Exception:
+                pass
+    return []
+
+
+def _booking(n_items):
+    return {
+        "pickup_address": {"company": "Technik GmbH", "city": "Bielefeld", "postal_code": "33602"},
+        "delivery_address": {"company": "Logistik AG", "city": "Stuttgart", "postal_code": "70173"},
+        "shipment": {"items": [
+            {"load_carrier": 1, "name": f"Desinfektionsmittel {i}", "quantity": 49,
+             "length": 120, "width": 80, "height": 160, "weight": 665, "stackable": False}
+            for i in range(n_items)
+        ]},
+    }
+
+
+PROSE = "Sehr geehrte Damen und Herren, anbei die Daten zur Sendung wie besprochen. " * 40
+BOOKING = _booking(60)
+BOOKING_JSON = json.dumps(BOOKING, ensure_ascii=False, indent=2)
+PATCHES = [{"op": "replace", "path": f"/shipment/items/{i}/quantity", "value": i} for i in range(300)]
+PATCHES_JSON = json.dumps(PATCHES)
+
+REPLIES = {
+    "bare json": (BOOKING_JSON, dict, BOOKING),
+    "prose + json": (PROSE + "\n" + BOOKING_JSON + "\nViele Grüße", dict, BOOKING),
+    "braces in prose": (PROSE + " Format {Menge} x {Gewicht}.\n" + BOOKING_JSON + "\n{Ende}", dict, BOOKING),
+    "fenced + trailing comma": (PROSE + "\n```json\n" + BOOKING_JSON[:-2] + ",\n}\n```\nDanke {Team}", dict, BOOKING),
+    "truncated (max_tokens)": (PROSE + BOOKING_JSON[: len(BOOKING_JSON) * 3 // 4], dict, None),
+    "patch list + prose": ("Planned edits below. " * 30 + PATCHES_JSON + " Done.", list, PATCHES),
+    "truncated patch list": (PATCHES_JSON[:PATCHES_JSON.index(', {"op"', len(PATCHES_JSON) // 2) + 40], list, "prefix"),
+}
+
+
+def _quiet(fn, text):
+    try:
+        return fn(text)
+    except Exception:
+        return None
+
+
+def _check(fn, text, expected):
+    try:
+        value = fn(text)
+    except Exception:
+        return "error"
+    if expected is None:  # truncated: any partial booking counts
+        return "ok" if isinstance(value, dict) and value.get("shipment", {}).get("items") else "wrong"
+    if expected == "prefix":  # truncated patches: the complete ones, nothing half-written
+        return "ok" if value and value == PATCHES[:len(value)] and all(len(p) == 3 for p in value) else "wrong"
+    return "ok" if value == expected else "wrong"
+
+
+def main():
+    rows = []
+    for name, (text, expect, expected) in REPLIES.items():
+        legacy = legacy_bracket_walk if expect is list else legacy_find_rfind
+        if expect is list:
+            new = lambda t: _ensure_patches({"patches": t})
+        else:
+            new = lambda t, expect=expect: extract_json(t, expect=expect)
+        rows.append((
+            name,
+            f"{len(text) / 1024:.1f}",
+            f"{timeit(lambda: _quiet(legacy, text), number=20) * 1e6:.0f}",
+            _check(legacy, text, expected),
+            f"{timeit(lambda: new(text), number=20) * 1e6:.0f}",
+            _check(new, text, expected),
+        ))
+    fast_path = "orjson" if json_extraction.orjson is not None else "json"
+    print(f"JSON extraction from long LLM replies (fast path: {fast_path})")
+    print_table(("reply", "KiB", "legacy us", "legacy", "extractor us", "extractor"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Scaling benchmark for the trustcall message reducer.
+
+Compares the indexed `_MessageStore` reducer in `notes/_base.py` against the
+previous implementation (`add_messages` followed by a full list rewrite per
+message op) on synthetic histories of growing size. Each reducer call applies
+the op batch that a patch fan-in produces: one `update_tool_call` plus one
+`delete` per patched tool call and one `delete` per valid tool call.
+"""
+from typing import List, Sequence, cast
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table, timeit
+
+from langchain_core.messages import AIMessage, AnyMessage, ToolCall, ToolMessage
+from langgraph.graph.message import add_messages
+
+from notes._base import _MessageStore, _reduce_messages
+
+TOOL_CALLS_PER_MESSAGE = 4
+PATCHED_CALLS = 8
+
+
+def _legacy_apply_message_ops(messages: Sequence[AnyMessage], message_ops) -> List[AnyMessage]:
+    """The list-rewriting implementation that `_MessageStore` replaced."""
+    messages = list(messages)
+    for message_op in message_ops:
+        if message_op["op"] == "delete":
+            t = cast(str, message_op["target"])
+            messages = [m for m in messages if m.id != t]
+        elif message_op["op"] == "update_tool_call":
+            targ = cast(ToolCall, message_op["target"])
+            messages_ = []
+            for m in messages:
+                if isinstance(m, AIMessage):
+                    old = m.tool_calls.copy()
+                    new = [targ if tc["id"] == targ["id"] else tc for tc in m.tool_calls]
+                    if old != new:
+                        m = m.model_copy()
+                        m.tool_calls = new
+                messages_.append(m)
+            messages = messages_
+    return messages
+
+
+def _legacy_reduce(left, right):
+    ops = [r for r in right if isinstance(r, dict) and r.get("op")]
+    msgs = [r for r in right if not (isinstance(r, dict) and r.get("op"))]
+    messages = add_messages(left, msgs)
+    return _legacy_apply_message_ops(messages, ops) if ops else messages
+
+
+def build_history(n_messages):
+    """Alternate AIMessages carrying tool calls with their ToolMessages."""
+    messages = []
+    i = 0
+    while len(messages) < n_messages:
+        tool_calls = [
+            {"id": f"call_{i}_{j}", "name": "ShipmentBooking", "args": {"shipment": {"items": [{"quantity": j}]}}}
+            for j in range(TOOL_CALLS_PER_MESSAGE)
+        ]
+        messages.append(AIMessage(content="", tool_calls=tool_calls, id=f"ai_{i}"))
+        for tc in tool_calls:
+            messages.append(
+                ToolMessage(content="error", tool_call_id=tc["id"], id=f"tool_{tc['id']}", status="error")
+            )
+        i += 1
+    return messages[:n_messages]
+
+
+def build_ops(history):
+    """Op batch of a patch fan-in that touches the most recent tool calls."""
+    tool_messages = [m for m in history if isinstance(m, ToolMessage)][-PATCHED_CALLS * 2:]
+    ops = []
+    for k, tm in enumerate(tool_messages):
+        if k % 2 == 0:
+            ops.append({
+                "op": "update_tool_call",
+                "target": {"id": tm.tool_call_id, "name": "ShipmentBooking", "args": {"patched": True}},
+            })
+        ops.append({"op": "delete", "target": tm.id})
+    return ops
+
+
+def main():
+    rows = []
+    for n in (100, 1_000, 5_000, 20_000):
+        history = build_history(n)
+        ops = build_ops(history)
+        store = _reduce_messages([], history)
+        assert isinstance(store, _MessageStore)
+        # Both implementations must agree on the result
+        assert list(_reduce_messages(store, ops)) == _legacy_reduce(history, ops)
+        repeat = 3 if n > 5_000 else 5
+        legacy = timeit(lambda: _legacy_reduce(history, ops), repeat=repeat)
+        indexed = timeit(lambda: _reduce_messages(store, ops), repeat=repeat)
+        rows.append((
+            n,
+            len(ops),
+            f"{legacy * 1e3:.2f}",
+            f"{indexed * 1e3:.3f}",
+            f"{legacy / indexed:.0f}x",
+        ))
+    print("Reducer call applying a patch fan-in op batch")
+    print_table(("messages", "ops", "legacy ms", "indexed ms", "speedup"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Allocation benchmark for the patch fan-out in the trustcall graph.
+
+After validation, `handle_retries` sends one `ExtendedExtractState` per invalid
+tool call to the patch node. Previously each branch deep-copied the whole state
+via `dataclasses.asdict` and rebuilt the last AIMessage from `model_dump()`.
+This benchmark measures, with tracemalloc, the memory allocated while building
+those branch states for a multi-item booking with several invalid calls, and
+compares the previous approach with the shared `_ToolCallHistory` view.
+"""
+import tracemalloc
+from dataclasses import asdict
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table, timeit
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from notes._base import (
+    ExtendedExtractState,
+    ExtractionState,
+    _get_history_for_tool_call,
+    _reduce_messages,
+    _shallow_asdict,
+)
+
+ITEMS_PER_BOOKING = 40
+TOOL_CALLS = 6
+INVALID_CALLS = 4
+
+
+def _legacy_history(messages, tool_call_id):
+    """History construction before the view: copies the last AIMessage via model_dump."""
+    results = []
+    seen_ai_message = False
+    for m in reversed(messages):
+        if isinstance(m, AIMessage):
+            if not seen_ai_message:
+                tool_calls = [tc for tc in m.tool_calls if tc["id"] == tool_call_id]
+                d = m.model_dump(exclude={"tool_calls", "content"})
+                m = AIMessage(**d, content=str(m.content), tool_calls=tool_calls)
+            seen_ai_message = True
+        if isinstance(m, ToolMessage):
+            if m.tool_call_id != tool_call_id and not seen_ai_message:
+                continue
+        results.append(m)
+    return list(reversed(results))
+
+
+def _booking_args(call_index):
+    items = [
+        {
+            "load_carrier": 1,
+            "name": f"Luftreiniger Typ {call_index}-{i}",
+            "quantity": "viele" if call_index < INVALID_CALLS and i == 0 else 34,
+            "length": 120, "width": 80, "height": 120, "weight": 150, "stackable": True,
+        }
+        for i in range(ITEMS_PER_BOOKING)
+    ]
+    return {
+        "pickup_address": {"company": "Technik GmbH", "street": "Industriestr. 42", "postal_code": "33602", "city": "Bielefeld"},
+        "delivery_address": {"company": "Logistik AG", "street": "Hauptstraße 123", "postal_code": "70173", "city": "Stuttgart"},
+        "billing_address": {"company": "Finanz GmbH", "vat_id": "DE123456789"},
+        "shipment": {"items": items},
+    }
+
+
+def build_state(prior_turns):
+    """State right after validation: prior turns, the extraction and its ToolMessages."""
+    messages = [SystemMessage(content="Extract the shipment booking. " * 200)]
+    for t in range(prior_turns):
+        messages.append(HumanMessage(content=f"Laderaumbedarf: Sattelzug {t} " * 50))
+        messages.append(AIMessage(content=f"Noted {t}."))
+    tool_calls = [
+        {"id": f"call_{c}", "name": "ShipmentBooking", "args": _booking_args(c)}
+        for c in range(TOOL_CALLS)
+    ]
+    messages.append(AIMessage(content="", tool_calls=tool_calls))
+    for c, tc in enumerate(tool_calls):
+        messages.append(
+            ToolMessage(
+                content="Error: quantity must be an integer" if c < INVALID_CALLS else "{}",
+                tool_call_id=tc["id"],
+                status="error" if c < INVALID_CALLS else "success",
+            )
+        )
+    return ExtractionState(messages=_reduce_messages([], messages), attempts=1, msg_id="x")
+
+
+def legacy_fan_out(state):
+    return [
+        ExtendedExtractState(**{
+            **asdict(state),
+            "messages": _legacy_history(list(state.messages), m.tool_call_id),
+            "tool_call_id": m.tool_call_id,
+        })
+        for m in state.messages
+        if isinstance(m, ToolMessage) and m.status == "error"
+    ]
+
+
+def view_fan_out(state):
+    return [
+        ExtendedExtractState(**{
+            **_shallow_asdict(state),
+            "messages": _get_history_for_tool_call(state.messages, m.tool_call_id),
+            "tool_call_id": m.tool_call_id,
+        })
+        for m in state.messages
+        if isinstance(m, ToolMessage) and m.status == "error"
+    ]
+
+
+def measure(fn, state):
+    """Return (bytes retained by the result, peak bytes allocated) for one call."""
+    fn(state)  # warm up caches (schema lookups, materialized lists)
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    result = fn(state)
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(result) == INVALID_CALLS
+    return after - before, peak - before
+
+
+def main():
+    rows = []
+    for prior_turns in (0, 20, 100):
+        state = build_state(prior_turns)
+        legacy_kept, legacy_peak = measure(legacy_fan_out, state)
+        view_kept, view_peak = measure(view_fan_out, state)
+        legacy_time = timeit(lambda: legacy_fan_out(state))
+        view_time = timeit(lambda: view_fan_out(state))
+        rows.append((
+            len(state.messages),
+            f"{legacy_kept / 1024:.0f}",
+            f"{legacy_peak / 1024:.0f}",
+            f"{legacy_time * 1e3:.2f}",
+            f"{view_kept / 1024:.1f}",
+            f"{view_peak / 1024:.1f}",
+            f"{view_time * 1e3:.3f}",
+        ))
+    print(
+        f"Patch fan-out: {TOOL_CALLS} tool calls ({INVALID_CALLS} invalid),"
+        f" {ITEMS_PER_BOOKING} items each"
+    )
+    print_table(
+        (
+            "messages",
+            "legacy KiB kept", "legacy KiB peak", "legacy ms",
+            "view KiB kept", "view KiB peak", "view ms",
+        ),
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Cost of the batched plausibility check and of the targeted re-extraction.
+
+Builds a batch of synthetic (text, booking) pairs where a share of the
+bookings has one injected error (pallet weight out of range, dimensions in
+mm, wrong piece count, delivery before pickup) and times `check_batch` over
+growing batches. Then re-extracts the flagged bookings with the fake model
+and compares the tokens with re-running the full extraction for every
+booking, which is what a blanket retry would cost.
+"""
+import os
+import random
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table, timeit
+
+# Must be set before app modules create their LLMs at import time
+os.environ.update({
+    "FAKE_LLM": "1",
+    "FAKE_LLM_LATENCY": "fixed",
+    "FAKE_LLM_LATENCY_MEDIAN": "0",
+    "FAKE_LLM_SEED": "7",
+})
+
+from langchain_core.runnables.config import merge_configs  # noqa: E402
+
+from app.nodes import fixed_node  # noqa: E402
+from app.utils.plausibility import check_batch  # noqa: E402
+from app.utils.usage import UsageTracker  # noqa: E402
+
+BATCH_SIZES = (1_000, 10_000, 100_000)
+RECHECK_BATCH = 40
+ERROR_RATE = 0.1
+ERRORS = ("weight", "millimeters", "pieces", "dates")
+
+
+def sample(count, rng):
+    texts, bookings = [], []
+    for _ in range(count):
+        quantity = rng.randint(1, 33)
+        item = {"load_carrier": 1, "name": "Maschinenteile", "quantity": quantity,
+                "length": 120, "width": 80, "height": 100, "weight": rng.randint(50, 900), "stackable": False}
+        booking = {
+            "pickup_address": {"pickup_date": "03.03.2025"},
+            "delivery_address": {"delivery_date": "04.03.2025"},
+            "shipment": {"items": [item], "shipment_notes": None},
+        }
+        text = (f"Insgesamt {quantity} Paletten Maschinenteile, je {item['weight']} kg, 120x80x100 cm, "
+                f"Gesamtgewicht {quantity * item['weight']} kg. Abholung 03.03.2025, Lieferung 04.03.2025")
+        if rng.random() < ERROR_RATE:
+            error = rng.choice(ERRORS)
+            if error == "weight":
+                item["weight"] = 4000
+            elif error == "millimeters":
+                item.update(length=1200, width=800, height=1000)
+            elif error == "pieces":
+                item["quantity"] += 1
+            else:
+                booking["delivery_address"]["delivery_date"] = "01.03.2025"
+        texts.append(text)
+        bookings.append(booking)
+    return texts, bookings
+
+
+def tokens(report):
+    totals = report["totals"]
+    return totals["calls"], totals["input_tokens"] + totals["output_tokens"]
+
+
+def main():
+    rng = random.Random(11)
+    rows = []
+    for size in BATCH_SIZES:
+        texts, bookings = sample(size, rng)
+        seconds = timeit(lambda: check_batch(texts, bookings), repeat=3, number=1)
+        flagged = sum(1 for issues in check_batch(texts, bookings) if issues)
+        rows.append((size, f"{seconds * 1000:.0f}", f"{seconds / size * 1e6:.1f}", flagged))
+    print(f"check_batch ({ERROR_RATE:.0%} of the bookings with an injected error)")
+    print_table(("bookings", "ms", "µs per booking", "flagged"), rows)
+
+    texts, bookings = sample(RECHECK_BATCH, rng)
+    targeted = fixed_node.recheck_batch(texts, bookings)
+    usage = UsageTracker()
+    fixed_node.shipment_booking_extractor.batch(
+        texts, config=merge_configs({"configurable": {"max_attempts": 3}}, {"callbacks": [usage]})
+    )
+    flagged = sum(1 for issues in targeted["issues"] if issues)
+    rows = [
+        (f"re-extract flagged sections ({flagged} bookings)", *tokens(targeted["usage"])),
+        (f"re-extract all {RECHECK_BATCH} bookings, max_attempts=3", *tokens(usage.report())),
+    ]
+    print(f"\nSecond pass over {RECHECK_BATCH} bookings (fake model)")
+    print_table(("variant", "LLM calls", "tokens"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Cost of handing one extraction result from the extractor to the UI.
+
+Replays the steps after the validated `ShipmentBooking` comes back from the
+extractor, once as before (model_dump, the four section dicts merged by the
+state reducers, combine_results rebuilding the booking, deepcopy for the
+session, in-place standardize_values, st.json serializing the dict), once
+with a single model_dump (the dict passed on by reference, JSON produced
+once with the N/A replacement) and once on the lean path (the model itself
+passed on, JSON produced once by model_dump_json). Peak memory per request
+is measured with tracemalloc.
+"""
+import copy
+import json
+import time
+import tracemalloc
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table
+
+from app.schemas.shipment_booking_schema import ShipmentBooking
+from app.utils.serialization import booking_json
+
+REQUESTS = 2_000
+BOOKING = ShipmentBooking.model_validate({
+    "pickup_address": {"company": "Technik GmbH", "first_name": "Thomas", "last_name": "Müller",
+                       "street": "Industriestr. 42", "postal_code": "33602", "city": "Bielefeld", "country": "DE",
+                       "pickup_date": "03.03.2025", "pickup_time_from": "07:00", "pickup_time_to": "09:00"},
+    "delivery_address": {"company": "Logistik AG", "street": "Hauptstraße 123", "postal_code": "70173",
+                         "city": "Stuttgart", "country": "DE", "delivery_date": "04.03.2025", "phone": "<UNKNOWN>"},
+    "billing_address": {"company": "Finanz GmbH", "street": "Rechnungsweg 7", "postal_code": "10115",
+                        "city": "Berlin", "country": "DE", "vat_id": "DE123456789", "reference": "NULL"},
+    "shipment": {"items": [
+        {"load_carrier": 1, "name": "Maschinenteile", "quantity": 4, "length": 120, "width": 80, "height": 100,
+         "weight": 100, "stackable": False},
+        {"load_carrier": 2, "name": "Elektronik", "quantity": 2, "length": 60, "width": 40, "height": 30,
+         "weight": 15, "stackable": True},
+    ], "shipment_notes": None},
+})
+
+
+def merge_dicts(dict1, dict2):
+    result = dict1.copy()
+    result.update(dict2)
+    return result
+
+
+def standardize_values(data):
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if value == "NULL" or value == "<UNKNOWN>":
+                data[key] = "N/A"
+            elif isinstance(value, (dict, list)):
+                data[key] = standardize_values(value)
+    elif isinstance(data, list):
+        for i, item in enumerate(data):
+            data[i] = standardize_values(item)
+    return data
+
+
+def previous_path(model):
+    booking_data = model.model_dump()
+    state = {}
+    for key in ("pickup_address", "delivery_address", "billing_address", "shipment"):
+        state[key] = merge_dicts({}, booking_data.get(key, {}))
+    result = {key: state.get(key, {}) for key in ("pickup_address", "delivery_address", "billing_address", "shipment")}
+    session = copy.deepcopy(result)
+    shown = standardize_values(result)
+    return session, json.dumps(shown, default=str)
+
+
+def dict_path(model):
+    result = model.model_dump()
+    return result, booking_json(result, placeholder="N/A")
+
+
+def lean_path(model):
+    return model, booking_json(model, placeholder="N/A")
+
+
+def measure(path):
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        path(BOOKING)
+    seconds = (time.perf_counter() - start) / REQUESTS
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    path(BOOKING)
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    assert json.loads(previous_path(BOOKING)[1]) == json.loads(dict_path(BOOKING)[1]) == json.loads(lean_path(BOOKING)[1])
+    rows = []
+    for name, path in (("previous (dump, reducers, rebuild, deepcopy, standardize, dumps)", previous_path),
+                       ("one dump, JSON once from the dict", dict_path),
+                       ("lean (model kept, JSON once)", lean_path)):
+        seconds, peak = measure(path)
+        rows.append((name, f"{seconds * 1e6:.0f}", f"{peak / 1024:.1f}"))
+    print("Result hand-off per request, after the extractor")
+    print_table(("path", "µs", "peak KiB"), rows)
+
+
+if __name__ == "__main__":
+    main()
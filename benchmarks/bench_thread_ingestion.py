@@ -0,0 +1,96 @@
+"""
+Per-message cost of thread ingestion as email threads grow.
+
+A synthetic thread starts with a booking request and continues with short
+follow-ups, each quoting the whole history below it (as mail clients do).
+Compares, per message position:
+
+- re-extraction: the full graph over the thread so far (all messages without
+  their quotes, oldest first)
+- thread ingestion: `ingest_message` - the first mail is extracted, every
+  follow-up is a PatchDoc update against the stored booking
+
+The fake model adds 15 ms per output token on top of 0.4 s to first token.
+"""
+import os
+import time
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table
+
+# Must be set before app modules create their LLMs at import time
+os.environ.update({
+    "FAKE_LLM": "1",
+    # Die Fake-Antworten ignorieren den Text und würden die Plausibilitätsprüfung auslösen
+    "PLAUSIBILITY_RECHECK": "0",
+    "FAKE_LLM_LATENCY": "fixed",
+    "FAKE_LLM_LATENCY_MEDIAN": "0.4",
+    "FAKE_LLM_OUTPUT_TOKEN_LATENCY": "0.015",
+    "FAKE_LLM_SEED": "7",
+})
+
+from app.utils.thread_ingestion import ingest_message  # noqa: E402
+from app.utils.thread_store import ThreadStore  # noqa: E402
+from app.utils.workflow import build_shipment_graph  # noqa: E402
+
+MESSAGES = 12
+REPORT_AT = (1, 2, 4, 8, 12)
+FIRST = """Guten Tag,
+bitte holen Sie bei Technik GmbH, Industriestr. 42, 33602 Bielefeld am 03.03.2025 ab.
+Lieferung an Logistik AG, Hauptstraße 123, 70173 Stuttgart.
+4 Paletten Maschinenteile, je 100 kg, 120x80x100 cm
+Mit freundlichen Grüßen
+Thomas Müller"""
+FOLLOWUPS = [
+    "Die Abholung verschiebt sich auf Donnerstag, 06.03.2025.",
+    "Bitte noch 2 Paletten Ersatzteile mit je 80 kg dazunehmen.",
+    "Lieferung bitte erst ab 10 Uhr.",
+    "Die Maschinenteile sind doch stapelbar.",
+]
+
+
+def thread_mails():
+    """
+    Yield (transcript, mail) per message: the thread so far and the mail as sent
+    by the client (new text above the quoted history).
+    """
+    texts = [FIRST]
+    history = FIRST
+    yield FIRST, FIRST
+    for i in range(1, MESSAGES):
+        text = f"{FOLLOWUPS[(i - 1) % len(FOLLOWUPS)]}\n\nViele Grüße\nThomas Müller"
+        quoted = "\n".join(f"> {line}" for line in history.splitlines())
+        mail = f"{text}\n\nAm 0{i % 9 + 1}.03.2025 um 09:{i:02d} schrieb Thomas Müller <t.mueller@technik-gmbh.de>:\n{quoted}"
+        history = mail
+        texts.append(text)
+        yield "\n\n---\n\n".join(texts), mail
+
+
+def measure(process):
+    rows = {}
+    for index, (transcript, mail) in enumerate(thread_mails(), start=1):
+        start = time.perf_counter()
+        usage = process(transcript, mail)
+        rows[index] = (time.perf_counter() - start, usage["totals"]["input_tokens"], usage["totals"]["output_tokens"])
+    return rows
+
+
+def main():
+    graph = build_shipment_graph()
+    full = measure(lambda transcript, mail: graph.invoke({"input": transcript})["usage"])
+    store = ThreadStore(":memory:")
+    ingested = measure(lambda transcript, mail: ingest_message("thread-1", mail, store=store)["usage"])
+
+    rows = []
+    for index in REPORT_AT:
+        f, t = full[index], ingested[index]
+        rows.append((index, f"{f[0]:.2f}", f[1], f[2], f"{t[0]:.2f}", t[1], t[2]))
+    print(f"Thread of {MESSAGES} mails, each quoting the history (fake model)")
+    print_table(
+        ("message", "re-extract s", "in tokens", "out tokens", "ingest s", "in tokens", "out tokens"),
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Per-request overhead of LangSmith tracing with the offline fake model.
+
+Runs the shipment graph sequentially with a zero-latency fake model, so the
+measured time is pure framework and tracing work on the request thread. The
+traces go to a local stand-in for the LangSmith API. Compared setups:
+
+- off: `invoke_traced(..., trace=False)`
+- LangChain tracing: plain `graph.invoke` with `LANGSMITH_TRACING=true`
+- buffered, sampled at 100 % / 10 %, and 10 % with all errors kept (which
+  means buffering every request, since the decision is made at the end)
+
+The table shows the mean time per request on the request thread and how long
+the final flush of the background upload took.
+"""
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table
+
+# Must be set before app modules create their LLMs at import time
+os.environ.update({"FAKE_LLM": "1", "FAKE_LLM_LATENCY": "fixed", "FAKE_LLM_LATENCY_MEDIAN": "0", "FAKE_LLM_SEED": "7", "PLAUSIBILITY_RECHECK": "0"})
+
+REQUESTS = 300
+
+
+class LangSmithStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+    requests_received = 0
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _ok(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        self.server.requests_received += 1
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PATCH = _ok
+
+
+def main():
+    server = LangSmithStandIn(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update({
+        "LANGSMITH_ENDPOINT": f"http://127.0.0.1:{server.server_address[1]}",
+        "LANGSMITH_API_KEY": "lsv2-standin",
+        "LANGSMITH_PROJECT": "bench",
+        "LANGSMITH_TRACING": "true",
+    })
+
+    from langchain_core.tracers.langchain import wait_for_all_tracers
+
+    from app.utils import tracing
+    from app.utils.workflow import build_shipment_graph
+
+    graph = build_shipment_graph()
+    counter = iter(range(10**9))
+
+    def request(invoke):
+        # Eindeutige Eingabe, sonst antwortet der LLM-Cache
+        return lambda: invoke({"input": f"Sendung {next(counter)}: 4 Paletten von Bielefeld nach Stuttgart."})
+
+    def buffered(rate, error_rates=None):
+        def setup():
+            tracing._sampler = tracing.TraceSampler(rate, error_rates)
+            tracing._exporter = tracing.TraceExporter()
+            return request(lambda state: tracing.invoke_traced(graph, state))
+        return setup
+
+    setups = [
+        ("off", lambda: request(lambda state: tracing.invoke_traced(graph, state, trace=False)), None),
+        ("LangChain tracing", lambda: request(graph.invoke), wait_for_all_tracers),
+        ("buffered, 100 %", buffered(1.0), tracing.flush_traces),
+        ("buffered, 10 %", buffered(0.1), tracing.flush_traces),
+        ("buffered, 10 %, errors 100 %", buffered(0.1, {"*": 1.0}), tracing.flush_traces),
+    ]
+    rows = []
+    baseline = None
+    for name, setup, flush in setups:
+        one = setup()
+        for _ in range(20):  # warm-up
+            one()
+        if flush:
+            flush()
+        received = server.requests_received
+        start = time.perf_counter()
+        for _ in range(REQUESTS):
+            one()
+        per_request = (time.perf_counter() - start) / REQUESTS
+        flush_start = time.perf_counter()
+        if flush:
+            flush()
+        flush_seconds = time.perf_counter() - flush_start
+        baseline = baseline or per_request
+        rows.append((
+            name, f"{per_request * 1e3:.2f}", f"{(per_request - baseline) * 1e3:+.2f}",
+            f"{flush_seconds:.2f}", server.requests_received - received,
+        ))
+    server.shutdown()
+    print(f"Tracing overhead: {REQUESTS} sequential requests, zero-latency fake model")
+    print_table(("setup", "ms/request", "overhead ms", "flush s", "uploads"), rows)
+
+
+if __name__ == "__main__":
+    main()
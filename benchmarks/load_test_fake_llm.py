@@ -0,0 +1,90 @@
+"""
+Offline load test of the shipment graph against the fake chat model.
+
+Runs `build_shipment_graph` concurrently with `FAKE_LLM=1`, so latency, retries
+and failures come from `app.utils.fake_llm` instead of the Anthropic API.
+Any `FAKE_LLM_*` variable set in the environment overrides the defaults below::
+
+    FAKE_LLM_529_RATE=0.05 python benchmarks/load_test_fake_llm.py --requests 400 --workers 32
+"""
+import argparse
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table
+
+# Must be set before app modules create their LLMs at import time
+DEFAULTS = {
+    "FAKE_LLM": "1",
+    # Die Fake-Antworten ignorieren den Text und würden die Plausibilitätsprüfung auslösen
+    "PLAUSIBILITY_RECHECK": "0",
+    "FAKE_LLM_LATENCY": "lognormal",
+    "FAKE_LLM_LATENCY_MEDIAN": "0.8",
+    "FAKE_LLM_LATENCY_SIGMA": "0.6",
+    "FAKE_LLM_INVALID_RATE": "0.2",
+    "FAKE_LLM_429_RATE": "0.02",
+    "FAKE_LLM_529_RATE": "0.01",
+    "FAKE_LLM_TRUNCATED_RATE": "0.01",
+    "FAKE_LLM_SEED": "7",
+}
+for key, value in DEFAULTS.items():
+    os.environ.setdefault(key, value)
+
+from app.utils.usage import combine_usage, format_usage_report  # noqa: E402
+from app.utils.workflow import build_shipment_graph  # noqa: E402
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run(requests, workers):
+    graph = build_shipment_graph()
+
+    def one(i):
+        start = time.perf_counter()
+        usage = None
+        try:
+            # Unique input per request, otherwise the LLM cache answers repeats
+            state = graph.invoke({"input": f"Sendung {i}: Bitte Abholung in Bielefeld, Lieferung nach Stuttgart."})
+            outcome, usage = "ok", state.get("usage")
+        except Exception as e:
+            outcome = type(e).__name__
+        return time.perf_counter() - start, outcome, usage
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(one, range(requests)))
+    wall = time.perf_counter() - start
+    latencies = sorted(latency for latency, _, _ in results)
+    usage = combine_usage(usage for _, _, usage in results)
+    return latencies, Counter(outcome for _, outcome, _ in results), usage, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    latencies, outcomes, usage, wall = run(args.requests, args.workers)
+    print(f"{args.requests} requests, {args.workers} workers, {wall:.1f} s wall, {args.requests / wall:.1f} req/s")
+    print_table(
+        ("p50 s", "p90 s", "p99 s", "max s"),
+        [tuple(f"{percentile(latencies, q):.2f}" for q in (0.5, 0.9, 0.99, 1.0))],
+    )
+    print()
+    print_table(("outcome", "count"), sorted(outcomes.items()))
+    print()
+    print("Token usage of the successful requests (fake model, list prices of the real model):")
+    print(format_usage_report(usage))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Outage simulation for the circuit breaker and multi-provider failover.
+
+Starts local stand-in endpoints for the Anthropic Messages API and the OpenAI
+Chat Completions API and drives real `ChatAnthropic`/`ChatOpenAI` clients (via
+trustcall extractors) through a scripted incident on the primary provider:
+
+    healthy -> 529 overloaded -> hanging (timeouts) -> recovered
+
+Requests arrive every 100 ms; the breakers open after 3 of the last calls
+failed, and probe the primary again after 1.5 s (half-open).
+
+Compares plain failover (breakers never open) with circuit breakers: which
+provider served the requests of each phase and the latency users saw.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table
+
+from trustcall import create_extractor
+
+from app.schemas.shipment_booking_schema import ShipmentBooking
+from app.utils.failover import CircuitBreaker, FailoverExtractor
+from app.utils.model_setup import get_anthropic_llm, get_openai_llm
+
+TIMEOUT = 1.0
+INTERVAL = 0.1  # request pacing, so phases outlast the breaker's reset timeout
+PHASES = [("healthy", "ok", 20), ("529 overloaded", "529", 30), ("hanging", "hang", 20), ("recovered", "ok", 30)]
+BOOKING = {
+    "pickup_address": {"company": "Technik GmbH", "postal_code": "33602", "city": "Bielefeld"},
+    "delivery_address": {"company": "Logistik AG", "postal_code": "70173", "city": "Stuttgart"},
+    "shipment": {"items": [{"load_carrier": 1, "name": "Maschinenteile", "quantity": 4, "weight": 100}]},
+}
+
+
+class StandIn(ThreadingHTTPServer):
+    daemon_threads = True
+    mode = "ok"
+    hits = 0
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        self.server.hits += 1
+        if self.server.mode == "529":
+            return self._send(529, {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}})
+        if self.server.mode == "hang":
+            time.sleep(TIMEOUT * 2)
+        if self.path.endswith("/chat/completions"):
+            body = {
+                "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+                "choices": [{"index": 0, "finish_reason": "tool_calls", "message": {
+                    "role": "assistant", "content": None,
+                    "tool_calls": [{"id": "call_1", "type": "function",
+                                    "function": {"name": "ShipmentBooking", "arguments": json.dumps(BOOKING)}}],
+                }}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150},
+            }
+        else:
+            body = {
+                "id": "msg_1", "type": "message", "role": "assistant", "model": "claude-3-7-sonnet-20250219",
+                "content": [{"type": "tool_use", "id": "toolu_1", "name": "ShipmentBooking", "input": BOOKING}],
+                "stop_reason": "tool_use", "stop_sequence": None,
+                "usage": {"input_tokens": 100, "output_tokens": 50},
+            }
+        self._send(200, body)
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up (timeout)
+
+
+def start(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def build(anthropic_url, openai_url, breakers):
+    common = {"fake": False, "max_retries": 0, "timeout": TIMEOUT}
+    primary = get_anthropic_llm(key_index=1, hedge=False, base_url=anthropic_url, **common)
+    fallback = get_openai_llm("gpt-4o-mini", base_url=f"{openai_url}/v1", **common)
+    if breakers:
+        factory = lambda name: CircuitBreaker(name, window=10, min_calls=3, failure_rate_threshold=0.5, reset_timeout=1.5)
+    else:
+        factory = lambda name: CircuitBreaker(name, min_calls=10**9)  # never opens
+    return FailoverExtractor(
+        [
+            ("anthropic", create_extractor(primary, tools=[ShipmentBooking], tool_choice="ShipmentBooking")),
+            ("openai", create_extractor(fallback, tools=[ShipmentBooking], tool_choice="ShipmentBooking")),
+        ],
+        breaker_factory=factory,
+    )
+
+
+def simulate(breakers):
+    anthropic, openai = StandIn(("127.0.0.1", 0), Handler), StandIn(("127.0.0.1", 0), Handler)
+    extractor = build(start(anthropic), start(openai), breakers)
+    rows = []
+    try:
+        for phase, mode, requests in PHASES:
+            anthropic.mode = mode
+            hits = (anthropic.hits, openai.hits)
+            latencies = []
+            for _ in range(requests):
+                start_time = time.perf_counter()
+                extractor.invoke("Bitte Transport buchen", config={"configurable": {"max_attempts": 1}})
+                latencies.append(time.perf_counter() - start_time)
+                time.sleep(max(0.0, INTERVAL - latencies[-1]))
+            latencies.sort()
+            rows.append((
+                phase, requests, anthropic.hits - hits[0], openai.hits - hits[1],
+                f"{sum(latencies) / len(latencies) * 1e3:.0f}",
+                f"{latencies[int(0.95 * (len(latencies) - 1))] * 1e3:.0f}",
+                extractor.states()["anthropic"],
+            ))
+    finally:
+        anthropic.shutdown()
+        openai.shutdown()
+    return rows
+
+
+def main():
+    headers = ("phase", "requests", "anthropic calls", "openai calls", "mean ms", "p95 ms", "breaker at end")
+    for breakers in (False, True):
+        print("Circuit breakers" if breakers else "Plain failover (no breakers)")
+        print_table(headers, simulate(breakers))
+        print()
+
+
+if __name__ == "__main__":
+    main()
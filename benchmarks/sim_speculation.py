@@ -0,0 +1,81 @@
+"""
+Simulated UI sessions with and without speculative background extraction.
+
+Each session pastes a request, reads it for a random time and clicks
+"Extract"; in some sessions the user edits the text once more before
+clicking, which cancels the running speculation. The fake model takes 0.8 s
+per extraction. Reports the wait after the click with and without
+speculation, the hit rate and the spend of speculative runs that were never
+used.
+"""
+import os
+import random
+import statistics
+import time
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table
+
+# Must be set before app modules create their LLMs at import time
+os.environ.update({
+    "FAKE_LLM": "1",
+    "FAKE_LLM_LATENCY": "fixed",
+    "FAKE_LLM_LATENCY_MEDIAN": "0.8",
+    "FAKE_LLM_SEED": "7",
+    # Die Fake-Antworten ignorieren den Text und würden die Plausibilitätsprüfung auslösen
+    "PLAUSIBILITY_RECHECK": "0",
+})
+
+from app.utils.speculation import SpeculativeExtractor  # noqa: E402
+from app.utils.workflow import build_shipment_runnable  # noqa: E402
+
+SESSIONS = 20
+DEBOUNCE = 0.3
+EDIT_RATE = 0.3
+READ_SECONDS = (0.2, 2.0)
+TEXT = """Abholung bei Technik GmbH, Industriestraße 42, 33602 Bielefeld am 03.03.2025.
+Lieferung an Logistik AG, Hauptstr. 123, 70173 Stuttgart.
+{pallets} Paletten Maschinenteile, je 100 kg, 120x80x100 cm"""
+
+
+def session(rng, graph, speculator):
+    text = TEXT.format(pallets=rng.randint(1, 30))
+    if speculator:
+        speculator.text_changed(text)
+    time.sleep(rng.uniform(*READ_SECONDS))
+    if rng.random() < EDIT_RATE:
+        text += "\nBitte Avis 24h vorher."
+        if speculator:
+            speculator.text_changed(text)
+        time.sleep(rng.uniform(*READ_SECONDS))
+    clicked = time.perf_counter()
+    hit = speculator.take(text) if speculator else None
+    if hit is None:
+        graph.invoke({"input": text})
+    return time.perf_counter() - clicked
+
+
+def main():
+    graph = build_shipment_runnable()
+    rows = []
+    for name, speculate in (("without speculation", False), ("with speculation", True)):
+        rng = random.Random(3)
+        speculator = SpeculativeExtractor(graph, debounce=DEBOUNCE) if speculate else None
+        waits = [session(rng, graph, speculator) for _ in range(SESSIONS)]
+        metrics = speculator.metrics() if speculator else {}
+        if speculator:
+            speculator.shutdown()
+        rows.append((
+            name, f"{statistics.median(waits):.2f}", f"{sum(waits):.1f}",
+            f"{metrics['hit_rate']:.0%}" if metrics else "-",
+            metrics.get("cancelled", "-"),
+            f"{metrics['wasted_cost_usd']:.4f}" if metrics else "-",
+            f"{metrics['used_cost_usd']:.4f}" if metrics else "-",
+        ))
+    print(f"{SESSIONS} sessions, reading {READ_SECONDS[0]}-{READ_SECONDS[1]} s, {EDIT_RATE:.0%} with a late edit, "
+          f"debounce {DEBOUNCE} s, 0.8 s per extraction")
+    print_table(("variant", "median wait s", "total wait s", "hit rate", "cancelled", "unused spend $", "used spend $"), rows)
+
+
+if __name__ == "__main__":
+    main()
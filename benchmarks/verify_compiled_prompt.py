@@ -0,0 +1,97 @@
+"""
+Compare extraction results of the legacy and the compiled system prompt.
+
+Extracts the first N texts of the sample corpus (`data/shipments.csv`) once
+with the hand-written legacy prompt and once with the prompt compiled from the
+schema, and reports per text whether the bookings are equivalent (strings
+compared case- and whitespace-insensitively) plus the fields that differ, and
+the prompt tokens of both variants.
+
+Runs against the configured model (API keys from .env). With FAKE_LLM=1 the
+answers do not depend on the prompt - use that only to check the script and
+the token numbers:
+
+    python benchmarks/verify_compiled_prompt.py --limit 50
+"""
+import argparse
+import csv
+import os
+
+import _util  # noqa: F401  (sets up the import path)
+from _util import print_table
+
+from app.nodes import fixed_node
+from app.schemas.shipment_booking_schema import ShipmentBooking
+from app.utils.prompt_compiler import get_system_prompt
+from app.utils.usage import UsageTracker
+
+try:
+    from trustcall import create_extractor
+except ImportError:
+    from app.utils.mock_trustcall import create_extractor
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "shipments.csv")
+VARIANTS = ("legacy", "outline")
+
+
+def corpus(limit):
+    with open(CORPUS, encoding="utf-8") as f:
+        texts = [row["Sendung"] for row in csv.DictReader(f) if row["Sendung"].strip()]
+    return texts[:limit]
+
+
+def normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.casefold().split()) or None
+    if isinstance(value, dict):
+        return {key: normalize(v) for key, v in value.items()}
+    if isinstance(value, list):
+        return [normalize(v) for v in value]
+    return value
+
+
+def differences(a, b, path=""):
+    if isinstance(a, dict) and isinstance(b, dict):
+        return [d for key in a.keys() | b.keys() for d in differences(a.get(key), b.get(key), f"{path}.{key}".lstrip("."))]
+    if isinstance(a, list) and isinstance(b, list) and len(a) == len(b):
+        return [d for i, (x, y) in enumerate(zip(a, b)) for d in differences(x, y, f"{path}[{i}]")]
+    return [] if a == b else [path]
+
+
+def extract(extractor, prompt, text, usage):
+    if hasattr(fixed_node.base_llm, "_rng"):
+        # Fake-Modell: gleiche Antwort für beide Prompts
+        fixed_node.base_llm._rng.seed(text)
+    result = extractor.invoke(
+        {"messages": [("system", prompt), ("user", text)]},
+        config={"configurable": {"max_attempts": 2}, "callbacks": [usage]},
+    )
+    return normalize(result["responses"][0].model_dump())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--limit", type=int, default=20, help="Number of corpus texts")
+    args = parser.parse_args()
+
+    extractor = create_extractor(fixed_node.base_llm, tools=[ShipmentBooking], tool_choice="ShipmentBooking")
+    prompts = {variant: get_system_prompt(variant) for variant in VARIANTS}
+    usage = {variant: UsageTracker() for variant in VARIANTS}
+    rows, equivalent = [], 0
+    for number, text in enumerate(corpus(args.limit), start=1):
+        results = {variant: extract(extractor, prompts[variant], text, usage[variant]) for variant in VARIANTS}
+        diff = differences(*results.values())
+        equivalent += not diff
+        rows.append((number, text[:50].replace("\n", " "), "yes" if not diff else ", ".join(sorted(diff)[:4])))
+    print_table(("#", "text", "equivalent / differing fields"), rows)
+    print(f"\n{equivalent} of {len(rows)} bookings equivalent")
+
+    rows = []
+    for variant in VARIANTS:
+        report = usage[variant].report()
+        rows.append((variant, report["components"]["system_prompt"], report["totals"]["input_tokens"]))
+    print_table(("prompt", "system prompt tokens", "input tokens"), rows)
+
+
+if __name__ == "__main__":
+    main()
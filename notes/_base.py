@@ -3,12 +3,16 @@
 from __future__ import annotations
 
 import functools
+import hashlib
 import inspect
+import itertools
 import json
 import logging
 import operator
+import sys
+import threading
 import uuid
-from dataclasses import asdict, dataclass, field
+from dataclasses import dataclass, field, fields
 from typing import (
     Any,
     Callable,
@@ -19,6 +23,7 @@ from typing import (
     NamedTuple,
     Optional,
     Sequence,
+    Tuple,
     Type,
     Union,
     cast,
@@ -32,18 +37,27 @@ from langchain_core.messages import (
     AIMessage,
     AnyMessage,
     BaseMessage,
+    BaseMessageChunk,
     HumanMessage,
     MessageLikeRepresentation,
+    RemoveMessage,
     SystemMessage,
     ToolCall,
     ToolMessage,
+    convert_to_messages,
+    message_chunk_to_message,
 )
 from langchain_core.prompt_values import PromptValue
 from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import (
+    ContextThreadPoolExecutor,
+    get_executor_for_config,
+)
 from langchain_core.tools import BaseTool, InjectedToolArg, create_schema_from_function
 from langgraph.constants import Send
-from langgraph.graph import StateGraph, add_messages
-from langgraph.prebuilt.tool_validator import ValidationNode, get_executor_for_config
+from langgraph.graph import StateGraph
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+from langgraph.prebuilt.tool_validator import ValidationNode
 from langgraph.types import Command
 from langgraph.utils.runnable import RunnableCallable
 from pydantic import (
@@ -53,6 +67,8 @@ from pydantic import (
     StrictBool,
     StrictFloat,
     StrictInt,
+    TypeAdapter,
+    ValidationError,
     create_model,
     field_validator,
 )
@@ -373,7 +389,7 @@ def create_extractor(
                             "patch",
                             ExtendedExtractState(
                                 **{
-                                    **asdict(state),
+                                    **_shallow_asdict(state),
                                     "messages": messages_for_fixing,
                                     "tool_call_id": m.tool_call_id,
                                     "bump_attempt": not bumped,
@@ -420,14 +436,16 @@ def create_extractor(
     def filter_state(state: dict) -> ExtractionOutputs:
         """Filter the state to only include the validated AIMessage + responses."""
         msg_id = state["msg_id"]
-        msg: Optional[AIMessage] = next(
-            (
-                m
-                for m in state["messages"]
-                if m.id == msg_id and isinstance(m, AIMessage)
-            ),  # type: ignore
-            None,
-        )
+        messages = state["messages"]
+        msg: Optional[AIMessage]
+        if isinstance(messages, _MessageStore):
+            found = messages.get(msg_id)
+            msg = found if isinstance(found, AIMessage) else None
+        else:
+            msg = next(
+                (m for m in messages if m.id == msg_id and isinstance(m, AIMessage)),
+                None,
+            )
         if not msg:
             return ExtractionOutputs(
                 messages=[],
@@ -693,7 +711,7 @@ class _ExtractUpdates:
 
     @ls.traceable(tags=["langsmith:hidden"])
     def _setup(self, state: ExtractionState):
-        messages = state.messages
+        messages = list(state.messages)
         existing = state.existing
         if not existing:
             raise ValueError("No existing schemas provided.")
@@ -1312,24 +1330,256 @@ class MessageOp(TypedDict):
     target: Union[str, ToolCall]
 
 
-def _get_history_for_tool_call(messages: List[AnyMessage], tool_call_id: str):
+class _MessageStore(Sequence):
+    """Insertion-ordered message container indexed by message ID and tool call ID.
+
+    Used as the value of ``ExtractionState.messages``. Messages live in a dict keyed
+    by their ID (IDs are assigned on insert, exactly like ``add_messages`` does), so
+    deleting, replacing or looking up a message - or the messages that reference a
+    given tool call - is O(1) instead of a rewrite of the whole list.
+
+    The store is treated as immutable once handed to the graph: the reducer works
+    on a shallow ``copy()`` and never mutates ``left`` in place.
+    """
+
+    __slots__ = ("_by_id", "_by_tool_call", "_seq")
+
+    def __init__(self, messages: Sequence[Message] = ()):
+        self._by_id: Dict[str, AnyMessage] = {}
+        # tool_call_id -> IDs of the AIMessages / ToolMessages referencing it.
+        # Values are tuples so that copies can share them safely.
+        self._by_tool_call: Dict[str, tuple[str, ...]] = {}
+        self._seq: Optional[List[AnyMessage]] = None
+        if messages:
+            self.merge(messages)
+
+    def copy(self) -> _MessageStore:
+        new = _MessageStore.__new__(_MessageStore)
+        new._by_id = self._by_id.copy()
+        new._by_tool_call = self._by_tool_call.copy()
+        new._seq = self._seq
+        return new
+
+    # Sequence protocol
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def __reversed__(self):
+        return reversed(self._by_id.values())
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if index == -1 and isinstance(index, int):
+            if not self._by_id:
+                raise IndexError("message store is empty")
+            return next(reversed(self._by_id.values()))
+        return self.as_list()[index]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, _MessageStore):
+            return list(self) == list(other)
+        if isinstance(other, (list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"_MessageStore({list(self._by_id.values())!r})"
+
+    # Lookups
+
+    def as_list(self) -> List[AnyMessage]:
+        """Return the messages as a list that is shared and must not be mutated."""
+        if self._seq is None:
+            self._seq = list(self._by_id.values())
+        return self._seq
+
+    def get(self, message_id: str) -> Optional[AnyMessage]:
+        return self._by_id.get(message_id)
+
+    def for_tool_call(self, tool_call_id: str) -> List[AnyMessage]:
+        """Return the AIMessages and ToolMessages referencing ``tool_call_id``."""
+        return [self._by_id[i] for i in self._by_tool_call.get(tool_call_id, ())]
+
+    # Mutations (only ever called on a fresh copy inside the reducer)
+
+    def _index(self, m: AnyMessage) -> None:
+        for tc_id in _tool_call_ids(m):
+            ids = self._by_tool_call.get(tc_id, ())
+            if m.id not in ids:
+                self._by_tool_call[tc_id] = ids + (cast(str, m.id),)
+
+    def _unindex(self, m: AnyMessage) -> None:
+        for tc_id in _tool_call_ids(m):
+            ids = tuple(i for i in self._by_tool_call.get(tc_id, ()) if i != m.id)
+            if ids:
+                self._by_tool_call[tc_id] = ids
+            else:
+                self._by_tool_call.pop(tc_id, None)
+
+    def _put(self, m: AnyMessage) -> None:
+        if (old := self._by_id.get(cast(str, m.id))) is not None:
+            self._unindex(old)
+        self._by_id[cast(str, m.id)] = m
+        self._index(m)
+        self._seq = None
+
+    def delete(self, message_id: str) -> None:
+        if (old := self._by_id.pop(message_id, None)) is not None:
+            self._unindex(old)
+            self._seq = None
+
+    def merge(self, right: Sequence[Message]) -> None:
+        """Merge new messages with the same semantics as ``add_messages``."""
+        incoming = [
+            message_chunk_to_message(cast(BaseMessageChunk, m))
+            for m in convert_to_messages(right)
+        ]
+        for m in incoming:
+            if m.id is None:
+                m.id = str(uuid.uuid4())
+        remove_all_idx = next(
+            (
+                i
+                for i, m in enumerate(incoming)
+                if isinstance(m, RemoveMessage) and m.id == REMOVE_ALL_MESSAGES
+            ),
+            None,
+        )
+        if remove_all_idx is not None:
+            self._by_id = {}
+            self._by_tool_call = {}
+            self._seq = None
+            for m in incoming[remove_all_idx + 1 :]:
+                self._put(m)
+            return
+        ids_to_remove = set()
+        for m in incoming:
+            if m.id in self._by_id:
+                if isinstance(m, RemoveMessage):
+                    ids_to_remove.add(m.id)
+                else:
+                    ids_to_remove.discard(m.id)
+                    self._put(m)
+            else:
+                if isinstance(m, RemoveMessage):
+                    raise ValueError(
+                        "Attempting to delete a message with an ID that"
+                        f" doesn't exist ('{m.id}')"
+                    )
+                self._put(m)
+        for message_id in ids_to_remove:
+            self.delete(cast(str, message_id))
+
+    def replace_tool_call(self, tool_call_id: str, fn: Callable[[ToolCall], dict]):
+        """Rewrite ``tool_call_id`` in every AIMessage that carries it."""
+        for m in self.for_tool_call(tool_call_id):
+            if not isinstance(m, AIMessage):
+                continue
+            new = [fn(tc) if tc["id"] == tool_call_id else tc for tc in m.tool_calls]
+            if new != m.tool_calls:
+                m = m.model_copy()
+                m.tool_calls = new  # type: ignore[assignment]
+                if m.additional_kwargs.get("tool_calls"):
+                    m.additional_kwargs = {**m.additional_kwargs, "tool_calls": new}
+                self._put(m)
+
+
+def _tool_call_ids(m: BaseMessage) -> List[str]:
+    if isinstance(m, AIMessage):
+        return [tc["id"] for tc in m.tool_calls if tc.get("id")]  # type: ignore[misc]
+    if isinstance(m, ToolMessage):
+        return [m.tool_call_id]
+    return []
+
+
+class _ToolCallHistory(Sequence):
+    """Read-only view of the history a patch branch sends back to the LLM.
+
+    Equivalent to the list built by ``_get_history_for_tool_call``, but shares the
+    store's message list instead of copying it: every message before the last
+    AIMessage is read from the store, the last AIMessage is replaced by a shallow
+    copy that only carries the tool call being fixed, and only that call's
+    ToolMessages are kept after it.
+    """
+
+    __slots__ = ("_store", "_messages", "_ai_index", "_ai", "_tail")
+
+    def __init__(
+        self,
+        store: _MessageStore,
+        ai_index: int,
+        ai: AIMessage,
+        tail: List[AnyMessage],
+    ):
+        self._store = store
+        self._messages = store.as_list()
+        self._ai_index = ai_index
+        self._ai = ai
+        self._tail = tail
+
+    def __len__(self) -> int:
+        return self._ai_index + 1 + len(self._tail)
+
+    def __iter__(self):
+        return itertools.chain(
+            itertools.islice(self._messages, self._ai_index), (self._ai,), self._tail
+        )
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        if index < self._ai_index:
+            return self._messages[index]
+        if index == self._ai_index:
+            return self._ai
+        return self._tail[index - self._ai_index - 1]
+
+    def __repr__(self) -> str:
+        return f"_ToolCallHistory({list(self)!r})"
+
+    def for_tool_call(self, tool_call_id: str) -> List[AnyMessage]:
+        # The trimmed AIMessage carries the same tool call object as the
+        # original, so the store's index yields identical message ops.
+        return self._store.for_tool_call(tool_call_id)
+
+
+def _trim_ai_message(m: AIMessage, tool_call_id: str) -> AIMessage:
+    return m.model_copy(
+        update={
+            # Frequently have partial_json blocks that are
+            # invalid if sent back to the API
+            "content": str(m.content),
+            "tool_calls": [tc for tc in m.tool_calls if tc["id"] == tool_call_id],
+        }
+    )
+
+
+def _get_history_for_tool_call(messages: Sequence[AnyMessage], tool_call_id: str):
+    if isinstance(messages, _MessageStore):
+        tail = []
+        for index, m in enumerate(reversed(messages)):
+            if isinstance(m, AIMessage):
+                return _ToolCallHistory(
+                    messages,
+                    len(messages) - index - 1,
+                    _trim_ai_message(m, tool_call_id),
+                    list(reversed(tail)),
+                )
+            if not isinstance(m, ToolMessage) or m.tool_call_id == tool_call_id:
+                tail.append(m)
     results = []
     seen_ai_message = False
     for m in reversed(messages):
         if isinstance(m, AIMessage):
             if not seen_ai_message:
-                tool_calls = [tc for tc in m.tool_calls if tc["id"] == tool_call_id]
-                if hasattr(m, "model_dump"):
-                    d = m.model_dump(exclude={"tool_calls", "content"})
-                else:
-                    d = m.dict(exclude={"tool_calls", "content"})
-                m = AIMessage(
-                    **d,
-                    # Frequently have partial_json blocks that are
-                    # invalid if sent back to the API
-                    content=str(m.content),
-                    tool_calls=tool_calls,
-                )
+                m = _trim_ai_message(m, tool_call_id)
             seen_ai_message = True
         if isinstance(m, ToolMessage):
             if m.tool_call_id != tool_call_id and not seen_ai_message:
@@ -1338,66 +1588,43 @@ def _get_history_for_tool_call(messages: List[AnyMessage], tool_call_id: str):
     return list(reversed(results))
 
 
+def _apply_message_op(store: _MessageStore, message_op: MessageOp) -> None:
+    if message_op["op"] == "delete":
+        store.delete(cast(str, message_op["target"]))
+    elif message_op["op"] == "update_tool_call":
+        targ = cast(ToolCall, message_op["target"])
+        store.replace_tool_call(cast(str, targ["id"]), lambda tc: targ)
+    elif message_op["op"] == "update_tool_name":
+        update_targ = cast(dict, message_op["target"])
+        store.replace_tool_call(
+            update_targ["id"],
+            lambda tc: {
+                "id": update_targ["id"],
+                "name": update_targ["name"],  # Just updating the name
+                "args": tc["args"],
+            },
+        )
+    else:
+        raise ValueError(f"Invalid operation: {message_op['op']}")
+
+
 def _apply_message_ops(
-    messages: Sequence[AnyMessage], message_ops: Sequence[MessageOp]
-) -> List[AnyMessage]:
-    # Apply operations to the messages
-    messages = list(messages)
+    messages: Union[_MessageStore, Sequence[AnyMessage]],
+    message_ops: Sequence[MessageOp],
+) -> _MessageStore:
+    # Apply operations to a copy of the store; each op is a dict lookup.
+    store = (
+        messages.copy()
+        if isinstance(messages, _MessageStore)
+        else _MessageStore(messages)
+    )
     for message_op in message_ops:
-        if message_op["op"] == "delete":
-            t = cast(str, message_op["target"])
-            messages_ = [m for m in messages if cast(str, getattr(m, "id")) != t]
-            messages = messages_
-        elif message_op["op"] == "update_tool_call":
-            targ = cast(ToolCall, message_op["target"])
-            messages_ = []
-            for m in messages:
-                if isinstance(m, AIMessage):
-                    old = m.tool_calls.copy()
-                    new = [
-                        targ if tc["id"] == targ["id"] else tc for tc in m.tool_calls
-                    ]
-                    if old != new:
-                        m = m.model_copy()
-                        m.tool_calls = new
-                        if m.additional_kwargs.get("tool_calls"):
-                            m.additional_kwargs["tool_calls"] = new
-                    messages_.append(m)
-                else:
-                    messages_.append(m)
-            messages = messages_
-        elif message_op["op"] == "update_tool_name":
-            update_targ = cast(dict, message_op["target"])
-            messages_ = []
-            for m in messages:
-                if isinstance(m, AIMessage):
-                    new = []
-                    for tc in m.tool_calls:
-                        if tc["id"] == update_targ["id"]:
-                            new.append(
-                                {
-                                    "id": update_targ["id"],
-                                    "name": update_targ[
-                                        "name"
-                                    ],  # Just updating the name
-                                    "args": tc["args"],
-                                }
-                            )
-                        else:
-                            new.append(tc)
-                    if m.tool_calls != new:
-                        m = m.model_copy()
-                        m.tool_calls = new
-                    messages_.append(m)
-            messages = messages_
-
-        else:
-            raise ValueError(f"Invalid operation: {message_op['op']}")
-    return messages
+        _apply_message_op(store, message_op)
+    return store
 
 
 def _reduce_messages(
-    left: Optional[List[AnyMessage]],
+    left: Optional[Sequence[AnyMessage]],
     right: Union[
         AnyMessage,
         List[Union[AnyMessage, MessageOp]],
@@ -1405,27 +1632,30 @@ def _reduce_messages(
         PromptValue,
         MessageOp,
     ],
-) -> Messages:
-    if not left:
-        left = []
+) -> _MessageStore:
     if isinstance(right, PromptValue):
         right = right.to_messages()
     message_ops = []
     if isinstance(right, dict) and right.get("op"):
         message_ops = [right]
         right = []
-    if isinstance(right, list):
-        right_ = []
-        for r in right:
-            if isinstance(r, dict) and r.get("op"):
-                message_ops.append(r)
-            else:
-                right_.append(r)
-        right = right_  # type: ignore[assignment]
-    messages = cast(Sequence[AnyMessage], add_messages(left, right))  # type: ignore[arg-type]
-    if message_ops:
-        messages = _apply_message_ops(messages, message_ops)
-    return messages
+    if not isinstance(right, list):
+        right = [right]  # type: ignore[list-item]
+    right_ = []
+    for r in right:
+        if isinstance(r, dict) and r.get("op"):
+            message_ops.append(r)
+        else:
+            right_.append(r)
+    if isinstance(left, _MessageStore):
+        store = left.copy()
+    else:
+        store = _MessageStore(left or [])
+    store.merge(right_)
+    # The store is already a private copy, so the ops can be applied in place.
+    for message_op in message_ops:
+        _apply_message_op(store, message_op)
+    return store
 
 
 def _get_message_op(
@@ -1433,6 +1663,9 @@ def _get_message_op(
 ) -> List[MessageOp]:
     msg_ops: List[MessageOp] = []
     rt = ls.get_current_run_tree()
+    if isinstance(messages, (_MessageStore, _ToolCallHistory)):
+        # Only the messages that reference the target call can produce ops.
+        messages = messages.for_tool_call(target_id)
     for m in messages:
         if isinstance(m, AIMessage):
             for tc in m.tool_calls:
@@ -1500,13 +1733,18 @@ def csff_(function: Callable) -> Type[BaseModel]:
     return schema
 
 
+def _shallow_asdict(state: ExtractionState) -> dict:
+    """Like ``dataclasses.asdict`` without deep-copying the message history."""
+    return {f.name: getattr(state, f.name) for f in fields(state)}
+
+
 def _keep_first(left: Any, right: Any):
     return left or right
 
 
 @dataclass(kw_only=True)
 class ExtractionState:
-    messages: Annotated[List[AnyMessage], _reduce_messages] = field(
+    messages: Annotated[Sequence[AnyMessage], _reduce_messages] = field(
         default_factory=list
     )
     attempts: Annotated[int, operator.add] = field(default=0)
@@ -1528,6 +1766,75 @@ class DeletionState(ExtractionState):
     deletion_target: str = field(default="")
 
 
+_VALIDATION_POOL: Optional[ContextThreadPoolExecutor] = None
+_VALIDATION_POOL_LOCK = threading.Lock()
+
+
+def _get_validation_pool() -> ContextThreadPoolExecutor:
+    """Long-lived pool shared by all validation nodes for multi-call fan-out."""
+    global _VALIDATION_POOL
+    if _VALIDATION_POOL is None:
+        with _VALIDATION_POOL_LOCK:
+            if _VALIDATION_POOL is None:
+                _VALIDATION_POOL = ContextThreadPoolExecutor(
+                    thread_name_prefix="trustcall-validate"
+                )
+    return _VALIDATION_POOL
+
+
+_TYPE_ADAPTERS: Dict[Tuple[str, str], TypeAdapter] = {}
+_SCHEMA_KEYS: Dict[type, Tuple[str, str]] = {}
+
+
+def _schema_key(schema: Type[BaseModel]) -> Optional[Tuple[str, str]]:
+    """(qualified name, JSON schema hash) of a module-level schema, else None."""
+    key = _SCHEMA_KEYS.get(schema)
+    if key is None:
+        module = sys.modules.get(schema.__module__)
+        if getattr(module, schema.__name__, None) is not schema:
+            # Built at runtime (RemoveDoc per set of IDs, create_model, ...)
+            return None
+        try:
+            schema_json = json.dumps(schema.model_json_schema(), sort_keys=True, default=str)
+        except Exception:
+            return None
+        digest = hashlib.sha256(schema_json.encode()).hexdigest()[:16]
+        key = _SCHEMA_KEYS[schema] = (f"{schema.__module__}.{schema.__qualname__}", digest)
+    return key
+
+
+def _get_type_adapter(schema: Type[BaseModel]) -> Optional[TypeAdapter]:
+    """TypeAdapter for pydantic v2 schemas (None for v1 models).
+
+    Only module-level schemas are cached, keyed by name and schema hash; schemas
+    built per call get a fresh adapter instead of evicting the cached ones.
+    """
+    if not (isinstance(schema, type) and issubclass(schema, BaseModel)):
+        return None
+    key = _schema_key(schema)
+    if key is None:
+        return TypeAdapter(schema)
+    adapter = _TYPE_ADAPTERS.get(key)
+    if adapter is None:
+        adapter = _TYPE_ADAPTERS.setdefault(key, TypeAdapter(schema))
+    return adapter
+
+
+def _raw_tool_call_args(message: AIMessage) -> Dict[str, str]:
+    """Map tool call IDs to the provider's raw JSON arguments, where available.
+
+    OpenAI-style messages keep the unparsed ``function.arguments`` string in
+    ``additional_kwargs``. Once a call has been patched, its entry is replaced by
+    the parsed ToolCall (no ``function`` key), so only untouched calls match.
+    """
+    raw: Dict[str, str] = {}
+    for tc in message.additional_kwargs.get("tool_calls") or ():
+        function = tc.get("function") if isinstance(tc, dict) else None
+        if isinstance(function, dict) and isinstance(function.get("arguments"), str):
+            raw[tc.get("id")] = function["arguments"]
+    return raw
+
+
 class _ExtendedValidationNode(ValidationNode):
     def __init__(self, *args, enable_deletes: bool = False, **kwargs):
         super().__init__(*args, **kwargs)
@@ -1535,10 +1842,11 @@ class _ExtendedValidationNode(ValidationNode):
 
     def _func(self, input: ExtractionState, config: RunnableConfig) -> Any:  # type: ignore
         """Validate and run tool calls synchronously."""
-        output_type, message = self._get_message(asdict(input))
+        output_type, message = self._get_message({"messages": input.messages})
         removal_schema = None
         if self.enable_deletes and input.existing:
             removal_schema = _create_remove_doc_from_existing(input.existing)
+        raw_args = _raw_tool_call_args(message)
 
         def run_one(call: ToolCall):
             try:
@@ -1546,9 +1854,15 @@ class _ExtendedValidationNode(ValidationNode):
                     schema = removal_schema
                 else:
                     schema = self.schemas_by_name[call["name"]]
-                output = schema.model_validate(call["args"])
+                adapter = _get_type_adapter(schema)
+                if adapter is None:
+                    output = schema.model_validate(call["args"])
+                    content = output.model_dump_json()
+                else:
+                    output = _validate_args(adapter, call, raw_args.get(call["id"]))
+                    content = adapter.dump_json(output).decode()
                 return ToolMessage(
-                    content=output.model_dump_json(),
+                    content=content,
                     name=call["name"],
                     tool_call_id=cast(str, call["id"]),
                 )
@@ -1571,12 +1885,34 @@ class _ExtendedValidationNode(ValidationNode):
                     status="error",
                 )
 
-        with get_executor_for_config(config) as executor:
-            outputs = [*executor.map(run_one, message.tool_calls)]
-            if output_type == "list":
-                return outputs
-            else:
-                return {"messages": outputs}
+        tool_calls = message.tool_calls
+        if len(tool_calls) <= 1:
+            # No fan-out needed: skip the executor entirely.
+            outputs = [run_one(call) for call in tool_calls]
+        elif config.get("max_concurrency") is not None:
+            with get_executor_for_config(config) as executor:
+                outputs = [*executor.map(run_one, tool_calls)]
+        else:
+            outputs = [*_get_validation_pool().map(run_one, tool_calls)]
+        if output_type == "list":
+            return outputs
+        else:
+            return {"messages": outputs}
+
+
+def _validate_args(
+    adapter: TypeAdapter, call: ToolCall, raw: Optional[str]
+) -> BaseModel:
+    if raw is not None:
+        try:
+            return adapter.validate_json(raw)
+        except ValidationError as e:
+            # Providers occasionally emit JSON that the lenient parser used for
+            # ``call["args"]`` accepts but pydantic's does not; re-validate the
+            # parsed dict so the error (if any) refers to the actual arguments.
+            if not any(err["type"] == "json_invalid" for err in e.errors()):
+                raise
+    return adapter.validate_python(call["args"])
 
 
 def _is_injected_arg_type(type_: Type) -> bool:
@@ -1626,36 +1962,34 @@ def _ensure_patches(args: dict) -> list[JsonPatch]:
         return patches
 
     if isinstance(patches, str):
-        try:
-            parsed = json.loads(patches)
-            if isinstance(parsed, list):
-                return parsed
-        except Exception:
-            pass
-
-        bracket_depth = 0
-        first_list_str = None
-        start = patches.find("[")
-        if start != -1:
-            for i in range(start, len(patches)):
-                if patches[i] == "[":
-                    bracket_depth += 1
-                elif patches[i] == "]":
-                    bracket_depth -= 1
-                    if bracket_depth == 0:
-                        first_list_str = patches[start : i + 1]
-                        break
-            if first_list_str:
-                try:
-                    parsed = json.loads(first_list_str)
-                    if isinstance(parsed, list):
-                        return parsed
-                except Exception:
-                    pass
+        return _patch_list_parser(patches)
 
     return []
 
 
+def _parse_patch_list_strict(text: str) -> list:
+    """Default parser for a patch list given as a string: plain JSON, otherwise no patches."""
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return []
+    return value if isinstance(value, list) else []
+
+
+_patch_list_parser: Callable[[str], list] = _parse_patch_list_strict
+
+
+def set_patch_list_parser(parser: Callable[[str], list]) -> None:
+    """Set the parser for patch lists the model returns as a string.
+
+    The application injects its tolerant extractor (prose, code fences,
+    trailing commas; a list cut off mid-element keeps only its complete
+    elements), so this module does not depend on it.
+    """
+    global _patch_list_parser
+    _patch_list_parser = parser
+
+
 __all__ = [
     "create_extractor",
     "ensure_tools",